@@ -19,7 +19,53 @@ class AddRecordingForm(forms.ModelForm):
         fields = ["video_recording", "recording_url"]
 
 
-class AutoScheduleValidateForm(forms.Form):
+class AutoScheduleSolverForm(forms.Form):
+    """The solver options shared by the AutoScheduler forms. Empty fields use the AUTOSCHEDULER_* settings."""
+
+    time_limit = forms.IntegerField(
+        min_value=0,
+        required=False,
+        help_text="Stop the solver after this many seconds and use the best schedule found so far. 0 means no limit. Leave empty to use the default.",
+    )
+
+    threads = forms.IntegerField(
+        min_value=1,
+        required=False,
+        help_text="The number of threads the solver may use. Leave empty to use the default.",
+    )
+
+    gap = forms.FloatField(
+        min_value=0,
+        max_value=1,
+        required=False,
+        help_text="Stop the solver when the schedule is within this relative gap of the optimal schedule, for example 0.05 for 5%. Leave empty to use the default.",
+    )
+
+    objective = forms.ChoiceField(
+        choices=(
+            (
+                "efficiency",
+                "Efficiency (minimise the total difference between Event demand and EventLocation capacity)",
+            ),
+            (
+                "equity",
+                "Equity (minimise the largest difference between Event demand and EventLocation capacity)",
+            ),
+        ),
+        initial="efficiency",
+        help_text="What to optimise for when calculating a new schedule. Similar and incremental schedules always minimise the number of changes to the current schedule.",
+    )
+
+
+class AutoScheduleValidateForm(AutoScheduleSolverForm):
+    field_order = [
+        "schedule",
+        "event_type_constraint",
+        "speakers_other_events_constraint",
+        "speaker_event_conflicts_constraint",
+        "speaker_availability_constraint",
+    ]
+
     schedule = forms.ChoiceField(
         choices=(
             (
@@ -30,6 +76,10 @@ class AutoScheduleValidateForm(forms.Form):
                 "similar",
                 "Validate Similar Schedule (Create and validate a new schedule based on the current schedule)",
             ),
+            (
+                "incremental",
+                "Validate Incremental Schedule (Only reschedule new Events and Events affected by changes, and validate)",
+            ),
             ("new", "Validate New Schedule (Create and validate a new schedule)"),
         ),
         help_text="What to validate?",
@@ -60,13 +110,19 @@ class AutoScheduleValidateForm(forms.Form):
     )
 
 
-class AutoScheduleApplyForm(forms.Form):
+class AutoScheduleApplyForm(AutoScheduleSolverForm):
+    field_order = ["schedule"]
+
     schedule = forms.ChoiceField(
         choices=(
             (
                 "similar",
                 "Apply Similar Schedule (Create and apply a new schedule similar to the current schedule)",
             ),
+            (
+                "incremental",
+                "Apply Incremental Schedule (Only reschedule new Events and Events affected by changes, leave everything else alone)",
+            ),
             (
                 "new",
                 "Apply New Schedule (Create and apply a new schedule without considering the current schedule)",
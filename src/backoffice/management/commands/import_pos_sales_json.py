@@ -1,9 +1,10 @@
-import json
 import logging
+import time
 
 from django.core.management.base import BaseCommand
 
 from economy.utils import import_pos_sales_json
+from economy.utils import iter_json_array
 
 logger = logging.getLogger("bornhack.%s" % __name__)
 
@@ -20,10 +21,17 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
+        start = time.monotonic()
         with open(options["jsonpath"]) as f:
-            data = json.load(f)
-            products, transactions, sales, costs = import_pos_sales_json(data)
-            self.stdout.write(f"{products} new products created")
-            self.stdout.write(f"{transactions} new transactions created")
-            self.stdout.write(f"{sales} new sales created")
-            self.stdout.write(f"{costs} new product_costs created")
+            products, transactions, sales, costs = import_pos_sales_json(
+                iter_json_array(f),
+            )
+        duration = time.monotonic() - start
+        self.stdout.write(f"{products} new products created")
+        self.stdout.write(f"{transactions} new transactions created")
+        self.stdout.write(f"{sales} new sales created")
+        self.stdout.write(f"{costs} new product_costs created")
+        rows = products + transactions + sales + costs
+        self.stdout.write(
+            f"Imported {rows} rows in {duration:.2f} seconds ({rows / duration:.0f} rows/sec)",
+        )
@@ -16,6 +16,9 @@ from .views import AutoScheduleCrashCourseView
 from .views import AutoScheduleDebugEventConflictsView
 from .views import AutoScheduleDebugEventSlotUnavailabilityView
 from .views import AutoScheduleDiffView
+from .views import AutoScheduleJobApplyView
+from .views import AutoScheduleJobDetailView
+from .views import AutoScheduleJobListView
 from .views import AutoScheduleManageView
 from .views import AutoScheduleValidateView
 from .views import BackofficeIndexView
@@ -126,7 +129,9 @@ from .views import ReimbursementListView
 from .views import ReimbursementUpdateView
 from .views import RevenueDetailView
 from .views import RevenueListView
+from .views import ScanTicketsBundleView
 from .views import ScanTicketsPosSelectView
+from .views import ScanTicketsSyncView
 from .views import ScanTicketsView
 from .views import ShopTicketOverview
 from .views import ShopTicketStatsDetailView
@@ -269,8 +274,25 @@ urlpatterns = [
                             ),
                             path(
                                 "<slug:pos_slug>/",
-                                ScanTicketsView.as_view(),
-                                name="scan_tickets",
+                                include(
+                                    [
+                                        path(
+                                            "",
+                                            ScanTicketsView.as_view(),
+                                            name="scan_tickets",
+                                        ),
+                                        path(
+                                            "bundle/",
+                                            ScanTicketsBundleView.as_view(),
+                                            name="scan_tickets_bundle",
+                                        ),
+                                        path(
+                                            "sync/",
+                                            ScanTicketsSyncView.as_view(),
+                                            name="scan_tickets_sync",
+                                        ),
+                                    ],
+                                ),
                             ),
                         ],
                     ),
@@ -721,6 +743,28 @@ urlpatterns = [
                     AutoScheduleApplyView.as_view(),
                     name="autoschedule_apply",
                 ),
+                path(
+                    "jobs/",
+                    include(
+                        [
+                            path(
+                                "",
+                                AutoScheduleJobListView.as_view(),
+                                name="autoschedule_job_list",
+                            ),
+                            path(
+                                "<int:pk>/",
+                                AutoScheduleJobDetailView.as_view(),
+                                name="autoschedule_job_detail",
+                            ),
+                            path(
+                                "<int:pk>/apply/",
+                                AutoScheduleJobApplyView.as_view(),
+                                name="autoschedule_job_apply",
+                            ),
+                        ],
+                    ),
+                ),
                 path(
                     "debug-event-slot-unavailability/",
                     AutoScheduleDebugEventSlotUnavailabilityView.as_view(),
@@ -1,7 +1,7 @@
 import csv
 import logging
 import zipfile
-from io import StringIO
+from io import TextIOWrapper
 from typing import Union
 
 import magic
@@ -9,6 +9,8 @@ from django.contrib import messages
 from django.db.models import Count
 from django.db.models import Q
 from django.db.models import Sum
+from django.http import FileResponse
+from django.http import Http404
 from django.http import HttpRequest
 from django.http import HttpResponse
 from django.shortcuts import redirect
@@ -47,12 +49,13 @@ from economy.models import Reimbursement
 from economy.models import Revenue
 from economy.models import ZettleBalance
 from economy.models import ZettleReceipt
-from economy.utils import AccountingExporter
+from economy.rollups import get_economy_rollup
 from economy.utils import CoinifyCSVImporter
 from economy.utils import import_clearhaus_csv
 from economy.utils import import_epay_csv
 from economy.utils import MobilePayCSVImporter
 from economy.utils import ZettleExcelImporter
+from utils.bulk_import import ImportProgress
 from utils.mixins import VerbUpdateView
 
 logger = logging.getLogger("bornhack.%s" % __name__)
@@ -221,6 +224,7 @@ class ExpenseListView(CampViewMixin, EconomyTeamPermissionMixin, ListView):
             "user",
             "responsible_team",
         )
+        context["rollup"] = get_economy_rollup(self.camp)
         return context
 
 
@@ -255,6 +259,15 @@ class ReimbursementListView(CampViewMixin, EconomyTeamPermissionMixin, ListView)
     model = Reimbursement
     template_name = "reimbursement_list_backoffice.html"
 
+    def get_queryset(self, **kwargs):
+        queryset = super().get_queryset(**kwargs)
+        return queryset.select_related("user", "reimbursement_user").with_amount()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["rollup"] = get_economy_rollup(self.camp)
+        return context
+
 
 class ReimbursementDetailView(CampViewMixin, EconomyTeamPermissionMixin, DetailView):
     model = Reimbursement
@@ -346,6 +359,7 @@ class RevenueListView(CampViewMixin, EconomyTeamPermissionMixin, ListView):
             camp=self.camp,
             approved__isnull=True,
         )
+        context["rollup"] = get_economy_rollup(self.camp)
         return context
 
 
@@ -408,18 +422,22 @@ class BankCSVUploadView(CampViewMixin, EconomyTeamPermissionMixin, FormView):
     def form_valid(self, form):
         for file_id, file_handle in form.files.items():
             account = BankAccount.objects.get(pk=file_id)
-            csvdata = file_handle.read().decode("utf-8-sig")
-            reader = csv.reader(StringIO(csvdata), delimiter=";", quotechar='"')
-            imported = account.import_csv(reader)
+            progress = ImportProgress()
+            reader = csv.reader(
+                TextIOWrapper(file_handle, encoding="utf-8-sig"),
+                delimiter=";",
+                quotechar='"',
+            )
+            imported = account.import_csv(reader, progress=progress)
             if imported:
                 messages.success(
                     self.request,
-                    f"Successfully imported {imported} new transactions for bank account {account.name} ({account.pk})",
+                    f"Successfully imported {imported} new transactions for bank account {account.name} ({account.pk}) ({progress})",
                 )
             else:
                 messages.info(
                     self.request,
-                    f"No new transactions were created for bank account {account.name} ({account.pk}). Transaction text descriptions may have been updated.",
+                    f"No new transactions were created for bank account {account.name} ({account.pk}). Transaction text descriptions may have been updated. ({progress})",
                 )
         return redirect(
             reverse(
@@ -488,48 +506,69 @@ class CoinifyCSVImportView(CampViewMixin, EconomyTeamPermissionMixin, FormView):
 
     def form_valid(self, form):
         if "invoices" in form.files:
-            csvdata = form.files["invoices"].read().decode("utf-8-sig")
-            reader = csv.reader(StringIO(csvdata), delimiter=",", quotechar='"')
-            created = CoinifyCSVImporter.import_coinify_invoice_csv(reader)
+            progress = ImportProgress()
+            reader = csv.reader(
+                TextIOWrapper(form.files["invoices"], encoding="utf-8-sig"),
+                delimiter=",",
+                quotechar='"',
+            )
+            created = CoinifyCSVImporter.import_coinify_invoice_csv(
+                reader,
+                progress=progress,
+            )
             if created:
                 messages.success(
                     self.request,
-                    f"Invoices CSV processed OK. Successfully imported {created} new Coinify invoices.",
+                    f"Invoices CSV processed OK. Successfully imported {created} new Coinify invoices. ({progress})",
                 )
             else:
                 messages.info(
                     self.request,
-                    "Invoices CSV processed OK. No new Coinify invoices were created.",
+                    f"Invoices CSV processed OK. No new Coinify invoices were created. ({progress})",
                 )
 
         if "payouts" in form.files:
-            csvdata = form.files["payouts"].read().decode("utf-8-sig")
-            reader = csv.reader(StringIO(csvdata), delimiter=",", quotechar='"')
-            created = CoinifyCSVImporter.import_coinify_payout_csv(reader)
+            progress = ImportProgress()
+            reader = csv.reader(
+                TextIOWrapper(form.files["payouts"], encoding="utf-8-sig"),
+                delimiter=",",
+                quotechar='"',
+            )
+            created = CoinifyCSVImporter.import_coinify_payout_csv(
+                reader,
+                progress=progress,
+            )
             if created:
                 messages.success(
                     self.request,
-                    f"Payouts CSV processed OK. Successfully imported {created} new Coinify payouts.",
+                    f"Payouts CSV processed OK. Successfully imported {created} new Coinify payouts. ({progress})",
                 )
             else:
                 messages.info(
                     self.request,
-                    "Payouts CSV processed OK. No new Coinify payouts were created.",
+                    f"Payouts CSV processed OK. No new Coinify payouts were created. ({progress})",
                 )
 
         if "balances" in form.files:
-            csvdata = form.files["balances"].read().decode("utf-8-sig")
-            reader = csv.reader(StringIO(csvdata), delimiter=",", quotechar='"')
-            created = CoinifyCSVImporter.import_coinify_balance_csv(reader)
+            progress = ImportProgress()
+            reader = csv.reader(
+                TextIOWrapper(form.files["balances"], encoding="utf-8-sig"),
+                delimiter=",",
+                quotechar='"',
+            )
+            created = CoinifyCSVImporter.import_coinify_balance_csv(
+                reader,
+                progress=progress,
+            )
             if created:
                 messages.success(
                     self.request,
-                    f"Balances CSV processed OK. Successfully imported {created} new Coinify balances.",
+                    f"Balances CSV processed OK. Successfully imported {created} new Coinify balances. ({progress})",
                 )
             else:
                 messages.info(
                     self.request,
-                    "Balances CSV processed OK. No new Coinify balances were created.",
+                    f"Balances CSV processed OK. No new Coinify balances were created. ({progress})",
                 )
 
         return redirect(
@@ -555,18 +594,22 @@ class EpayCSVImportView(CampViewMixin, EconomyTeamPermissionMixin, FormView):
 
     def form_valid(self, form):
         if "transactions" in form.files:
-            csvdata = form.files["transactions"].read().decode("utf-8-sig")
-            reader = csv.reader(StringIO(csvdata), delimiter=";", quotechar='"')
-            created = import_epay_csv(reader)
+            progress = ImportProgress()
+            reader = csv.reader(
+                TextIOWrapper(form.files["transactions"], encoding="utf-8-sig"),
+                delimiter=";",
+                quotechar='"',
+            )
+            created = import_epay_csv(reader, progress=progress)
             if created:
                 messages.success(
                     self.request,
-                    f"ePay Transactions CSV processed OK. Successfully imported {created} new ePay Transactions.",
+                    f"ePay Transactions CSV processed OK. Successfully imported {created} new ePay Transactions. ({progress})",
                 )
             else:
                 messages.info(
                     self.request,
-                    "ePay Transactions CSV processed OK. No new ePay Transactions were created.",
+                    f"ePay Transactions CSV processed OK. No new ePay Transactions were created. ({progress})",
                 )
 
         return redirect(
@@ -603,18 +646,22 @@ class ClearhausSettlementImportView(
 
     def form_valid(self, form):
         if "settlements" in form.files:
-            csvdata = form.files["settlements"].read().decode("utf-8-sig")
-            reader = csv.reader(StringIO(csvdata), delimiter=",", quotechar='"')
-            created = import_clearhaus_csv(reader)
+            progress = ImportProgress()
+            reader = csv.reader(
+                TextIOWrapper(form.files["settlements"], encoding="utf-8-sig"),
+                delimiter=",",
+                quotechar='"',
+            )
+            created = import_clearhaus_csv(reader, progress=progress)
             if created:
                 messages.success(
                     self.request,
-                    f"Clearhaus Settlements CSV processed OK. Successfully imported {created} new Clearhaus Settlements.",
+                    f"Clearhaus Settlements CSV processed OK. Successfully imported {created} new Clearhaus Settlements. ({progress})",
                 )
             else:
                 messages.info(
                     self.request,
-                    "Clearhaus Settlements CSV processed OK. No new Clearhaus Settlements created, but some might have been updated.",
+                    f"Clearhaus Settlements CSV processed OK. No new Clearhaus Settlements created, but some might have been updated. ({progress})",
                 )
 
         return redirect(
@@ -711,33 +758,47 @@ class MobilePayCSVImportView(CampViewMixin, EconomyTeamPermissionMixin, FormView
 
     def form_valid(self, form):
         if "transfers" in form.files:
-            csvdata = form.files["transfers"].read().decode("utf-8-sig")
-            reader = csv.reader(StringIO(csvdata), delimiter=";", quotechar='"')
-            created = MobilePayCSVImporter.import_mobilepay_transfer_csv(reader)
+            progress = ImportProgress()
+            reader = csv.reader(
+                TextIOWrapper(form.files["transfers"], encoding="utf-8-sig"),
+                delimiter=";",
+                quotechar='"',
+            )
+            created = MobilePayCSVImporter.import_mobilepay_transfer_csv(
+                reader,
+                progress=progress,
+            )
             if created:
                 messages.success(
                     self.request,
-                    f"MobilePay Transfers/transactions CSV processed OK. Successfully imported {created} new MobilePay Transactions.",
+                    f"MobilePay Transfers/transactions CSV processed OK. Successfully imported {created} new MobilePay Transactions. ({progress})",
                 )
             else:
                 messages.info(
                     self.request,
-                    "MobilePay Transfers/transactions CSV processed OK. No new MobilePay Transactions created.",
+                    f"MobilePay Transfers/transactions CSV processed OK. No new MobilePay Transactions created. ({progress})",
                 )
 
         if "sales" in form.files:
-            csvdata = form.files["sales"].read().decode("utf-8-sig")
-            reader = csv.reader(StringIO(csvdata), delimiter=";", quotechar='"')
-            created = MobilePayCSVImporter.import_mobilepay_sales_csv(reader)
+            progress = ImportProgress()
+            reader = csv.reader(
+                TextIOWrapper(form.files["sales"], encoding="utf-8-sig"),
+                delimiter=";",
+                quotechar='"',
+            )
+            created = MobilePayCSVImporter.import_mobilepay_sales_csv(
+                reader,
+                progress=progress,
+            )
             if created:
                 messages.success(
                     self.request,
-                    f"MobilePay Sales CSV processed OK. Successfully imported {created} new MobilePay Transactions.",
+                    f"MobilePay Sales CSV processed OK. Successfully imported {created} new MobilePay Transactions. ({progress})",
                 )
             else:
                 messages.info(
                     self.request,
-                    "MobilePay Sales CSV processed OK. No new MobilePay Transactions created.",
+                    f"MobilePay Sales CSV processed OK. No new MobilePay Transactions created. ({progress})",
                 )
 
         return redirect(
@@ -758,32 +819,22 @@ class AccountingExportCreateView(CampViewMixin, EconomyTeamPermissionMixin, Crea
     fields = ["date_from", "date_to", "comment"]
 
     def form_valid(self, form):
-        """Gather data and create a zipfile with all of it."""
-        # get the model instance
-        export = form.save(commit=False)
-
-        # initiate and run the exporter
-        exporter = AccountingExporter(
-            startdate=export.date_from,
-            enddate=export.date_to,
-        )
-        exporter.doit()
-
-        # add the archive to the model and save
-        export.archive.save(
-            f"bornhack_accounting_export_from_{export.date_from}_to_{export.date_to}_{export.uuid}.zip",
-            exporter.archivedata,
-        )
+        """Save the export, the accountingexportworker gathers the data and creates
+        the zipfile with all of it in the background."""
+        export = form.save()
 
         # some feedback and redirect
         messages.success(
             self.request,
-            f"Wrote archive file {export.archive.path} to disk, yay",
+            f"Accounting export from {export.date_from} to {export.date_to} has been queued, this page shows the progress.",
         )
         return redirect(
             reverse(
-                "backoffice:accountingexport_list",
-                kwargs={"camp_slug": self.camp.slug},
+                "backoffice:accountingexport_detail",
+                kwargs={
+                    "camp_slug": self.camp.slug,
+                    "accountingexport_uuid": export.uuid,
+                },
             ),
         )
 
@@ -800,9 +851,12 @@ class AccountingExportDetailView(CampViewMixin, EconomyTeamPermissionMixin, Deta
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
-        z = zipfile.ZipFile(self.get_object().archive.path)
-        # we need a list of just filenames without the folder name
-        sorted_names = z.namelist()
+        if not self.object.archive:
+            # the export is not done yet
+            return context
+        with zipfile.ZipFile(self.object.archive.path) as z:
+            # we need a list of just filenames without the folder name
+            sorted_names = z.namelist()
         sorted_names.sort()
         context["files"] = [f.split("/")[1] for f in sorted_names if "/" in f]
         return context
@@ -851,14 +905,15 @@ class AccountingExportDownloadArchiveView(
 
     def get(self, request, *args, **kwargs):
         ae = self.get_object()
-        archive = ae.archive.read()
-        mimetype = magic.from_buffer(archive, mime=True)
-        response = HttpResponse(content_type=mimetype)
-        response["Content-Disposition"] = (
-            f"attachment; filename=bornhack_accounting_export_from_{ae.date_from}_to_{ae.date_to}_{ae.uuid}.zip"
+        if not ae.archive:
+            raise Http404("The archive for this export is not ready")
+        # stream the archive from disk instead of reading it into memory
+        return FileResponse(
+            ae.archive.open("rb"),
+            as_attachment=True,
+            filename=ae.archive_filename,
+            content_type="application/zip",
         )
-        response.write(archive)
-        return response
 
 
 class AccountingExportDownloadFileView(
@@ -871,6 +926,8 @@ class AccountingExportDownloadFileView(
 
     def get(self, request, *args, **kwargs):
         ae = self.get_object()
+        if not ae.archive:
+            raise Http404("The archive for this export is not ready")
         filename = kwargs["filename"]
         with zipfile.ZipFile(ae.archive.path) as z:
             with z.open("bornhack_accounting_export/" + filename) as f:
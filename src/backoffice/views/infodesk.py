@@ -1,5 +1,9 @@
 import csv
+import hashlib
+import json
 import logging
+import uuid
+from datetime import datetime
 from typing import Optional
 
 from django.contrib import messages
@@ -8,8 +12,11 @@ from django.db import transaction
 from django.db.models import Q
 from django.http import Http404
 from django.http import HttpResponse
+from django.http import HttpResponseBadRequest
 from django.http import HttpResponseForbidden
 from django.http import HttpResponseRedirect
+from django.http import JsonResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import render
 from django.urls import reverse
 from django.utils import timezone
@@ -18,6 +25,7 @@ from django.views.generic import FormView
 from django.views.generic import ListView
 from django.views.generic import TemplateView
 from django.views.generic import UpdateView
+from django.views.generic import View
 
 from ..forms import InvoiceDownloadForm
 from ..forms import ShopTicketRefundFormSet
@@ -35,19 +43,19 @@ from shop.models import Refund
 from tickets.models import DiscountTicket
 from tickets.models import ShopTicket
 from tickets.models import SponsorTicket
+from tickets.models import TicketToken
 from tickets.models import TicketType
 from tickets.models import TicketTypeUnion
 from utils.mixins import GetObjectMixin
 
 logger = logging.getLogger("bornhack.%s" % __name__)
 
+# offline scan bundles contain truncated sha256 hashes of the tokens
+SCAN_BUNDLE_HASH_LENGTH = 16
+
 
 def _ticket_getter_by_token(token) -> Optional[TicketTypeUnion]:
-    for ticket_class in [ShopTicket, SponsorTicket, DiscountTicket]:
-        try:
-            return ticket_class.objects.get(Q(token=token) | Q(badge_token=token))
-        except ticket_class.DoesNotExist:
-            continue
+    return TicketToken.get_ticket(token)
 
 
 def _ticket_getter_by_pk(pk):
@@ -165,6 +173,184 @@ class ScanTicketsView(
         messages.success(request, f"Order #{order.id} has been marked as paid!")
 
 
+def scan_bundle_hash(token):
+    """The hash of a token in the offline scan bundle, devices hash the scanned
+    token the same way. Tokens are not exported so a leaked bundle can not be
+    used to make tickets."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:SCAN_BUNDLE_HASH_LENGTH]
+
+
+class ScanTicketsBundleView(
+    LoginRequiredMixin,
+    InfoTeamPermissionMixin,
+    CampViewMixin,
+    View,
+):
+    """
+    Export a snapshot of the ticket and badge tokens of the camp for
+    infodesk devices to scan offline. Each entry is a list of the token hash,
+    the ticket reference ("<model>:<pk>"), 1 for badge tokens and 0 for ticket
+    tokens, and 1 if the ticket is used or the badge handed out.
+    The snapshot is made with one query on the TicketToken index.
+
+    The snapshot is plain JSON, devices fetch it over HTTPS with the session of
+    an infoteam user. The response also has the CSRF token the device needs
+    for ScanTicketsSyncView.
+    """
+
+    def dispatch(self, *args, **kwargs):
+        if self.camp.read_only:
+            return HttpResponseForbidden("Camp is read-only")
+        return super().dispatch(*args, **kwargs)
+
+    def setup(self, *args, **kwargs):
+        super().setup(*args, **kwargs)
+        self.pos = Pos.objects.get(team__camp=self.camp, slug=kwargs["pos_slug"])
+
+    def get(self, request, *args, **kwargs):
+        fields = list(TicketToken.TICKET_MODELS)
+        tickets = []
+        for row in TicketToken.objects.filter(camp=self.camp).values_list(
+            "token",
+            "badge",
+            *[f"{field}_id" for field in fields],
+            *[f"{field}__used_at" for field in fields],
+            *[f"{field}__badge_handed_out" for field in fields],
+        ):
+            token, badge = row[:2]
+            pks = row[2 : 2 + len(fields)]
+            used_ats = row[2 + len(fields) : 2 + 2 * len(fields)]
+            handed_outs = row[2 + 2 * len(fields) :]
+            index = next(i for i, pk in enumerate(pks) if pk)
+            used = handed_outs[index] if badge else used_ats[index] is not None
+            tickets.append(
+                [
+                    scan_bundle_hash(token),
+                    f"{fields[index]}:{pks[index]}",
+                    int(badge),
+                    int(used),
+                ],
+            )
+
+        return JsonResponse(
+            {
+                "camp": self.camp.slug,
+                "pos": self.pos.slug,
+                "version": int(timezone.now().timestamp() * 1000),
+                "hash_length": SCAN_BUNDLE_HASH_LENGTH,
+                "tickets": tickets,
+                "csrf_token": get_token(request),
+            },
+        )
+
+
+class ScanTicketsSyncView(
+    LoginRequiredMixin,
+    InfoTeamPermissionMixin,
+    CampViewMixin,
+    View,
+):
+    """
+    Apply check-ins and badge hand-outs queued by offline infodesk devices.
+
+    The POST body is JSON: {"events": [{"ticket": "<model>:<pk>", "action":
+    "check_in" or "badge", "at": "<iso timestamp>"}, ...]}. Events are
+    deduplicated per ticket and action, keeping the earliest. Check-ins get the
+    same fields as BaseTicket.mark_as_used() with the time of the scan, tickets
+    which are already used are left alone. Everything is applied with one
+    bulk update per ticket class and action.
+
+    Devices authenticate with the session of an infoteam user like the rest of
+    the backoffice, and the view is not CSRF exempt. The POST must have the
+    session cookie and the csrf_token from the bundle in the X-CSRFToken header.
+    """
+
+    def dispatch(self, *args, **kwargs):
+        if self.camp.read_only:
+            return HttpResponseForbidden("Camp is read-only")
+        return super().dispatch(*args, **kwargs)
+
+    def setup(self, *args, **kwargs):
+        super().setup(*args, **kwargs)
+        self.pos = Pos.objects.get(team__camp=self.camp, slug=kwargs["pos_slug"])
+
+    def post(self, request, *args, **kwargs):
+        try:
+            events = json.loads(request.body)["events"]
+        except (ValueError, KeyError, TypeError):
+            return HttpResponseBadRequest("Invalid JSON")
+        if not isinstance(events, list):
+            return HttpResponseBadRequest("Invalid JSON")
+
+        # deduplicate, keep the earliest event per ticket and action
+        queued = {}
+        invalid = []
+        for event in events:
+            try:
+                model, pk = event["ticket"].split(":", 1)
+                action = event["action"]
+                at = datetime.fromisoformat(event["at"])
+                if model not in TicketToken.TICKET_MODELS or action not in [
+                    "check_in",
+                    "badge",
+                ]:
+                    raise ValueError
+                pk = str(uuid.UUID(pk))
+            except (AttributeError, KeyError, TypeError, ValueError):
+                invalid.append(event)
+                continue
+            if timezone.is_naive(at):
+                at = timezone.make_aware(at)
+            key = (model, pk, action)
+            if key not in queued or at < queued[key]:
+                queued[key] = at
+
+        result = {"checked_in": 0, "badges": 0, "already_done": 0, "unknown": 0}
+        with transaction.atomic():
+            for model_name, model in TicketToken.TICKET_MODELS.items():
+                for action in ["check_in", "badge"]:
+                    times = {
+                        pk: at
+                        for (m, pk, a), at in queued.items()
+                        if m == model_name and a == action
+                    }
+                    if not times:
+                        continue
+                    tickets = model.objects.filter(
+                        pk__in=times,
+                        ticket_type__camp=self.camp,
+                    ).select_for_update(of=("self",))
+                    found = 0
+                    pending = []
+                    for ticket in tickets:
+                        found += 1
+                        if action == "check_in" and ticket.used_at is None:
+                            ticket.used_at = times[str(ticket.pk)]
+                            ticket.used_pos = self.pos
+                            ticket.used_pos_user = request.user
+                            pending.append(ticket)
+                        elif action == "badge" and not ticket.badge_handed_out:
+                            ticket.badge_handed_out = True
+                            pending.append(ticket)
+                    if action == "check_in":
+                        model.objects.bulk_update(
+                            pending,
+                            ["used_at", "used_pos", "used_pos_user"],
+                        )
+                        result["checked_in"] += len(pending)
+                    else:
+                        model.objects.bulk_update(pending, ["badge_handed_out"])
+                        result["badges"] += len(pending)
+                    result["already_done"] += found - len(pending)
+                    result["unknown"] += len(times) - found
+
+        result["invalid"] = len(invalid)
+        logger.info(
+            f"Synced {len(events)} queued scans from {request.user} at {self.pos}: {result}",
+        )
+        return JsonResponse(result)
+
+
 class ShopTicketOverview(
     LoginRequiredMixin,
     InfoTeamPermissionMixin,
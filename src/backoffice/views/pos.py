@@ -1,4 +1,4 @@
-import json
+import io
 import logging
 
 from django.contrib import messages
@@ -36,6 +36,7 @@ from economy.tables import PosProductTable
 from economy.tables import PosSaleTable
 from economy.tables import PosTransactionTable
 from economy.utils import import_pos_sales_json
+from economy.utils import iter_json_array
 from teams.models import Team
 
 logger = logging.getLogger("bornhack.%s" % __name__)
@@ -343,11 +344,13 @@ class PosSalesImportView(CampViewMixin, OrgaTeamPermissionMixin, FormView):
 
     def form_valid(self, form):
         if "sales" in form.files:
-            sales_data = json.loads(form.files["sales"].read().decode())
-            products, transactions, sales = import_pos_sales_json(sales_data)
+            sales_data = iter_json_array(
+                io.TextIOWrapper(form.files["sales"], encoding="utf-8"),
+            )
+            products, transactions, sales, costs = import_pos_sales_json(sales_data)
             messages.success(
                 self.request,
-                f"PoS sales json processed OK. Created {products} new products and {transactions} new transactions containing {sales} new sales.",
+                f"PoS sales json processed OK. Created {products} new products, {costs} new product costs and {transactions} new transactions containing {sales} new sales.",
             )
         return redirect(
             reverse(
@@ -9,10 +9,11 @@ from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django.shortcuts import redirect
 from django.urls import reverse
-from django.utils.safestring import mark_safe
 from django.views.generic import DetailView
 from django.views.generic import ListView
 from django.views.generic import TemplateView
+from django.views.generic import View
+from django.views.generic.detail import SingleObjectMixin
 from django.views.generic.edit import CreateView
 from django.views.generic.edit import DeleteView
 from django.views.generic.edit import FormView
@@ -25,8 +26,10 @@ from ..forms import SpeakerForm
 from ..mixins import ContentTeamPermissionMixin
 from camps.mixins import CampViewMixin
 from program.autoscheduler import AutoScheduler
+from program.availability import EventSlotAvailability
 from program.email import add_event_scheduled_email
 from program.mixins import AvailabilityMatrixViewMixin
+from program.models import AutoScheduleJob
 from program.models import Event
 from program.models import EventLocation
 from program.models import EventProposal
@@ -518,12 +521,13 @@ class EventScheduleView(CampViewMixin, ContentTeamPermissionMixin, FormView):
         form = super().get_form(*args, **kwargs)
         self.slots = []
         slotindex = 0
+        availability = EventSlotAvailability(camp=self.camp)
         # loop over sessions, get free slots
         for session in self.camp.event_sessions.filter(
             event_type=self.event.event_type,
             event_duration_minutes__gte=self.event.duration_minutes,
         ):
-            for slot in session.get_available_slots():
+            for slot in availability.get_available_slots(session):
                 # loop over speakers to see if they are all available
                 for speaker in self.event.speakers.all():
                     if not speaker.is_available(slot.when):
@@ -652,6 +656,10 @@ class EventSessionFormViewMixin:
         context["event_location"] = self.event_location
 
         context["sessions"] = self.event_type.event_sessions.filter(camp=self.camp)
+        # share one availability index between all the sessions
+        availability = EventSlotAvailability(camp=self.camp)
+        for session in context["sessions"]:
+            session.availability = availability
         return context
 
 
@@ -856,88 +864,79 @@ class AutoScheduleCrashCourseView(
     template_name = "autoschedule_crash_course.html"
 
 
-class AutoScheduleValidateView(CampViewMixin, ContentTeamPermissionMixin, FormView):
-    """This view is used to validate schedules. It uses the AutoScheduler and can
-    either validate the currently applied schedule or a new similar schedule, or a
+class AutoScheduleJobCreateMixin:
+    """Shared logic for the views creating AutoScheduleJobs. Jobs are run by
+    program.autoscheduleworker, the views redirect to the job detail page which
+    shows the progress."""
+
+    def create_job(self, schedule, options=None, apply=False):
+        job = AutoScheduleJob.objects.create(
+            camp=self.camp,
+            user=self.request.user,
+            schedule=schedule,
+            options=options or {},
+            apply=apply,
+        )
+        messages.info(
+            self.request,
+            f"AutoScheduleJob {job.pk} has been created. This page will update when the job is done.",
+        )
+        return redirect(job.get_absolute_url())
+
+
+class AutoScheduleValidateView(
+    CampViewMixin,
+    ContentTeamPermissionMixin,
+    AutoScheduleJobCreateMixin,
+    FormView,
+):
+    """This view is used to validate schedules. It creates an AutoScheduleJob which
+    either validates the currently applied schedule or a new similar schedule, or a
     brand new schedule"""
 
     template_name = "autoschedule_validate.html"
     form_class = AutoScheduleValidateForm
 
     def form_valid(self, form):
-        kwargs = copy.deepcopy(form.cleaned_data)
-        del kwargs["schedule"]
-
-        # initialise AutoScheduler
-        scheduler = AutoScheduler(camp=self.camp, **kwargs)
-        autoschedule = None
-
-        # get autoschedule
-        if form.cleaned_data["schedule"] == "current":
-            try:
-                autoschedule = scheduler.build_current_autoschedule()
-                message = f"The currently scheduled Events form a valid schedule! AutoScheduler has {len(scheduler.autoslots)} Slots based on {scheduler.event_sessions.count()} EventSessions for {scheduler.event_types.count()} EventTypes. {scheduler.events.count()} Events in the schedule."
-            except ValueError:
-                messages.error(
-                    self.request,
-                    "Unable to calculate autoschedule, no valid solution found!",
-                )
-        elif form.cleaned_data["schedule"] == "similar":
-            try:
-                original_autoschedule = scheduler.build_current_autoschedule()
-                autoschedule, diff = scheduler.calculate_similar_autoschedule(
-                    original_autoschedule,
-                )
-                message = f"The new similar schedule is valid! AutoScheduler has {len(scheduler.autoslots)} Slots based on {scheduler.event_sessions.count()} EventSessions for {scheduler.event_types.count()} EventTypes. Differences to the current schedule: {len(diff['event_diffs'])} Event diffs and {len(diff['slot_diffs'])} Slot diffs."
-            except ValueError:
-                messages.error(
-                    self.request,
-                    "Unable to calculate autoschedule, no valid solution found!",
-                )
-        elif form.cleaned_data["schedule"] == "new":
-            try:
-                autoschedule = scheduler.calculate_autoschedule()
-                message = f"The new schedule is valid! AutoScheduler has {len(scheduler.autoslots)} Slots based on {scheduler.event_sessions.count()} EventSessions for {scheduler.event_types.count()} EventTypes. {scheduler.events.count()} Events in the schedule."
-            except ValueError:
-                messages.error(
-                    self.request,
-                    "Unable to calculate autoschedule, no valid solution found!",
-                )
-
-        if autoschedule:
-            # check validity
-            valid, violations = scheduler.is_valid(autoschedule, return_violations=True)
-            if valid:
-                messages.success(self.request, message)
-            else:
-                messages.error(self.request, "Schedule is NOT valid!")
-                message = "Schedule violations:<br>"
-                for v in violations:
-                    message += v + "<br>"
-                messages.error(self.request, mark_safe(message))
-        return redirect(
-            reverse(
-                "backoffice:autoschedule_validate",
-                kwargs={"camp_slug": self.camp.slug},
-            ),
-        )
+        options = copy.deepcopy(form.cleaned_data)
+        del options["schedule"]
+        return self.create_job(form.cleaned_data["schedule"], options=options)
 
 
-class AutoScheduleDiffView(CampViewMixin, ContentTeamPermissionMixin, TemplateView):
+class AutoScheduleDiffView(
+    CampViewMixin,
+    ContentTeamPermissionMixin,
+    AutoScheduleJobCreateMixin,
+    TemplateView,
+):
+    """Show the diff from the newest similar schedule calculated for this camp.
+    POST to calculate a new similar schedule."""
+
     template_name = "autoschedule_diff.html"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        scheduler = AutoScheduler(camp=self.camp)
-        autoschedule, diff = scheduler.calculate_similar_autoschedule()
-        context["diff"] = diff
-        context["scheduler"] = scheduler
+        context["job"] = self.camp.autoschedule_jobs.filter(
+            schedule=AutoScheduleJob.SCHEDULE_SIMILAR,
+            status=AutoScheduleJob.STATUS_DONE,
+        ).first()
+        if context["job"]:
+            context["diff"] = context["job"].get_diff()
         return context
 
+    def post(self, request, *args, **kwargs):
+        return self.create_job(AutoScheduleJob.SCHEDULE_SIMILAR)
+
 
-class AutoScheduleApplyView(CampViewMixin, ContentTeamPermissionMixin, FormView):
+class AutoScheduleApplyView(
+    CampViewMixin,
+    ContentTeamPermissionMixin,
+    AutoScheduleJobCreateMixin,
+    FormView,
+):
     """This view is used by the Content Team to apply a new schedules by unscheduling
     all autoscheduled Events, and scheduling all Event/Slot combinations in the schedule.
+    It creates an AutoScheduleJob which calculates the schedule and applies it if it is valid.
 
     TODO: see comment in program.autoscheduler.AutoScheduler.apply() method.
     """
@@ -946,38 +945,73 @@ class AutoScheduleApplyView(CampViewMixin, ContentTeamPermissionMixin, FormView)
     form_class = AutoScheduleApplyForm
 
     def form_valid(self, form):
-        # initialise AutoScheduler
-        scheduler = AutoScheduler(camp=self.camp)
+        options = copy.deepcopy(form.cleaned_data)
+        del options["schedule"]
+        return self.create_job(
+            form.cleaned_data["schedule"],
+            options=options,
+            apply=True,
+        )
 
-        # get autoschedule
-        if form.cleaned_data["schedule"] == "similar":
-            autoschedule, diff = scheduler.calculate_similar_autoschedule()
-        elif form.cleaned_data["schedule"] == "new":
-            autoschedule = scheduler.calculate_autoschedule()
-            diff = None
-
-        # check validity
-        valid, violations = scheduler.is_valid(autoschedule, return_violations=True)
-        if valid:
-            # schedule is valid, apply it
-            deleted, created = scheduler.apply(autoschedule)
-            messages.success(
-                self.request,
-                f"Schedule has been applied! {deleted} Events removed from schedule, {created} new Events scheduled.",
+
+class AutoScheduleJobListView(CampViewMixin, ContentTeamPermissionMixin, ListView):
+    model = AutoScheduleJob
+    template_name = "autoschedule_job_list.html"
+
+    def get_queryset(self, *args, **kwargs):
+        return super().get_queryset(*args, **kwargs).select_related("user")
+
+
+class AutoScheduleJobDetailView(CampViewMixin, ContentTeamPermissionMixin, DetailView):
+    """Show the status of an AutoScheduleJob. The page reloads itself until the job
+    is finished."""
+
+    model = AutoScheduleJob
+    template_name = "autoschedule_job_detail.html"
+    context_object_name = "job"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["diff"] = self.object.get_diff()
+        return context
+
+
+class AutoScheduleJobApplyView(
+    CampViewMixin,
+    ContentTeamPermissionMixin,
+    SingleObjectMixin,
+    View,
+):
+    """Queue a valid calculated schedule to be applied by the worker, without solving it again"""
+
+    model = AutoScheduleJob
+
+    def post(self, request, *args, **kwargs):
+        job = self.get_object()
+        # only queue the job if nothing changed since the page was shown
+        queued = (
+            AutoScheduleJob.objects.filter(
+                pk=job.pk,
+                status=AutoScheduleJob.STATUS_DONE,
+                valid=True,
+                applied__isnull=True,
+            )
+            .exclude(schedule=AutoScheduleJob.SCHEDULE_CURRENT)
+            .update(
+                apply=True,
+                status=AutoScheduleJob.STATUS_PENDING,
+                progress=0,
+                progress_text="",
             )
-            if diff:
-                messages.success(
-                    self.request,
-                    "Differences to the previous schedule: {len(diff['event_diffs'])} Event diffs and {len(diff['slot_diffs'])} Slot diffs.",
-                )
-        else:
-            messages.error(self.request, "Schedule is NOT valid, cannot apply!")
-        return redirect(
-            reverse(
-                "backoffice:autoschedule_apply",
-                kwargs={"camp_slug": self.camp.slug},
-            ),
         )
+        if queued:
+            messages.info(
+                request,
+                f"The schedule calculated by AutoScheduleJob {job.pk} will be applied. This page will update when it is done.",
+            )
+        else:
+            messages.error(request, "This schedule can not be applied!")
+        return redirect(job.get_absolute_url())
 
 
 class AutoScheduleDebugEventSlotUnavailabilityView(
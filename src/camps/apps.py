@@ -0,0 +1,19 @@
+import logging
+
+from django.apps import AppConfig
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+
+class CampsConfig(AppConfig):
+    name = "camps"
+
+    def ready(self):
+        from .models import Camp
+        from .signal_handlers import camp_registry_invalidate
+
+        # keep the in-process camp registry up to date
+        post_save.connect(camp_registry_invalidate, sender=Camp)
+        post_delete.connect(camp_registry_invalidate, sender=Camp)
@@ -1,21 +1,24 @@
-from .models import Camp
+from .registry import get_camp
+from .registry import get_camps
 
 
 def camp(request):
     """
     if we have a camp_slug url component then get the "current" Camp object.
     Return it after adding the slug to request.session along with a "camps"
-    queryset containing all camps (used to build the menu and such)
+    list containing all camps (used to build the menu and such).
+    Both come from the in-process camp registry so this costs no queries.
     """
+    camp = None
     if request.resolver_match and "camp_slug" in request.resolver_match.kwargs:
-        try:
-            camp = Camp.objects.get(slug=request.resolver_match.kwargs["camp_slug"])
-            request.session["campslug"] = camp.slug
-        except Camp.DoesNotExist:
-            request.session["campslug"] = None
-            camp = None
-    else:
-        request.session["campslug"] = None
-        camp = None
+        # RequestCampMiddleware has usually looked up the camp already
+        camp = getattr(request, "camp", None) or get_camp(
+            request.resolver_match.kwargs["camp_slug"],
+        )
+    campslug = camp.slug if camp else None
 
-    return {"camps": Camp.objects.all().order_by("-camp"), "camp": camp}
+    # only touch the session when the value changes, so it isn't saved on every request
+    if request.session.get("campslug", False) != campslug:
+        request.session["campslug"] = campslug
+
+    return {"camps": get_camps(), "camp": camp}
@@ -1,4 +1,4 @@
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 
 
 class RequestCampMiddleware:
@@ -12,12 +12,14 @@ class RequestCampMiddleware:
         return response
 
     def process_view(self, request, view_func, view_args, view_kwargs):
-        from camps.models import Camp
+        from camps.registry import get_camp
 
         if (
             hasattr(request, "resolver_match")
             and request.resolver_match
             and "camp_slug" in request.resolver_match.kwargs
         ):
-            camp = get_object_or_404(Camp, slug=view_kwargs["camp_slug"])
+            camp = get_camp(view_kwargs["camp_slug"])
+            if camp is None:
+                raise Http404("No Camp matches the given query.")
             request.camp = camp
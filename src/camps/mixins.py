@@ -1,6 +1,6 @@
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 
-from camps.models import Camp
+from camps.registry import get_camp
 
 
 class CampViewMixin:
@@ -11,7 +11,13 @@ class CampViewMixin:
 
     def setup(self, *args, **kwargs):
         super().setup(*args, **kwargs)
-        self.camp = get_object_or_404(Camp, slug=self.kwargs["camp_slug"])
+        # RequestCampMiddleware has usually looked up the camp already
+        camp = getattr(self.request, "camp", None)
+        if camp is None or camp.slug != self.kwargs["camp_slug"]:
+            camp = get_camp(self.kwargs["camp_slug"])
+            if camp is None:
+                raise Http404("No Camp matches the given query.")
+        self.camp = camp
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -0,0 +1,81 @@
+import copy
+import logging
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Camp
+
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+# the version of the registry is shared between processes through the cache,
+# each process keeps its own copy of the camps and reloads it when the version changes
+CAMP_REGISTRY_VERSION_KEY = "camps_registry_version"
+
+_registry = (None, [], {}, {})
+
+
+def get_camp_registry_version():
+    """Return the current version of the camp registry, a random string which is
+    replaced whenever a camp changes or the cache is cleared."""
+    version = cache.get(CAMP_REGISTRY_VERSION_KEY)
+    if version is None:
+        cache.add(CAMP_REGISTRY_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(CAMP_REGISTRY_VERSION_KEY)
+    return version
+
+
+def get_camp_registry():
+    """Return a tuple of (camps, camps_by_slug, camps_by_pk), loading the camps from
+    the database if the registry was invalidated since this process loaded them."""
+    global _registry
+    version = get_camp_registry_version()
+    if _registry[0] != version:
+        camps = list(Camp.objects.all().order_by("-camp"))
+        _registry = (
+            version,
+            camps,
+            {camp.slug: camp for camp in camps},
+            {camp.pk: camp for camp in camps},
+        )
+        logger.debug(f"Loaded {len(camps)} camps into the camp registry")
+    return _registry[1:]
+
+
+def get_camps():
+    """Return a list of all camps, newest first. The Camp objects are shared
+    between requests so they must not be modified."""
+    return get_camp_registry()[0]
+
+
+def get_camp(slug):
+    """Return a copy of the Camp with this slug from the registry, or None"""
+    camp = get_camp_registry()[1].get(slug)
+    if camp is None:
+        return None
+    # views assign to self.camp and its attributes, so don't hand out the shared instance
+    return copy.copy(camp)
+
+
+def is_camp_read_only(camp_id):
+    """Return the read_only flag of a camp from the registry. Used by
+    CampRelatedModel.save() and delete() so writes don't need to load the Camp."""
+    camp = get_camp_registry()[2].get(camp_id)
+    if camp is None:
+        # not in the registry yet, ask the database
+        return (
+            Camp.objects.filter(pk=camp_id).values_list("read_only", flat=True).first()
+            or False
+        )
+    return camp.read_only
+
+
+def invalidate_camp_registry():
+    """Make every process reload the camp registry. The version is bumped again
+    when the transaction commits, so a process which reloaded the camps before
+    the commit doesn't keep the old data."""
+    cache.set(CAMP_REGISTRY_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    transaction.on_commit(
+        lambda: cache.set(CAMP_REGISTRY_VERSION_KEY, uuid.uuid4().hex, timeout=None),
+    )
@@ -0,0 +1,10 @@
+import logging
+
+from .registry import invalidate_camp_registry
+
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+
+def camp_registry_invalidate(sender, instance, **kwargs):
+    """Reload the camp registry in all processes when a Camp is saved or deleted"""
+    invalidate_camp_registry()
@@ -3,6 +3,10 @@ import datetime
 from django.test import TestCase
 from django.urls import reverse
 
+from .factories import CampFactory
+from .registry import get_camp
+from .registry import get_camps
+
 
 class CampMenuTest(TestCase):
     def test_this_year_shown_on_homepage(self):
@@ -13,3 +17,20 @@ class CampMenuTest(TestCase):
         year = (datetime.date.today() - datetime.timedelta(days=59)).year
         href = reverse("camp_detail", kwargs={"camp_slug": f"bornhack-{year}"})
         assert href in response.content.decode("utf-8")
+
+
+class CampRegistryTest(TestCase):
+    def test_registry_is_invalidated_when_a_camp_changes(self):
+        """The registry serves camps without queries and reloads when a camp is saved."""
+        camp = CampFactory()
+        self.assertEqual(get_camp(camp.slug), camp)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_camp(camp.slug).title, camp.title)
+            self.assertIn(camp, get_camps())
+
+        camp.title = "Renamed camp"
+        camp.save()
+        self.assertEqual(get_camp(camp.slug).title, "Renamed camp")
+
+        camp.delete()
+        self.assertIsNone(get_camp(camp.slug))
@@ -0,0 +1,62 @@
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.core.files import File
+from django.utils import timezone
+
+from economy.models import AccountingExport
+from economy.utils import AccountingExporter
+from utils.jobs import claim_pending_job
+from utils.jobs import fail_job
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+# running exports started longer ago than this are failed by claim_pending_job()
+ACCOUNTING_EXPORT_TIMEOUT = timedelta(hours=1)
+
+
+def do_work():
+    """
+    The accounting export worker runs pending AccountingExports, oldest first, so
+    the backoffice never has to build an export inside a request.
+    Run with: manage.py run_managepy_worker economy.accountingexportworker --sleep 10
+    """
+    while True:
+        export = claim_export()
+        if export is None:
+            return
+        run_export(export)
+
+
+def claim_export():
+    """Return the oldest pending export after marking it as running, or None"""
+    return claim_pending_job(AccountingExport.objects.all(), ACCOUNTING_EXPORT_TIMEOUT)
+
+
+def run_export(export):
+    """Run the AccountingExporter for the export and save the archive"""
+    logger.info(f"Running {export}")
+    try:
+        export.set_progress(5, "Exporting")
+        exporter = AccountingExporter(
+            startdate=export.date_from,
+            enddate=export.date_to,
+            progress=export.set_progress,
+        )
+        with tempfile.TemporaryFile(prefix="django-accounting-") as f:
+            exporter.doit(f)
+            f.seek(0)
+            export.archive.save(export.archive_filename, File(f), save=False)
+        export.status = AccountingExport.STATUS_DONE
+        export.progress = 100
+        export.progress_text = "Done"
+        export.result = f"Wrote archive file {export.archive.name}"
+        export.finished = timezone.now()
+        export.save()
+    except Exception as E:
+        logger.exception(f"Got exception while running {export}")
+        fail_job(export, str(E))
+        return
+    logger.info(f"Finished {export}: {export.result}")
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.5 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("economy", "0040_alter_posproduct_expenses"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="accountingexport",
+            name="archive",
+            field=models.FileField(
+                blank=True,
+                help_text="The zipfile containing the exported accounting info (html+CSV files). Empty until the export is done.",
+                upload_to="accountingexports/",
+            ),
+        ),
+        migrations.AddField(
+            model_name="accountingexport",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("running", "Running"),
+                    ("done", "Done"),
+                    ("failed", "Failed"),
+                ],
+                db_index=True,
+                default="pending",
+                help_text="The status of this export.",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="accountingexport",
+            name="progress",
+            field=models.PositiveSmallIntegerField(
+                default=0,
+                help_text="How far the worker has come with this export, in percent.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="accountingexport",
+            name="progress_text",
+            field=models.CharField(
+                blank=True,
+                help_text="What the worker is doing right now.",
+                max_length=255,
+            ),
+        ),
+        migrations.AddField(
+            model_name="accountingexport",
+            name="started",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the worker started this export.",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="accountingexport",
+            name="finished",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the worker finished this export.",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="accountingexport",
+            name="result",
+            field=models.TextField(
+                blank=True,
+                help_text="A message with the result of this export, or the error if it failed.",
+            ),
+        ),
+        # exports made before the worker existed were made in the request
+        migrations.RunSQL(
+            "UPDATE economy_accountingexport SET status = 'done', progress = 100;",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -23,6 +23,7 @@ from .email import send_revenue_approved_email
 from .email import send_revenue_rejected_email
 from shop.models import Product
 from tickets.models import ShopTicket
+from utils.bulk_import import bulk_import
 from utils.models import CampRelatedModel
 from utils.models import CreatedUpdatedModel
 from utils.models import CreatedUpdatedUUIDModel
@@ -478,6 +479,18 @@ class Expense(ExportModelOperationsMixin("expense"), CampRelatedModel, UUIDModel
         return f"{self.responsible_team.name} Team - {self.amount} DKK - {self.creditor.name} - {self.description}"
 
 
+class ReimbursementQuerySet(models.QuerySet):
+    def with_amount(self):
+        """Annotate the amount of each reimbursement so listing reimbursements
+        does not cost a query per reimbursement, see Reimbursement.amount"""
+        return self.annotate(
+            covered_amount=models.Sum(
+                "expenses__amount",
+                filter=models.Q(expenses__paid_by_bornhack=False),
+            ),
+        )
+
+
 class Reimbursement(
     ExportModelOperationsMixin("reimbursement"),
     CampRelatedModel,
@@ -487,6 +500,8 @@ class Reimbursement(
     A reimbursement covers one or more expenses.
     """
 
+    objects = ReimbursementQuerySet.as_manager()
+
     camp = models.ForeignKey(
         "camps.Camp",
         on_delete=models.PROTECT,
@@ -538,6 +553,9 @@ class Reimbursement(
     @property
     def amount(self):
         """The total amount for a reimbursement is calculated by adding up the amounts for all the related expenses."""
+        if "covered_amount" in self.__dict__:
+            # annotated by ReimbursementQuerySet.with_amount()
+            return self.covered_amount
         return self.expenses.filter(paid_by_bornhack=False).aggregate(
             models.Sum("amount"),
         )["amount__sum"]
@@ -665,7 +683,8 @@ class Pos(ExportModelOperationsMixin("pos"), CampRelatedModel, UUIDModel):
                     "pos_transactions",
                 ],
             )
-            for pr in posreports:
+            count = 0
+            for pr in posreports.iterator():
                 writer.writerow(
                     [
                         pr.pk,
@@ -683,7 +702,8 @@ class Pos(ExportModelOperationsMixin("pos"), CampRelatedModel, UUIDModel):
                         pr.pos_json_sales[0],
                     ],
                 )
-        return (self, filename, posreports.count())
+                count += 1
+        return (self, filename, count)
 
     @property
     def total_sales(self):
@@ -1289,7 +1309,7 @@ class BankAccount(ExportModelOperationsMixin("bank_account"), CreatedUpdatedUUID
     def __str__(self):
         return f"Account {self.name} (reg. {self.reg_no} account {self.account_no}) in bank {self.bank.name}"
 
-    def import_csv(self, csvreader):
+    def import_csv(self, csvreader, progress=None):
         """Import a CSV file with transactions for this bank account.
 
         assumes a CSV structure like this:
@@ -1301,26 +1321,31 @@ class BankAccount(ExportModelOperationsMixin("bank_account"), CreatedUpdatedUUID
         The second date column is unused. Dates are in Europe/Copenhagen tz.
         """
         cph = pytz.timezone("Europe/Copenhagen")
-        create_count = 0
         # Bank csv has the most recent lines first in the file, and the oldest last.
         # Read lines in reverse so we add the earliest transaction first,
         # this is important because bank csv transactions are only date stamped,
         # not time stamped. So we use the creation time of the db record in addition
-        # to the transaction date for sorting.
-        for row in reversed(list(csvreader)):
-            # use update_or_create() so we can import a new CSV with the same transactions
-            # but with updated descriptions, in case we fix a description in the bank
-            tx, created = self.transactions.update_or_create(
-                date=cph.localize(datetime.strptime(row[0], "%d-%m-%Y")),
-                amount=Decimal(row[3].replace(".", "").replace(",", ".")),
-                balance=Decimal(row[4].replace(".", "").replace(",", ".")),
-                defaults={
-                    "text": row[2],
-                },
-            )
-            if created:
-                create_count += 1
-        return create_count
+        # to the transaction date for sorting, ordered=True keeps them apart.
+        rows = (
+            {
+                "bank_account": self,
+                "date": cph.localize(datetime.strptime(row[0], "%d-%m-%Y")),
+                "amount": Decimal(row[3].replace(".", "").replace(",", ".")),
+                "balance": Decimal(row[4].replace(".", "").replace(",", ".")),
+                "text": row[2],
+            }
+            for row in reversed(list(csvreader))
+        )
+        # update the text of existing transactions so we can import a new CSV with the
+        # same transactions but with updated descriptions, in case we fix a description in the bank
+        return bulk_import(
+            rows,
+            self.transactions.all(),
+            key_fields=["date", "amount", "balance"],
+            update_fields=["text"],
+            ordered=True,
+            progress=progress,
+        )
 
     def export_csv(self, period, workdir, filename=None):
         """Write a CSV file to disk with all transactions for the requested period."""
@@ -1333,9 +1358,11 @@ class BankAccount(ExportModelOperationsMixin("bank_account"), CreatedUpdatedUUID
             )
             writer = csv.writer(f, dialect="excel")
             writer.writerow(["bornhack_uuid", "date", "text", "amount", "balance"])
-            for tx in transactions:
+            count = 0
+            for tx in transactions.iterator():
                 writer.writerow([tx.pk, tx.date, tx.text, tx.amount, tx.balance])
-        return (self, filename, transactions.count())
+                count += 1
+        return (self, filename, count)
 
 
 class BankTransaction(
@@ -1939,8 +1966,71 @@ class AccountingExport(
     )
     archive = models.FileField(
         upload_to="accountingexports/",
-        help_text="The zipfile containing the exported accounting info (html+CSV files)",
+        blank=True,
+        help_text="The zipfile containing the exported accounting info (html+CSV files). Empty until the export is done.",
+    )
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        db_index=True,
+        help_text="The status of this export.",
+    )
+
+    progress = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="How far the worker has come with this export, in percent.",
+    )
+
+    progress_text = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="What the worker is doing right now.",
+    )
+
+    started = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the worker started this export.",
+    )
+
+    finished = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the worker finished this export.",
+    )
+
+    result = models.TextField(
+        blank=True,
+        help_text="A message with the result of this export, or the error if it failed.",
     )
 
     def __str__(self):
         return f"AccountingExport from {self.date_from} to {self.date_to}"
+
+    @property
+    def is_finished(self):
+        return self.status in [self.STATUS_DONE, self.STATUS_FAILED]
+
+    @property
+    def archive_filename(self):
+        return f"bornhack_accounting_export_from_{self.date_from}_to_{self.date_to}_{self.uuid}.zip"
+
+    def set_progress(self, progress, text):
+        """Record the progress of a running export so the backoffice can show it"""
+        self.progress = progress
+        self.progress_text = text
+        self.save(update_fields=["progress", "progress_text", "updated"])
@@ -0,0 +1,115 @@
+from decimal import Decimal
+
+from django.db.models import CharField
+from django.db.models import Count
+from django.db.models import IntegerField
+from django.db.models import Q
+from django.db.models import Sum
+from django.db.models import Value
+
+from .models import Expense
+from .models import Reimbursement
+from .models import Revenue
+
+
+def get_rollup_queryset(queryset, kind, pending, approved, rejected, total):
+    """Return a values() queryset with one row of counters and totals per camp.
+
+    All rollup querysets have the same columns in the same order so they can be
+    combined with union(). pending, approved and rejected are Q objects (or a Value
+    for counters which do not apply to the model) and total is the aggregate for
+    the total amount.
+    """
+    return (
+        queryset.values("camp")
+        .annotate(
+            kind=Value(kind, output_field=CharField()),
+            count=Count("pk", distinct=True),
+            pending=Count("pk", distinct=True, filter=pending),
+            approved=Count("pk", distinct=True, filter=approved),
+            rejected=(
+                Count("pk", distinct=True, filter=rejected)
+                if isinstance(rejected, Q)
+                else rejected
+            ),
+            total=total,
+        )
+        .order_by()
+    )
+
+
+def get_economy_rollup(camp, user=None):
+    """Return counters and totals for the Expenses, Revenues and Reimbursements of
+    the camp, or of one user in the camp, as a dict for a template context.
+
+    Everything is counted in one grouped query, a union of one aggregate per model,
+    instead of a count() or aggregate() query for every number.
+    """
+    expenses = Expense.objects.filter(camp=camp)
+    revenues = Revenue.objects.filter(camp=camp)
+    reimbursements = Reimbursement.objects.filter(camp=camp)
+    if user:
+        expenses = expenses.filter(user=user)
+        revenues = revenues.filter(user=user)
+        reimbursements = reimbursements.filter(reimbursement_user=user)
+
+    approval = {
+        "pending": Q(approved__isnull=True),
+        "approved": Q(approved=True),
+        "rejected": Q(approved=False),
+    }
+    queryset = get_rollup_queryset(
+        expenses,
+        kind="expense",
+        total=Sum("amount"),
+        **approval,
+    ).union(
+        get_rollup_queryset(
+            revenues,
+            kind="revenue",
+            total=Sum("amount"),
+            **approval,
+        ),
+        # the amount of a reimbursement is the sum of the expenses it covers
+        get_rollup_queryset(
+            reimbursements,
+            kind="reimbursement",
+            pending=Q(paid=False),
+            approved=Q(paid=True),
+            rejected=Value(0, output_field=IntegerField()),
+            total=Sum(
+                "expenses__amount",
+                filter=Q(expenses__paid_by_bornhack=False),
+            ),
+        ),
+        all=True,
+    )
+
+    rollup = {
+        "expense_count": 0,
+        "unapproved_expense_count": 0,
+        "approved_expense_count": 0,
+        "rejected_expense_count": 0,
+        "expense_total": Decimal(0),
+        "revenue_count": 0,
+        "unapproved_revenue_count": 0,
+        "approved_revenue_count": 0,
+        "rejected_revenue_count": 0,
+        "revenue_total": Decimal(0),
+        "reimbursement_count": 0,
+        "unpaid_reimbursement_count": 0,
+        "paid_reimbursement_count": 0,
+        "reimbursement_total": Decimal(0),
+    }
+    for row in queryset:
+        kind = row["kind"]
+        rollup[f"{kind}_count"] = row["count"]
+        rollup[f"{kind}_total"] = row["total"] or Decimal(0)
+        if kind == "reimbursement":
+            rollup["unpaid_reimbursement_count"] = row["pending"]
+            rollup["paid_reimbursement_count"] = row["approved"]
+        else:
+            rollup[f"unapproved_{kind}_count"] = row["pending"]
+            rollup[f"approved_{kind}_count"] = row["approved"]
+            rollup[f"rejected_{kind}_count"] = row["rejected"]
+    return rollup
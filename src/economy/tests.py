@@ -1,16 +1,43 @@
 import csv
+import datetime
+import io
+import json
+from decimal import Decimal
+from unittest import mock
+from zipfile import ZipFile
 
 from django.core.exceptions import ValidationError
+from django.db.models import Sum
 from django.test import TestCase
+from django.test import TransactionTestCase
 from django.utils import timezone
 
+from .factories import PosFactory
 from .models import Bank
 from .models import BankAccount
+from .models import Chain
+from .models import Credebtor
+from .models import EpayTransaction
+from .models import Expense
+from .models import PosProduct
+from .models import PosProductCost
+from .models import PosSale
+from .models import Reimbursement
+from .models import Revenue
+from .rollups import get_economy_rollup
+from .utils import ACCOUNTING_EXPORT_SUBDIR
+from .utils import AccountingExporter
 from .utils import CoinifyCSVImporter
 from .utils import import_clearhaus_csv
 from .utils import import_epay_csv
+from .utils import import_pos_sales_json
+from .utils import iter_json_array
 from .utils import MobilePayCSVImporter
 from .utils import ZettleExcelImporter
+from camps.factories import CampFactory
+from teams.factories import TeamFactory
+from utils.bulk_import import ImportProgress
+from utils.factories import UserFactory
 
 
 class BankAccountCsvImportTest(TestCase):
@@ -125,6 +152,24 @@ class EpayCSVImportTest(TestCase):
             created = import_epay_csv(reader)
             self.assertEqual(created, 0)
 
+    def test_epay_csv_import_updates_transactions(self):
+        # importing a transaction again with a changed amount updates it
+        with open("testdata/epay_test.csv", encoding="utf-8-sig") as f:
+            data = f.read()
+        import_epay_csv(csv.reader(io.StringIO(data), delimiter=";", quotechar='"'))
+        data = data.replace('"1337.00";"0.00";', '"1000.00";"0.00";')
+        progress = ImportProgress()
+        created = import_epay_csv(
+            csv.reader(io.StringIO(data), delimiter=";", quotechar='"'),
+            progress=progress,
+        )
+        self.assertEqual(created, 0)
+        self.assertEqual(progress.updated, 3)
+        self.assertEqual(
+            EpayTransaction.objects.get(transaction_id="213652781").captured_amount,
+            Decimal("1000.00"),
+        )
+
 
 class ClearhausCSVImportTest(TestCase):
     def test_clearhaus_csv_import(self):
@@ -140,6 +185,20 @@ class ClearhausCSVImportTest(TestCase):
             created = import_clearhaus_csv(reader)
             self.assertEqual(created, 0)
 
+    def test_clearhaus_csv_import_progress(self):
+        # importing the same settlements again updates them instead of creating new ones
+        with open("testdata/clearhaus_settlements.csv", encoding="utf-8-sig") as f:
+            reader = csv.reader(f, delimiter=",", quotechar='"')
+            import_clearhaus_csv(reader)
+        progress = ImportProgress()
+        with open("testdata/clearhaus_settlements.csv", encoding="utf-8-sig") as f:
+            reader = csv.reader(f, delimiter=",", quotechar='"')
+            created = import_clearhaus_csv(reader, progress=progress)
+        self.assertEqual(created, 0)
+        self.assertEqual(progress.rows, 9)
+        self.assertEqual(progress.updated, 9)
+        self.assertIsNotNone(progress.end)
+
 
 class ZettleImportTest(TestCase):
     def test_zettle_receipts_import(self):
@@ -204,3 +263,270 @@ class MobilePayImportTest(TestCase):
             reader = csv.reader(f, delimiter=";", quotechar='"')
             created = MobilePayCSVImporter.import_mobilepay_sales_csv(reader)
             self.assertEqual(created, 0)
+
+
+class PosSalesJSONImportTest(TestCase):
+    def test_pos_sales_json_import(self):
+        pos = PosFactory()
+        timestamp = (timezone.now() + timezone.timedelta(days=1)).strftime(
+            "%Y-%m-%dT%H:%M:%S.%fZ",
+        )
+        product = {
+            "_id": "7oCSE2xt6szw5cZYQ",
+            "brandName": "Gamma",
+            "name": "Tap: Bando",
+            "description": "IPA",
+            "salePrice": "35",
+            "unitSize": "40",
+            "sizeUnit": "cl",
+            "abv": "6.5",
+            "tags": ["beer", "tap"],
+            "shopPrices": [{"buyPrice": 17.5, "timestamp": {"$date": timestamp}}],
+        }
+        transactions = [
+            {
+                "_id": f"tx{i}",
+                "userId": "Y7NgNzTJRxPKupCv5",
+                "locationId": pos.external_id,
+                "timestamp": {"$date": timestamp},
+                "products": [product, dict(product, salePrice=0)],
+            }
+            for i in range(5)
+        ]
+        data = io.StringIO(json.dumps(transactions))
+
+        # use a small batch size to import in more than one batch
+        created = import_pos_sales_json(iter_json_array(data, chunk_size=100), 2)
+        self.assertEqual(created, (1, 5, 5, 1))
+        self.assertEqual(PosSale.objects.filter(transaction__pos=pos).count(), 5)
+        self.assertEqual(PosProduct.objects.get().tags, "beer,tap")
+
+        # importing the same transactions again creates nothing
+        created = import_pos_sales_json(transactions)
+        self.assertEqual(created, (0, 0, 0, 0))
+
+    def test_pos_sales_json_import_cost_without_camp(self):
+        """Costs which can not be placed in a camp are skipped, the sales are imported."""
+        pos = PosFactory()
+        timestamp = (timezone.now() + timezone.timedelta(days=1)).strftime(
+            "%Y-%m-%dT%H:%M:%S.%fZ",
+        )
+        transactions = [
+            {
+                "_id": "tx0",
+                "locationId": pos.external_id,
+                "timestamp": {"$date": timestamp},
+                "products": [
+                    {
+                        "_id": "7oCSE2xt6szw5cZYQ",
+                        "brandName": "Gamma",
+                        "name": "Tap: Bando",
+                        "salePrice": "35",
+                        "unitSize": "40",
+                        "sizeUnit": "cl",
+                        "shopPrices": [
+                            {
+                                "buyPrice": 17.5,
+                                "timestamp": {"$date": "2000-01-01T00:00:00Z"},
+                            },
+                        ],
+                    },
+                ],
+            },
+        ]
+        # only the camp of the transaction can be found
+        with mock.patch(
+            "economy.utils.get_closest_camp",
+            side_effect=lambda ts: pos.team.camp if ts.year > 2000 else None,
+        ):
+            created = import_pos_sales_json(transactions)
+        self.assertEqual(created, (1, 1, 1, 0))
+        self.assertFalse(PosProductCost.objects.exists())
+
+
+class AccountingExporterTest(TransactionTestCase):
+    """The exports run in threads with their own database connections, so the
+    data must be committed"""
+
+    def test_accounting_export_archive(self):
+        """The archive has a file for each export, the index and the support files."""
+        bank = Bank.objects.create(name="NiceBank")
+        account = BankAccount.objects.create(
+            bank=bank,
+            name="kasse",
+            reg_no="1234",
+            account_no="12345678",
+        )
+        with open("testdata/bank.csv", encoding="utf-8-sig") as f:
+            account.import_csv(csv.reader(f, delimiter=";", quotechar='"'))
+
+        startdate = datetime.date(2021, 1, 1)
+        enddate = datetime.date(2022, 1, 1)
+        progress = []
+        exporter = AccountingExporter(
+            startdate=startdate,
+            enddate=enddate,
+            progress=lambda *args: progress.append(args),
+        )
+        archive = io.BytesIO()
+        exporter.doit(archive)
+
+        with ZipFile(archive) as zh:
+            names = zh.namelist()
+            bank_csv = zh.read(
+                f"{ACCOUNTING_EXPORT_SUBDIR}/bornhack_bank_account_nicebank_kasse_1234_12345678_{exporter.period.lower}_{exporter.period.upper}.csv",
+            )
+        self.assertEqual(len(names), len(set(names)))
+        self.assertTrue(
+            all(name.startswith(f"{ACCOUNTING_EXPORT_SUBDIR}/") for name in names),
+        )
+        names = {name.split("/", 1)[1] for name in names}
+        for name in [
+            "index.html",
+            "bootstrap.min.css",
+            "jquery-3.3.1.min.js",
+            f"bornhack_paid_invoices_{startdate}_{enddate}.csv",
+            f"bornhack_unpaid_invoices_{startdate}_{enddate}.csv",
+            f"bornhack_paid_creditnotes_{startdate}_{enddate}.csv",
+            f"bornhack_unpaid_creditnotes_{startdate}_{enddate}.csv",
+            f"bornhack_paid_webshop_orders_{startdate}_{enddate}.csv",
+            f"bornhack_expenses_{startdate}_{enddate}.csv",
+            f"bornhack_revenues_{startdate}_{enddate}.csv",
+            f"bornhack_clearhaus_settlements_{startdate}_{enddate}.csv",
+            f"bornhack_mobilepay_transactions_{startdate}_{enddate}.csv",
+        ]:
+            self.assertIn(name, names)
+
+        # the bank transactions in the period and a header line
+        transactions = account.transactions.filter(
+            date__gt=startdate,
+            date__lt=enddate,
+        ).count()
+        self.assertGreater(transactions, 0)
+        self.assertEqual(len(bank_csv.decode().splitlines()), transactions + 1)
+
+        # progress is reported once per export
+        self.assertEqual(len(progress), 16)
+        self.assertEqual(progress[-1][0], 95)
+
+
+class EconomyRollupTest(TestCase):
+    """Test the economy rollup against the per number queries it replaced."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.camp = CampFactory()
+        cls.user = UserFactory(username="user")
+        cls.other_user = UserFactory(username="other")
+        other_camp = CampFactory()
+        cls.credebtor = Credebtor.objects.create(
+            chain=Chain.objects.create(name="Chain"),
+            name="Credebtor",
+            address="Street",
+        )
+
+        for camp in [cls.camp, other_camp]:
+            team = TeamFactory(camp=camp)
+            for user in [cls.user, cls.other_user]:
+                amount = 100
+                for approved in [None, True, False]:
+                    cls.create_expense(camp, team, user, amount, approved=approved)
+                    Revenue.objects.create(
+                        camp=camp,
+                        debtor=cls.credebtor,
+                        user=user,
+                        amount=amount,
+                        description="Revenue",
+                        invoice="revenue.jpg",
+                        invoice_date=timezone.now().date(),
+                        responsible_team=team,
+                        approved=approved,
+                    )
+                    amount += 100
+                for paid in [True, False]:
+                    reimbursement = Reimbursement.objects.create(
+                        camp=camp,
+                        user=user,
+                        reimbursement_user=user,
+                        bank_account="1234 12345678",
+                        paid=paid,
+                    )
+                    # more than one covered expense per reimbursement
+                    for amount in [1000, 2000]:
+                        cls.create_expense(
+                            camp,
+                            team,
+                            user,
+                            amount,
+                            approved=True,
+                            reimbursement=reimbursement,
+                        )
+                    # the payback expense is not part of the reimbursed amount
+                    cls.create_expense(
+                        camp,
+                        team,
+                        user,
+                        3000,
+                        approved=True,
+                        reimbursement=reimbursement,
+                        paid_by_bornhack=True,
+                    )
+
+    @classmethod
+    def create_expense(cls, camp, team, user, amount, **kwargs):
+        kwargs.setdefault("paid_by_bornhack", False)
+        return Expense.objects.create(
+            camp=camp,
+            creditor=cls.credebtor,
+            user=user,
+            amount=amount,
+            description="Expense",
+            invoice="expense.jpg",
+            invoice_date=timezone.now().date(),
+            responsible_team=team,
+            **kwargs,
+        )
+
+    def get_expected_rollup(self, user=None):
+        """The numbers as the economy dashboard computed them before the rollup"""
+        expenses = Expense.objects.filter(camp=self.camp)
+        revenues = Revenue.objects.filter(camp=self.camp)
+        reimbursements = Reimbursement.objects.filter(camp=self.camp)
+        if user:
+            expenses = expenses.filter(user=user)
+            revenues = revenues.filter(user=user)
+            reimbursements = reimbursements.filter(reimbursement_user=user)
+        return {
+            "expense_count": expenses.count(),
+            "unapproved_expense_count": expenses.filter(approved__isnull=True).count(),
+            "approved_expense_count": expenses.filter(approved=True).count(),
+            "rejected_expense_count": expenses.filter(approved=False).count(),
+            "expense_total": expenses.aggregate(Sum("amount"))["amount__sum"],
+            "revenue_count": revenues.count(),
+            "unapproved_revenue_count": revenues.filter(approved__isnull=True).count(),
+            "approved_revenue_count": revenues.filter(approved=True).count(),
+            "rejected_revenue_count": revenues.filter(approved=False).count(),
+            "revenue_total": revenues.aggregate(Sum("amount"))["amount__sum"],
+            "reimbursement_count": reimbursements.count(),
+            "unpaid_reimbursement_count": reimbursements.filter(paid=False).count(),
+            "paid_reimbursement_count": reimbursements.filter(paid=True).count(),
+            "reimbursement_total": sum(
+                reimbursement.amount for reimbursement in reimbursements
+            ),
+        }
+
+    def test_rollup_for_user(self):
+        rollup = get_economy_rollup(self.camp, user=self.user)
+        self.assertEqual(rollup, self.get_expected_rollup(user=self.user))
+        self.assertEqual(rollup["reimbursement_total"], Decimal(6000))
+
+    def test_rollup_for_camp(self):
+        rollup = get_economy_rollup(self.camp)
+        self.assertEqual(rollup, self.get_expected_rollup())
+        self.assertEqual(rollup["expense_count"], 18)
+        self.assertEqual(rollup["reimbursement_total"], Decimal(12000))
+
+    def test_rollup_without_rows(self):
+        rollup = get_economy_rollup(CampFactory())
+        self.assertEqual(rollup["expense_count"], 0)
+        self.assertEqual(rollup["reimbursement_total"], Decimal(0))
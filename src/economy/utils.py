@@ -1,17 +1,24 @@
 import csv
 import datetime
-import io
+import json
 import logging
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
 from decimal import Decimal
 from decimal import InvalidOperation
+from functools import partial
 from os.path import basename
 from pathlib import Path
+from zipfile import ZIP_DEFLATED
 from zipfile import ZipFile
 
 import pandas as pd
 import pytz
 from django.conf import settings
+from django.db import connections
+from django.db import transaction as db_transaction
 from django.template.loader import render_to_string
 from django.utils import timezone
 from psycopg2.extras import DateTimeTZRange
@@ -38,13 +45,30 @@ from shop.models import CreditNote
 from shop.models import CustomOrder
 from shop.models import Invoice
 from shop.models import Order
+from utils.bulk_import import bulk_import
+from utils.models import writable_camps
 
 # we need the Danish timezone here and there
 cph = pytz.timezone("Europe/Copenhagen")
 logger = logging.getLogger("bornhack.%s" % __name__)
 
 
-def import_epay_csv(csvreader):
+# the fields updated when an ePay transaction is imported again
+EPAY_TRANSACTION_FIELDS = [
+    "merchant_id",
+    "order_id",
+    "auth_amount",
+    "currency",
+    "auth_date",
+    "description",
+    "card_type",
+    "captured_amount",
+    "captured_date",
+    "transaction_fee",
+]
+
+
+def import_epay_csv(csvreader, progress=None):
     """Import an ePay CSV file. Assumes a CSV structure like this:
 
     "transactionID";"status";"merchantnumber";"orderID";"authamount";"currency";"authdate";"cardtypeID";"CompanyTransactionGroupID";"testTransaction";"FraudControl";"description";"CardHolder";"cardname";"display_short_name";"transaction_group_name";"CurrencyCodeA";"MinorUnit";"CurrencyName";"capturedamount";"creditedAmount";"capturedDate";"creditedDate";"isBooked";"fee";"tcardnumber";"authReferenceNumber"
@@ -55,38 +79,71 @@ def import_epay_csv(csvreader):
     Not all columns are imported. ePay CSV dialect includes a header line, is semicolon seperated, and uses "" for quoting.
 
     This function expects an initiated csvreader object, or alternatively some other iterable with the data in the right index locations.
+    Transactions are identified by the ePay transaction ID, existing transactions are updated, see bulk_import().
     """
-    create_count = 0
     # skip header row
     next(csvreader)
-    for row in csvreader:
-        et, created = EpayTransaction.objects.get_or_create(
-            transaction_id=row[0],
-            merchant_id=row[2],
-            order_id=row[3],
-            auth_amount=Decimal(row[4]),
-            currency=row[16],
-            auth_date=timezone.make_aware(
+    rows = (
+        {
+            "transaction_id": row[0],
+            "merchant_id": row[2],
+            "order_id": row[3],
+            "auth_amount": Decimal(row[4]),
+            "currency": row[16],
+            "auth_date": timezone.make_aware(
                 datetime.datetime.strptime(row[6], "%d-%m-%Y %H:%M"),
                 timezone=cph,
             ),
-            description=row[11],
-            card_type=row[13],
-            captured_amount=Decimal(row[19]),
-            captured_date=timezone.make_aware(
+            "description": row[11],
+            "card_type": row[13],
+            "captured_amount": Decimal(row[19]),
+            "captured_date": timezone.make_aware(
                 datetime.datetime.strptime(row[21], "%d-%m-%Y %H:%M"),
                 timezone=cph,
             ),
-            transaction_fee=row[24],
-        )
-        if created:
-            create_count += 1
-    return create_count
+            "transaction_fee": row[24],
+        }
+        for row in csvreader
+    )
+    return bulk_import(
+        rows,
+        EpayTransaction.objects.all(),
+        key_fields=["transaction_id"],
+        update_fields=EPAY_TRANSACTION_FIELDS,
+        progress=progress,
+    )
+
+
+# the fields updated when a Coinify invoice is imported again
+COINIFY_INVOICE_FIELDS = [
+    "coinify_id_alpha",
+    "coinify_created",
+    "payment_amount",
+    "payment_currency",
+    "payment_btc_amount",
+    "description",
+    "custom",
+    "credited_amount",
+    "credited_currency",
+    "state",
+    "payment_type",
+    "original_payment_id",
+]
+
+# the fields updated when a Coinify payout is imported again
+COINIFY_PAYOUT_FIELDS = [
+    "coinify_created",
+    "amount",
+    "fee",
+    "transferred",
+    "currency",
+    "btc_txid",
+]
 
 
 class CoinifyCSVImporter:
     @staticmethod
-    def import_coinify_invoice_csv(csvreader):
+    def import_coinify_invoice_csv(csvreader, progress=None):
         """Import a CSV file with Coinify invoices exported from their webinterface.
 
         Assumes a CSV structure like this:
@@ -101,34 +158,39 @@ class CoinifyCSVImporter:
 
         This method expects an initiated csvreader object, or alternatively some other iterable with the data in the right index locations.
         """
-        create_count = 0
         # skip header row
         next(csvreader)
-        for row in csvreader:
-            ci, created = CoinifyInvoice.objects.get_or_create(
-                coinify_id=row[0],
-                coinify_id_alpha=row[1],
-                coinify_created=timezone.make_aware(
+        rows = (
+            {
+                "coinify_id": row[0],
+                "coinify_id_alpha": row[1],
+                "coinify_created": timezone.make_aware(
                     datetime.datetime.strptime(row[2], "%Y-%m-%d %H:%M:%S"),
                     timezone=datetime.timezone.utc,
                 ),
-                payment_amount=Decimal(row[3]),
-                payment_currency=row[4],
-                payment_btc_amount=Decimal(row[5]),
-                description=row[6],
-                custom=row[7],
-                credited_amount=row[8],
-                credited_currency=row[9],
-                state=row[10],
-                payment_type=row[11],
-                original_payment_id=row[12] or None,
-            )
-            if created:
-                create_count += 1
-        return create_count
+                "payment_amount": Decimal(row[3]),
+                "payment_currency": row[4],
+                "payment_btc_amount": Decimal(row[5]),
+                "description": row[6],
+                "custom": row[7],
+                "credited_amount": row[8],
+                "credited_currency": row[9],
+                "state": row[10],
+                "payment_type": row[11],
+                "original_payment_id": row[12] or None,
+            }
+            for row in csvreader
+        )
+        return bulk_import(
+            rows,
+            CoinifyInvoice.objects.all(),
+            key_fields=["coinify_id"],
+            update_fields=COINIFY_INVOICE_FIELDS,
+            progress=progress,
+        )
 
     @staticmethod
-    def import_coinify_payout_csv(csvreader):
+    def import_coinify_payout_csv(csvreader, progress=None):
         """Import a CSV file with Coinify payouts exported from their webinterface.
 
         Assumes a CSV structure like this:
@@ -141,28 +203,33 @@ class CoinifyCSVImporter:
 
         This method expects an initiated csvreader object, or alternatively some other iterable with the data in the right index locations.
         """
-        create_count = 0
         # skip header row
         next(csvreader)
-        for row in csvreader:
-            ci, created = CoinifyPayout.objects.get_or_create(
-                coinify_id=row[0],
-                coinify_created=timezone.make_aware(
+        rows = (
+            {
+                "coinify_id": row[0],
+                "coinify_created": timezone.make_aware(
                     datetime.datetime.strptime(row[1], "%Y-%m-%d %H:%M:%S"),
                     timezone=datetime.timezone.utc,
                 ),
-                amount=Decimal(row[2]),
-                fee=Decimal(row[3]),
-                transferred=Decimal(row[4]),
-                currency=row[5],
-                btc_txid=row[6] or None,
-            )
-            if created:
-                create_count += 1
-        return create_count
+                "amount": Decimal(row[2]),
+                "fee": Decimal(row[3]),
+                "transferred": Decimal(row[4]),
+                "currency": row[5],
+                "btc_txid": row[6] or None,
+            }
+            for row in csvreader
+        )
+        return bulk_import(
+            rows,
+            CoinifyPayout.objects.all(),
+            key_fields=["coinify_id"],
+            update_fields=COINIFY_PAYOUT_FIELDS,
+            progress=progress,
+        )
 
     @staticmethod
-    def import_coinify_balance_csv(csvreader):
+    def import_coinify_balance_csv(csvreader, progress=None):
         """Import a CSV file with Coinify balances exported from their webinterface.
 
         Assumes a CSV structure like this:
@@ -185,22 +252,63 @@ class CoinifyCSVImporter:
 
         This method expects an initiated csvreader object, or alternatively some other iterable with the data in the right index locations.
         """
-        create_count = 0
         # skip header row
         next(csvreader)
-        for row in csvreader:
-            ci, created = CoinifyBalance.objects.get_or_create(
-                date=row[0],
-                btc=Decimal(row[1]),
-                dkk=Decimal(row[2]),
-                eur=Decimal(row[3]),
-            )
-            if created:
-                create_count += 1
-        return create_count
+        rows = (
+            {
+                "date": row[0],
+                "btc": Decimal(row[1]),
+                "dkk": Decimal(row[2]),
+                "eur": Decimal(row[3]),
+            }
+            for row in csvreader
+        )
+        return bulk_import(
+            rows,
+            CoinifyBalance.objects.all(),
+            key_fields=["date"],
+            progress=progress,
+        )
 
 
-def import_clearhaus_csv(csvreader):
+# the fields updated when a Clearhaus settlement is imported again
+CLEARHAUS_SETTLEMENT_FIELDS = [
+    "merchant_id",
+    "merchant_name",
+    "settled",
+    "currency",
+    "period_start_date",
+    "period_end_date",
+    "payout_amount",
+    "payout_date",
+    "summary_sales",
+    "summary_credits",
+    "summary_refunds",
+    "summary_chargebacks",
+    "summary_fees",
+    "summary_other_postings",
+    "summary_net",
+    "reserve_amount",
+    "reserve_date",
+    "fees_sales",
+    "fees_refunds",
+    "fees_authorisations",
+    "fees_credits",
+    "fees_minimum_processing",
+    "fees_service",
+    "fees_wire_transfer",
+    "fees_chargebacks",
+    "fees_retrieval_requests",
+    "payout_reference_number",
+    "payout_descriptor",
+    "reserve_reference_number",
+    "reserve_descriptor",
+    "fees_interchange",
+    "fees_scheme",
+]
+
+
+def import_clearhaus_csv(csvreader, progress=None):
     """Import a Clearhaus settlements CSV file. Assumes a CSV structure like this:
 
     "merchant_id","merchant_name","id","settled","currency","period_start_date","period_end_date","payout_amount","payout_date","summary_sales","summary_credits","summary_refunds","summary_chargebacks","summary_fees","summary_other_postings","summary_net","reserve_amount","reserve_date","fees_sales","fees_refunds","fees_authorisations","fees_credits","fees_minimum_processing","fees_service","fees_wire_transfer","fees_chargebacks","fees_retrieval_requests","payout_reference_number","payout_descriptor","reserve_reference_number","reserve_descriptor","fees_interchange","fees_scheme"
@@ -212,51 +320,54 @@ def import_clearhaus_csv(csvreader):
 
     This function expects an initiated csvreader object, or alternatively some other iterable with the data in the right index locations.
     """
-    create_count = 0
     # skip header row
     next(csvreader)
-    for row in csvreader:
-        # use create_or_update() so we can import CSV with the same settlements and update stuff like payout_date
-        cs, created = ClearhausSettlement.objects.update_or_create(
-            clearhaus_uuid=row[2],
-            defaults={
-                "merchant_id": row[0],
-                "merchant_name": row[1],
-                "settled": True if row[3] == "true" else False,
-                "currency": row[4],
-                "period_start_date": row[5],
-                "period_end_date": row[6] if row[6] else None,
-                "payout_amount": Decimal(row[7]) if row[7] else None,
-                "payout_date": row[8] if row[8] else None,
-                "summary_sales": Decimal(row[9]),
-                "summary_credits": Decimal(row[10]),
-                "summary_refunds": Decimal(row[11]),
-                "summary_chargebacks": Decimal(row[12]),
-                "summary_fees": Decimal(row[13]),
-                "summary_other_postings": Decimal(row[14]),
-                "summary_net": Decimal(row[15]),
-                "reserve_amount": Decimal(row[16]) if row[16] else None,
-                "reserve_date": row[17] if row[17] else None,
-                "fees_sales": Decimal(row[18]),
-                "fees_refunds": Decimal(row[19]),
-                "fees_authorisations": Decimal(row[20]),
-                "fees_credits": Decimal(row[21]),
-                "fees_minimum_processing": Decimal(row[22]),
-                "fees_service": Decimal(row[23]),
-                "fees_wire_transfer": Decimal(row[24]),
-                "fees_chargebacks": Decimal(row[25]),
-                "fees_retrieval_requests": Decimal(row[26]),
-                "payout_reference_number": row[27] if row[27] else None,
-                "payout_descriptor": row[28] if row[28] else None,
-                "reserve_reference_number": row[29] if row[29] else None,
-                "reserve_descriptor": row[30] if row[30] else None,
-                "fees_interchange": Decimal(row[31]),
-                "fees_scheme": Decimal(row[32]),
-            },
-        )
-        if created:
-            create_count += 1
-    return create_count
+    rows = (
+        {
+            "clearhaus_uuid": row[2],
+            "merchant_id": row[0],
+            "merchant_name": row[1],
+            "settled": True if row[3] == "true" else False,
+            "currency": row[4],
+            "period_start_date": row[5],
+            "period_end_date": row[6] if row[6] else None,
+            "payout_amount": Decimal(row[7]) if row[7] else None,
+            "payout_date": row[8] if row[8] else None,
+            "summary_sales": Decimal(row[9]),
+            "summary_credits": Decimal(row[10]),
+            "summary_refunds": Decimal(row[11]),
+            "summary_chargebacks": Decimal(row[12]),
+            "summary_fees": Decimal(row[13]),
+            "summary_other_postings": Decimal(row[14]),
+            "summary_net": Decimal(row[15]),
+            "reserve_amount": Decimal(row[16]) if row[16] else None,
+            "reserve_date": row[17] if row[17] else None,
+            "fees_sales": Decimal(row[18]),
+            "fees_refunds": Decimal(row[19]),
+            "fees_authorisations": Decimal(row[20]),
+            "fees_credits": Decimal(row[21]),
+            "fees_minimum_processing": Decimal(row[22]),
+            "fees_service": Decimal(row[23]),
+            "fees_wire_transfer": Decimal(row[24]),
+            "fees_chargebacks": Decimal(row[25]),
+            "fees_retrieval_requests": Decimal(row[26]),
+            "payout_reference_number": row[27] if row[27] else None,
+            "payout_descriptor": row[28] if row[28] else None,
+            "reserve_reference_number": row[29] if row[29] else None,
+            "reserve_descriptor": row[30] if row[30] else None,
+            "fees_interchange": Decimal(row[31]),
+            "fees_scheme": Decimal(row[32]),
+        }
+        for row in csvreader
+    )
+    # update existing settlements so we can import CSV with the same settlements and update stuff like payout_date
+    return bulk_import(
+        rows,
+        ClearhausSettlement.objects.all(),
+        key_fields=["clearhaus_uuid"],
+        update_fields=CLEARHAUS_SETTLEMENT_FIELDS,
+        progress=progress,
+    )
 
 
 def optional_int(value):
@@ -376,9 +487,22 @@ class ZettleExcelImporter:
         return create_count
 
 
+# the fields identifying a MobilePay transaction, transfers don't have a transaction id
+MOBILEPAY_TRANSACTION_KEY_FIELDS = [
+    "mobilepay_created",
+    "event",
+    "currency",
+    "amount",
+    "comment",
+    "transaction_id",
+    "payment_point",
+    "myshop_number",
+]
+
+
 class MobilePayCSVImporter:
     @staticmethod
-    def import_mobilepay_transfer_csv(csvreader):
+    def import_mobilepay_transfer_csv(csvreader, progress=None):
         """Import a CSV file with MobilePay transactions.
 
         Assumes a CSV structure like in testdata/MobilePay_Transfer_overview_csv_MyShop_25-08-2021_14-09-2021.csv with these headers:
@@ -391,30 +515,32 @@ class MobilePayCSVImporter:
 
         We skip the columns with Customer name, MP-number and the last two date/time columns (redundant)
         """
-        create_count = 0
         # skip header row
         next(csvreader)
-        for row in csvreader:
-            mt, created = MobilePayTransaction.objects.get_or_create(
-                event=row[0],
-                currency=row[1],
-                amount=Decimal(row[2].replace(",", ".")),
-                mobilepay_created=row[3],
-                comment=row[6],
-                transaction_id=row[7] or None,
-                payment_point=row[9],
-                myshop_number=row[10],
-                defaults={
-                    "transfer_id": row[8] or None,
-                    "bank_account": row[11],
-                },
-            )
-            if created:
-                create_count += 1
-        return create_count
+        rows = (
+            {
+                "event": row[0],
+                "currency": row[1],
+                "amount": Decimal(row[2].replace(",", ".")),
+                "mobilepay_created": row[3],
+                "comment": row[6],
+                "transaction_id": row[7] or None,
+                "payment_point": row[9],
+                "myshop_number": row[10],
+                "transfer_id": row[8] or None,
+                "bank_account": row[11],
+            }
+            for row in csvreader
+        )
+        return bulk_import(
+            rows,
+            MobilePayTransaction.objects.all(),
+            key_fields=MOBILEPAY_TRANSACTION_KEY_FIELDS,
+            progress=progress,
+        )
 
     @staticmethod
-    def import_mobilepay_sales_csv(csvreader):
+    def import_mobilepay_sales_csv(csvreader, progress=None):
         """Import a CSV file with MobilePay sales and refunds. The sales CSV may contain transactions
         which are not yet included in a transfer (bank payout) so they do not show up in the
         transfers CSV yet.
@@ -429,62 +555,117 @@ class MobilePayCSVImporter:
 
         We skip the columns with Customer name, MP-number and the last two date/time columns (redundant)
         """
-        create_count = 0
         # skip header row
         next(csvreader)
-        for row in csvreader:
-            mt, created = MobilePayTransaction.objects.get_or_create(
-                event=row[0],
-                currency=row[1],
-                amount=Decimal(row[2].replace(",", ".")),
-                mobilepay_created=row[3],
-                comment=row[6],
-                transaction_id=row[7] or None,
-                payment_point=row[8],
-                myshop_number=row[9],
-                defaults={
-                    "transfer_id": None,
-                    "bank_account": None,
-                },
-            )
-            if created:
-                create_count += 1
-        return create_count
+        rows = (
+            {
+                "event": row[0],
+                "currency": row[1],
+                "amount": Decimal(row[2].replace(",", ".")),
+                "mobilepay_created": row[3],
+                "comment": row[6],
+                "transaction_id": row[7] or None,
+                "payment_point": row[8],
+                "myshop_number": row[9],
+                "transfer_id": None,
+                "bank_account": None,
+            }
+            for row in csvreader
+        )
+        return bulk_import(
+            rows,
+            MobilePayTransaction.objects.all(),
+            key_fields=MOBILEPAY_TRANSACTION_KEY_FIELDS,
+            progress=progress,
+        )
+
+
+# the number of exports AccountingExporter runs at the same time
+ACCOUNTING_EXPORT_THREADS = 4
+
+# the folder in the zipfile with all the exported files
+ACCOUNTING_EXPORT_SUBDIR = "bornhack_accounting_export"
 
 
 class AccountingExporter:
     """A class with methods for exporting all the financial data for the bookkeeper."""
 
-    def __init__(self, startdate, enddate):
-        """Requires startdate and enddate."""
+    def __init__(self, startdate, enddate, progress=None):
+        """Requires startdate and enddate. progress is an optional callable which
+        is called with a percentage and a text as the export runs."""
         self.period = DateTimeTZRange(startdate, enddate)
+        self.progress = progress
 
-    def doit(self):
-        """Do all the things."""
-        with tempfile.TemporaryDirectory(prefix="django-accounting-") as tmpdir:
-            workdir = Path(tmpdir)
+    def set_progress(self, progress, text):
+        logger.info(f"Accounting export {self.period}: {progress}% {text}")
+        if self.progress:
+            self.progress(progress, text)
+
+    def doit(self, archive):
+        """Do all the things. The zipfile is written to archive, a path or a file object.
+
+        The exports are independent so they run in parallel threads, each streaming its
+        querysets into CSV files in its own temporary directory. The files of each
+        export are moved into the zipfile as soon as the export finishes, so neither
+        the CSV files nor the archive are ever held in memory.
+        """
+        exports = {
             # bank
-            self.bankaccounts = self.bank_csv_export(workdir)
+            "bankaccounts": self.bank_csv_export,
             # website stuff
-            self.paid_invoices = self.invoice_csv_export(workdir, paid=True)
-            self.unpaid_invoices = self.invoice_csv_export(workdir, paid=False)
-            self.paid_creditnotes = self.creditnote_csv_export(workdir, paid=True)
-            self.unpaid_creditnotes = self.creditnote_csv_export(workdir, paid=False)
-            self.orders = self.shoporder_csv_export(workdir)
-            self.customorders = self.customorder_csv_export(workdir)
-            self.expenses = self.expense_csv_export(workdir)
-            self.revenues = self.revenue_csv_export(workdir)
-            self.reimbursements = self.reimbursement_csv_export(workdir)
-            self.pos = self.pos_csv_export(workdir)
+            "paid_invoices": partial(self.invoice_csv_export, paid=True),
+            "unpaid_invoices": partial(self.invoice_csv_export, paid=False),
+            "paid_creditnotes": partial(self.creditnote_csv_export, paid=True),
+            "unpaid_creditnotes": partial(self.creditnote_csv_export, paid=False),
+            "orders": self.shoporder_csv_export,
+            "customorders": self.customorder_csv_export,
+            "expenses": self.expense_csv_export,
+            "revenues": self.revenue_csv_export,
+            "reimbursements": self.reimbursement_csv_export,
+            "pos": self.pos_csv_export,
             # PSPs
-            self.coinify = self.coinify_csv_export(workdir)
-            self.epay = self.epay_csv_export(workdir)
-            self.clearhaus = self.clearhaus_csv_export(workdir)
-            self.zettle = self.zettle_csv_export(workdir)
-            self.mobilepay = self.mobilepay_csv_export(workdir)
-            # wrap up
-            self.create_index_html(workdir)
-            self.create_archive(workdir)
+            "coinify": self.coinify_csv_export,
+            "epay": self.epay_csv_export,
+            "clearhaus": self.clearhaus_csv_export,
+            "zettle": self.zettle_csv_export,
+            "mobilepay": self.mobilepay_csv_export,
+        }
+        with tempfile.TemporaryDirectory(prefix="django-accounting-") as tmpdir:
+            workdir = Path(tmpdir)
+            with ZipFile(archive, "w", compression=ZIP_DEFLATED) as zh:
+                with ThreadPoolExecutor(
+                    max_workers=ACCOUNTING_EXPORT_THREADS,
+                ) as executor:
+                    futures = {
+                        executor.submit(
+                            self.run_export,
+                            export,
+                            workdir / name,
+                        ): name
+                        for name, export in exports.items()
+                    }
+                    for done, future in enumerate(as_completed(futures), start=1):
+                        name = futures[future]
+                        setattr(self, name, future.result())
+                        self.add_to_archive(zh, workdir / name)
+                        self.set_progress(
+                            5 + int(90 * done / len(exports)),
+                            f"Exported {name.replace('_', ' ')} ({done}/{len(exports)})",
+                        )
+                # wrap up
+                self.create_index_html(workdir)
+                self.add_to_archive(zh, workdir)
+                self.add_support_files(zh)
+
+    @staticmethod
+    def run_export(export, workdir):
+        """Run one export in a worker thread. Each thread has its own database
+        connection, close it when the export is done."""
+        workdir.mkdir()
+        try:
+            return export(workdir)
+        finally:
+            connections.close_all()
 
     def bank_csv_export(self, workdir):
         """Export bank accounting data in CSV files."""
@@ -510,9 +691,9 @@ class AccountingExporter:
             invoices = Invoice.objects.filter(
                 created__gte=self.period.lower,
                 created__lte=self.period.upper,
-            )
+            ).select_related("order", "customorder")
             count = 0
-            for invoice in invoices:
+            for invoice in invoices.iterator():
                 if invoice.get_order.paid != paid:
                     continue
                 if invoice.order:
@@ -554,8 +735,9 @@ class AccountingExporter:
                 paid=paid,
                 created__gte=self.period.lower,
                 created__lte=self.period.upper,
-            )
-            for creditnote in creditnotes:
+            ).select_related("user")
+            count = 0
+            for creditnote in creditnotes.iterator():
                 writer.writerow(
                     [
                         creditnote.created.date(),
@@ -566,7 +748,8 @@ class AccountingExporter:
                         creditnote.danish_vat,
                     ],
                 )
-        return (filename, creditnotes.count())
+                count += 1
+        return (filename, count)
 
     def shoporder_csv_export(self, workdir, filename=None):
         """Export webshop orders in our system. Only paid orders are interesting for accounting."""
@@ -590,8 +773,9 @@ class AccountingExporter:
                 paid=True,
                 created__gte=self.period.lower,
                 created__lte=self.period.upper,
-            )
-            for order in orders:
+            ).select_related("invoice")
+            count = 0
+            for order in orders.iterator():
                 if order.invoice:
                     invoiceid = order.invoice.id
                 else:
@@ -608,7 +792,8 @@ class AccountingExporter:
                         invoiceid,
                     ],
                 )
-        return (filename, orders.count())
+                count += 1
+        return (filename, count)
 
     def customorder_csv_export(self, workdir, filename=None):
         """Export customorders in our system."""
@@ -623,7 +808,8 @@ class AccountingExporter:
                 created__gte=self.period.lower,
                 created__lte=self.period.upper,
             )
-            for order in orders:
+            count = 0
+            for order in orders.iterator():
                 writer.writerow(
                     [
                         order.id,
@@ -633,7 +819,8 @@ class AccountingExporter:
                         order.customer,
                     ],
                 )
-        return (filename, orders.count())
+                count += 1
+        return (filename, count)
 
     def expense_csv_export(self, workdir, filename=None):
         """Export expenses in our system."""
@@ -659,8 +846,9 @@ class AccountingExporter:
             expenses = Expense.objects.filter(
                 invoice_date__gte=self.period.lower,
                 invoice_date__lte=self.period.upper,
-            )
-            for expense in expenses:
+            ).select_related("camp", "user", "creditor", "reimbursement")
+            count = 0
+            for expense in expenses.iterator():
                 writer.writerow(
                     [
                         expense.uuid,
@@ -676,7 +864,8 @@ class AccountingExporter:
                         expense.notes,
                     ],
                 )
-        return (filename, expenses.count())
+                count += 1
+        return (filename, count)
 
     def revenue_csv_export(self, workdir, filename=None):
         """Export revenues in our system."""
@@ -700,8 +889,9 @@ class AccountingExporter:
             revenues = Revenue.objects.filter(
                 invoice_date__gte=self.period.lower,
                 invoice_date__lte=self.period.upper,
-            )
-            for revenue in revenues:
+            ).select_related("camp", "user", "debtor")
+            count = 0
+            for revenue in revenues.iterator():
                 writer.writerow(
                     [
                         revenue.uuid,
@@ -715,7 +905,8 @@ class AccountingExporter:
                         revenue.notes,
                     ],
                 )
-        return (filename, revenues.count())
+                count += 1
+        return (filename, count)
 
     def reimbursement_csv_export(self, workdir, filename=None):
         """Export reimbursements in our system."""
@@ -736,14 +927,16 @@ class AccountingExporter:
                     "payback_expense",
                 ],
             )
+            # only reimbursements paid back in the period
+            reimbursements = Reimbursement.objects.filter(
+                paid=True,
+                expenses__paid_by_bornhack=True,
+                expenses__invoice_date__gte=self.period.lower,
+                expenses__invoice_date__lte=self.period.upper,
+            ).select_related("user", "reimbursement_user")
             count = 0
-            for reimbursement in Reimbursement.objects.filter(paid=True):
-                if not reimbursement.payback_expense:
-                    continue
-                if reimbursement.payback_expense.invoice_date < self.period.lower:
-                    continue
-                if reimbursement.payback_expense.invoice_date > self.period.upper:
-                    continue
+            for reimbursement in reimbursements.iterator():
+                payback_expense = reimbursement.payback_expense
                 writer.writerow(
                     [
                         reimbursement.uuid,
@@ -754,7 +947,7 @@ class AccountingExporter:
                         reimbursement.expenses.exclude(
                             paid_by_bornhack=True,
                         ).values_list("uuid", flat=True),
-                        reimbursement.payback_expense.uuid,
+                        payback_expense.uuid,
                     ],
                 )
                 count += 1
@@ -796,7 +989,8 @@ class AccountingExporter:
                     "original_payment_id",
                 ],
             )
-            for ci in invoices:
+            invoices_count = 0
+            for ci in invoices.iterator():
                 writer.writerow(
                     [
                         ci.pk,
@@ -814,6 +1008,7 @@ class AccountingExporter:
                         ci.original_payment_id,
                     ],
                 )
+                invoices_count += 1
 
         # payouts
         payouts_filename = (
@@ -839,7 +1034,8 @@ class AccountingExporter:
                     "transferred_dkk",
                 ],
             )
-            for cp in payouts:
+            payouts_count = 0
+            for cp in payouts.iterator():
                 writer.writerow(
                     [
                         cp.pk,
@@ -854,6 +1050,7 @@ class AccountingExporter:
                         cp.transferred_dkk,
                     ],
                 )
+                payouts_count += 1
 
         # balances
         balances_filename = (
@@ -874,14 +1071,16 @@ class AccountingExporter:
                     "eur",
                 ],
             )
-            for balance in balances:
+            balances_count = 0
+            for balance in balances.iterator():
                 writer.writerow(
                     [balance.pk, balance.date, balance.btc, balance.dkk, balance.eur],
                 )
+                balances_count += 1
         return (
-            (balances_filename, balances.count()),
-            (payouts_filename, payouts.count()),
-            (invoices_filename, invoices.count()),
+            (balances_filename, balances_count),
+            (payouts_filename, payouts_count),
+            (invoices_filename, invoices_count),
         )
 
     def epay_csv_export(self, workdir):
@@ -911,7 +1110,8 @@ class AccountingExporter:
                     "transaction_fee",
                 ],
             )
-            for et in transactions:
+            count = 0
+            for et in transactions.iterator():
                 writer.writerow(
                     [
                         et.pk,
@@ -928,7 +1128,8 @@ class AccountingExporter:
                         et.transaction_fee,
                     ],
                 )
-        return (filename, transactions.count())
+                count += 1
+        return (filename, count)
 
     def clearhaus_csv_export(self, workdir):
         """Export Clearhaus settlements in our system."""
@@ -977,7 +1178,8 @@ class AccountingExporter:
                     "fees_scheme",
                 ],
             )
-            for s in settlements:
+            count = 0
+            for s in settlements.iterator():
                 writer.writerow(
                     [
                         s.pk,
@@ -1016,7 +1218,8 @@ class AccountingExporter:
                         s.fees_scheme,
                     ],
                 )
-        return (filename, settlements.count())
+                count += 1
+        return (filename, count)
 
     def zettle_csv_export(self, workdir):
         """Export Zettle data in our system. Two different CSV files will be created."""
@@ -1041,7 +1244,8 @@ class AccountingExporter:
                     "balance",
                 ],
             )
-            for balance in balances:
+            balances_count = 0
+            for balance in balances.iterator():
                 writer.writerow(
                     [
                         balance.pk,
@@ -1052,6 +1256,7 @@ class AccountingExporter:
                         balance.balance,
                     ],
                 )
+                balances_count += 1
 
         # receipts
         receipts_filename = (
@@ -1079,7 +1284,8 @@ class AccountingExporter:
                     "sold_via",
                 ],
             )
-            for re in receipts:
+            receipts_count = 0
+            for re in receipts.iterator():
                 writer.writerow(
                     [
                         re.pk,
@@ -1096,10 +1302,11 @@ class AccountingExporter:
                         re.sold_via,
                     ],
                 )
+                receipts_count += 1
 
         return (
-            (balances_filename, balances.count()),
-            (receipts_filename, receipts.count()),
+            (balances_filename, balances_count),
+            (receipts_filename, receipts_count),
         )
 
     def mobilepay_csv_export(self, workdir):
@@ -1126,7 +1333,8 @@ class AccountingExporter:
                     "bank_account",
                 ],
             )
-            for mt in transactions:
+            count = 0
+            for mt in transactions.iterator():
                 writer.writerow(
                     [
                         mt.pk,
@@ -1142,7 +1350,8 @@ class AccountingExporter:
                         mt.bank_account,
                     ],
                 )
-        return (filename, transactions.count())
+                count += 1
+        return (filename, count)
 
     def create_index_html(self, workdir):
         """Create a HTML file with links for everything"""
@@ -1168,157 +1377,315 @@ class AccountingExporter:
         with open(workdir / "index.html", "w") as f:
             f.write(rendered)
 
-    def create_archive(self, workdir):
-        """Create an in-memory zip-file with all the CSV data and the HTML file"""
-        self.archivedata = io.BytesIO()
-        subdir = "bornhack_accounting_export"
-        with ZipFile(self.archivedata, "w") as zh:
-            # add everything in the workdir
-            for filename in workdir.glob("*"):
-                zh.write(filename, f"{subdir}/{basename(filename)}")
-            # add support files for styling
-            for filepath in [
-                "css/bootstrap.min.css",
-                "css/jquery.dataTables.1.10.20.min.css",
-                "js/jquery-3.3.1.min.js",
-                "js/jquery.dataTables.1.10.20.min.js",
-                "js/bootstrap.min.js",
-            ]:
-                # generate an absolute path
-                fullpath = Path(settings.BASE_DIR) / "static_src" / filepath
-                zh.write(fullpath, f"{subdir}/{basename(fullpath)}")
-
-
-def import_pos_sales_json(transactions):
+    def add_to_archive(self, zh, workdir):
+        """Move the files in workdir into the zipfile"""
+        for filename in sorted(workdir.glob("*")):
+            if filename.is_file():
+                zh.write(filename, f"{ACCOUNTING_EXPORT_SUBDIR}/{basename(filename)}")
+                filename.unlink()
+
+    def add_support_files(self, zh):
+        """Add support files for styling"""
+        for filepath in [
+            "css/bootstrap.min.css",
+            "css/jquery.dataTables.1.10.20.min.css",
+            "js/jquery-3.3.1.min.js",
+            "js/jquery.dataTables.1.10.20.min.js",
+            "js/bootstrap.min.js",
+        ]:
+            # generate an absolute path
+            fullpath = Path(settings.BASE_DIR) / "static_src" / filepath
+            zh.write(fullpath, f"{ACCOUNTING_EXPORT_SUBDIR}/{basename(fullpath)}")
+
+
+# the number of Pos transactions imported per database transaction
+POS_IMPORT_BATCH_SIZE = 1000
+
+POS_PRODUCT_FIELDS = [
+    "brand_name",
+    "name",
+    "description",
+    "sales_price",
+    "unit_size",
+    "size_unit",
+    "abv",
+    "tags",
+]
+
+
+def iter_json_array(f, chunk_size=65536):
+    """Parse a file containing a JSON array and yield the elements one by one,
+    without reading the whole file into memory."""
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    started = False
+    while True:
+        # skip whitespace and the array punctuation between elements
+        while pos < len(buf) and buf[pos] in (" \t\r\n,]" if started else " \t\r\n["):
+            if buf[pos] == "[":
+                started = True
+            elif buf[pos] == "]":
+                return
+            pos += 1
+        if pos == len(buf):
+            if eof:
+                return
+            buf = f.read(chunk_size)
+            pos = 0
+            eof = not buf
+            continue
+        if not started:
+            raise ValueError("Expected a JSON array")
+        try:
+            element, end = decoder.raw_decode(buf, pos)
+            # a number at the end of the buffer could continue in the next chunk
+            complete = end < len(buf) or eof
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+        if not complete:
+            # the element continues in the next chunk
+            more = f.read(chunk_size)
+            eof = not more
+            buf = buf[pos:] + more
+            pos = 0
+            continue
+        yield element
+        pos = end
+
+
+def parse_pos_timestamp(value):
+    """Parse a timestamp from the Pos JSON, with or without milliseconds"""
+    try:
+        # with ms
+        return datetime.datetime.strptime(
+            value["$date"],
+            "%Y-%m-%dT%H:%M:%S.%fZ",
+        ).replace(tzinfo=datetime.timezone.utc)
+    except ValueError:
+        # without ms
+        return datetime.datetime.strptime(
+            value["$date"],
+            "%Y-%m-%dT%H:%M:%SZ",
+        ).replace(tzinfo=datetime.timezone.utc)
+
+
+def memoized_closest_camp():
+    """Return a function returning the same as get_closest_camp(), remembering the
+    camps it has found. A timestamp between the start of buildup and the end of
+    teardown of a camp which has already been found is answered without queries,
+    which covers almost every Pos transaction."""
+    camps = []
+    by_timestamp = {}
+
+    def closest_camp(timestamp):
+        for camp in camps:
+            if camp.buildup.lower < timestamp < camp.teardown.upper:
+                return camp
+        if timestamp not in by_timestamp:
+            camp = get_closest_camp(timestamp)
+            by_timestamp[timestamp] = camp
+            if (
+                camp
+                and camp.buildup.lower
+                and camp.teardown.upper
+                and camp.buildup.lower < timestamp < camp.teardown.upper
+            ):
+                camps.append(camp)
+        return by_timestamp[timestamp]
+
+    return closest_camp
+
+
+def import_pos_sales_json(transactions, batch_size=POS_IMPORT_BATCH_SIZE):
     """Importer for sales details from the Pos system.
 
-    Expects a list of dicts like so:
+    Expects an iterable of dicts like so, see iter_json_array() for reading them from a file:
 
         {'_id': 'eKCFbcn6fvi5eaTJJ', 'userId': 'Y7NgNzTJRxPKupCv5', 'locationId': 'bTasxE2YYXZh35wtQ', 'currency': 'HAX', 'country': 'DK', 'amount': 55, 'timestamp': {'$date': '2021-08-23T18:11:05.379Z'}, 'products': [{'_id': '7oCSE2xt6szw5cZYQ', 'createdAt': {'$date': '2021-08-21T13:41:32.073Z'}, 'brandName': 'Gamma', 'name': 'Tap: Bando', 'description': 'IPA', 'salePrice': '35', 'unitSize': '40', 'sizeUnit': 'cl', 'abv': '6.5', 'tags': ['beer', 'tap'], 'shopPrices': [{'buyPrice': 17.5, 'timestamp': {'$date': '2021-08-21T13:41:32.073Z'}}], 'locationIds': ['bTasxE2YYXZh35wtQ'], 'updatedAt': {'$date': '2021-08-23T11:27:05.459Z'}, 'tap': '1'}, {'_id': 'Z4ZxsPPEDfDbTLHsz', 'createdAt': {'$date': '2021-08-21T13:27:25.47Z'}, 'brandName': 'Vestfyen', 'name': 'Tap: Pilsner', 'description': '', 'salePrice': '20', 'unitSize': '40', 'sizeUnit': 'cl', 'abv': '4.6', 'tags': ['tap', 'beer'], 'shopPrices': [{'buyPrice': 8.65, 'timestamp': {'$date': '2021-08-21T13:27:25.471Z'}}], 'tap': '2', 'updatedAt': {'$date': '2021-08-23T14:46:27.259Z'}, 'locationIds': ['bTasxE2YYXZh35wtQ']}]}
 
+    The transactions are imported in batches of batch_size, each batch in one
+    database transaction with a constant number of queries. Camp and Pos lookups
+    are remembered for the whole import.
     """
-    new_transactions = 0
-    new_products = 0
-    new_sales = 0
-    new_costs = 0
-    # loop over transactions
-    logger.info(f"Importing {len(transactions)} transactions...")
+    counts = [0, 0, 0, 0]
+    closest_camp = memoized_closest_camp()
+    pos_cache = {}
+    rows = 0
+    start = time.monotonic()
+    logger.info("Importing Pos transactions...")
+    batch = []
     for tx in transactions:
-        # parse timestamp
-        try:
-            # with ms
-            timestamp = datetime.datetime.strptime(
-                tx["timestamp"]["$date"],
-                "%Y-%m-%dT%H:%M:%S.%fZ",
-            ).replace(tzinfo=datetime.timezone.utc)
-        except ValueError:
-            # without ms
-            timestamp = datetime.datetime.strptime(
-                tx["timestamp"]["$date"],
-                "%Y-%m-%dT%H:%M:%SZ",
-            ).replace(tzinfo=datetime.timezone.utc)
-        # find the Pos related to the camp during which the transaction happened
-        camp = get_closest_camp(timestamp)
-        pos = Pos.objects.get(
-            external_id=tx["locationId"],
-            team__camp=camp,
-        )
+        batch.append(tx)
+        if len(batch) == batch_size:
+            rows += _import_pos_sales_batch(batch, closest_camp, pos_cache, counts)
+            batch = []
+    if batch:
+        rows += _import_pos_sales_batch(batch, closest_camp, pos_cache, counts)
+
+    duration = time.monotonic() - start
+    new_products, new_transactions, new_sales, new_costs = counts
+    logger.info(
+        f"Imported {new_transactions} new transactions with {new_sales} sales, {new_products} new products and {new_costs} new product costs in {duration:.2f} seconds ({rows / duration if duration else 0:.0f} rows/sec)",
+    )
+    return new_products, new_transactions, new_sales, new_costs
 
-        # create or get the transaction
-        transaction, created = PosTransaction.objects.get_or_create(
-            external_transaction_id=tx["_id"],
-            defaults={
-                "pos": pos,
-                "external_user_id": tx.get("userId", ""),
-                "timestamp": timestamp,
-            },
-        )
-        if not created:
+
+def _import_pos_sales_batch(batch, closest_camp, pos_cache, counts):
+    """Import a batch of Pos transactions, see import_pos_sales_json(). Updates the
+    counts list in place and returns the number of rows written."""
+    # find the Pos related to the camp during which each transaction happened
+    transactions = {}
+    for tx in batch:
+        if tx["_id"] in transactions:
+            # the same transaction twice in the export, only the first one counts
             continue
-        new_transactions += 1
-        logger.debug(
-            f"Found new transaction with txid {transaction.external_transaction_id} as PosTransaction {transaction.pk} - importing products and sales...",
+        timestamp = parse_pos_timestamp(tx["timestamp"])
+        camp = closest_camp(timestamp)
+        key = (tx["locationId"], camp.pk if camp else None)
+        if key not in pos_cache:
+            pos_cache[key] = Pos.objects.select_related("team").get(
+                external_id=tx["locationId"],
+                team__camp=camp,
+            )
+        transactions[tx["_id"]] = (tx, pos_cache[key], timestamp)
+
+    with db_transaction.atomic():
+        # skip the transactions which have been imported before
+        existing = set(
+            PosTransaction.objects.filter(
+                external_transaction_id__in=transactions,
+            ).values_list("external_transaction_id", flat=True),
         )
-        # loop over each sale in the transaction
-        for sale in tx["products"]:
-            if sale["salePrice"] == 0:
-                # skip sales where the sales_price is 0, these are typically pre-sold special
-                # event sales like for birthdays and weddings
-                continue
-            # get abv when possible
-            try:
-                abv = Decimal(str(sale.get("abv", 0)))
-            except (ValueError, InvalidOperation):
-                # handle stuff like 'abv': {'$numberDouble': 'NaN'}
-                abv = 0
-            # get tags (sometimes a list and sometimes a comma seperated string, we want the latter)
-            tags = sale.get("tags", [])
-            if isinstance(tags, list):
-                tags = ",".join(tags)
-            # create or update the PosProduct
-            product, created = PosProduct.objects.update_or_create(
-                external_id=sale["_id"],
-                defaults={
-                    "brand_name": sale["brandName"],
-                    "name": sale["name"],
-                    "description": sale.get("description", ""),
-                    "sales_price": int(sale["salePrice"]),
-                    "unit_size": Decimal(sale["unitSize"]),
-                    "size_unit": sale["sizeUnit"],
-                    "abv": abv,
-                    "tags": tags,
-                },
+        new_transactions = [
+            PosTransaction(
+                pos=pos,
+                external_transaction_id=txid,
+                external_user_id=tx.get("userId", ""),
+                timestamp=timestamp,
             )
-            if created:
-                logger.debug(
-                    f"Created new product {product.external_id} as PosProduct {product.pk}: {product.brand_name} - {product.name}",
+            for txid, (tx, pos, timestamp) in transactions.items()
+            if txid not in existing
+        ]
+        if not new_transactions:
+            return 0
+
+        # collect the products, costs and sales of the new transactions
+        products = {}
+        costs = {}
+        sales = []
+        for transaction in new_transactions:
+            tx = transactions[transaction.external_transaction_id][0]
+            for sale in tx["products"]:
+                if sale["salePrice"] == 0:
+                    # skip sales where the sales_price is 0, these are typically pre-sold special
+                    # event sales like for birthdays and weddings
+                    continue
+                # get abv when possible
+                try:
+                    abv = Decimal(str(sale.get("abv", 0)))
+                except (ValueError, InvalidOperation):
+                    # handle stuff like 'abv': {'$numberDouble': 'NaN'}
+                    abv = 0
+                # get tags (sometimes a list and sometimes a comma seperated string, we want the latter)
+                tags = sale.get("tags", [])
+                if isinstance(tags, list):
+                    tags = ",".join(tags)
+                # the last sale of a product decides its fields, like update_or_create() did
+                products[sale["_id"]] = PosProduct(
+                    external_id=sale["_id"],
+                    brand_name=sale["brandName"],
+                    name=sale["name"],
+                    description=sale.get("description", ""),
+                    sales_price=int(sale["salePrice"]),
+                    unit_size=Decimal(sale["unitSize"]),
+                    size_unit=sale["sizeUnit"],
+                    abv=abv,
+                    tags=tags,
                 )
-                new_products += 1
-            # create PosProductCost objects
-            if "shopPrices" in sale:
-                for cost in sale["shopPrices"]:
-                    # parse timestamp
-                    try:
-                        # with ms
-                        timestamp = datetime.datetime.strptime(
-                            cost["timestamp"]["$date"],
-                            "%Y-%m-%dT%H:%M:%S.%fZ",
-                        ).replace(tzinfo=datetime.timezone.utc)
-                    except ValueError:
-                        # without ms
-                        timestamp = datetime.datetime.strptime(
-                            cost["timestamp"]["$date"],
-                            "%Y-%m-%dT%H:%M:%SZ",
-                        ).replace(tzinfo=datetime.timezone.utc)
-                    camp = get_closest_camp(timestamp)
+                for cost in sale.get("shopPrices", []):
+                    timestamp = parse_pos_timestamp(cost["timestamp"])
+                    camp = closest_camp(timestamp)
+                    if camp is None:
+                        # a cost must belong to a camp, skip it instead of the batch
+                        logger.warning(
+                            f"Skipping cost of product {sale['_id']} at {timestamp}, no camp found",
+                        )
+                        continue
                     # parse price
                     try:
                         price = Decimal(str(round(cost["buyPrice"], 2)))
                     except (ValueError, InvalidOperation, TypeError):
                         # skip stuff like 'abv': {'$numberDouble': 'NaN'}
                         continue
-                    # create cost as needed
-                    cost, created = PosProductCost.objects.get_or_create(
-                        camp=camp,
-                        product=product,
-                        timestamp=timestamp,
-                        product_cost=price,
-                    )
-                    if created:
-                        logger.debug(
-                            f"Created new PosProductCost object {cost.pk} for product {product} at price {cost.product_cost}",
-                        )
-                        new_costs += 1
+                    costs[(camp.pk, sale["_id"], timestamp, price)] = camp
+                sales.append((transaction, sale["_id"], int(sale["salePrice"])))
+
+        # check read only mode once per camp instead of once per row
+        camp_ids = {transaction.pos.team.camp_id for transaction in new_transactions}
+        camp_ids.update(key[0] for key in costs)
+        with writable_camps(camp_ids):
+            PosTransaction.objects.bulk_create(new_transactions)
+
+            # upsert the products, the primary keys of existing products don't change
+            existing_products = set(
+                PosProduct.objects.filter(external_id__in=products).values_list(
+                    "external_id",
+                    flat=True,
+                ),
+            )
+            PosProduct.objects.bulk_create(
+                products.values(),
+                update_conflicts=True,
+                unique_fields=["external_id"],
+                update_fields=POS_PRODUCT_FIELDS,
+            )
+            product_pks = dict(
+                PosProduct.objects.filter(external_id__in=products).values_list(
+                    "external_id",
+                    "pk",
+                ),
+            )
 
-            # create the PosSale object
-            possale = PosSale.objects.create(
-                transaction=transaction,
-                product=product,
-                sales_price=int(sale["salePrice"]),
+            # create the costs which don't exist yet
+            existing_costs = set(
+                PosProductCost.objects.filter(
+                    product__in=product_pks.values(),
+                ).values_list(
+                    "camp_id",
+                    "product__external_id",
+                    "timestamp",
+                    "product_cost",
+                ),
             )
-            new_sales += 1
-            logger.debug(
-                f"Created new PosSale {possale.pk} for PosProduct {product.brand_name} - {product.name} sold for {possale.sales_price} HAX",
+            new_costs = [
+                PosProductCost(
+                    camp=camp,
+                    product_id=product_pks[external_id],
+                    timestamp=timestamp,
+                    product_cost=price,
+                )
+                for (camp_id, external_id, timestamp, price), camp in costs.items()
+                if (camp_id, external_id, timestamp, price) not in existing_costs
+            ]
+            PosProductCost.objects.bulk_create(new_costs)
+
+            PosSale.objects.bulk_create(
+                [
+                    PosSale(
+                        transaction=transaction,
+                        product_id=product_pks[external_id],
+                        sales_price=sales_price,
+                    )
+                    for transaction, external_id, sales_price in sales
+                ],
             )
-    # all done
-    return new_products, new_transactions, new_sales, new_costs
+
+    counts[0] += len(products.keys() - existing_products)
+    counts[1] += len(new_transactions)
+    counts[2] += len(sales)
+    counts[3] += len(new_costs)
+    return len(new_transactions) + len(products) + len(new_costs) + len(sales)
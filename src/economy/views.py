@@ -29,6 +29,7 @@ from .models import Credebtor
 from .models import Expense
 from .models import Reimbursement
 from .models import Revenue
+from .rollups import get_economy_rollup
 from camps.mixins import CampViewMixin
 from teams.models import Team
 from utils.email import add_outgoing_email
@@ -45,80 +46,7 @@ class EconomyDashboardView(LoginRequiredMixin, CampViewMixin, TemplateView):
         Add expenses, reimbursements and revenues to the context
         """
         context = super().get_context_data(**kwargs)
-
-        # get reimbursement stats
-        context["reimbursement_count"] = Reimbursement.objects.filter(
-            reimbursement_user=self.request.user,
-            camp=self.camp,
-        ).count()
-        context["unpaid_reimbursement_count"] = Reimbursement.objects.filter(
-            reimbursement_user=self.request.user,
-            paid=False,
-            camp=self.camp,
-        ).count()
-        context["paid_reimbursement_count"] = Reimbursement.objects.filter(
-            reimbursement_user=self.request.user,
-            paid=True,
-            camp=self.camp,
-        ).count()
-        reimbursement_total = 0
-        for reimbursement in Reimbursement.objects.filter(
-            reimbursement_user=self.request.user,
-            camp=self.camp,
-        ):
-            reimbursement_total += reimbursement.amount
-        context["reimbursement_total"] = reimbursement_total
-
-        # get expense stats
-        context["expense_count"] = Expense.objects.filter(
-            user=self.request.user,
-            camp=self.camp,
-        ).count()
-        context["unapproved_expense_count"] = Expense.objects.filter(
-            user=self.request.user,
-            approved__isnull=True,
-            camp=self.camp,
-        ).count()
-        context["approved_expense_count"] = Expense.objects.filter(
-            user=self.request.user,
-            approved=True,
-            camp=self.camp,
-        ).count()
-        context["rejected_expense_count"] = Expense.objects.filter(
-            user=self.request.user,
-            approved=False,
-            camp=self.camp,
-        ).count()
-        context["expense_total"] = Expense.objects.filter(
-            user=self.request.user,
-            camp=self.camp,
-        ).aggregate(Sum("amount"))["amount__sum"]
-
-        # get revenue stats
-        context["revenue_count"] = Revenue.objects.filter(
-            user=self.request.user,
-            camp=self.camp,
-        ).count()
-        context["unapproved_revenue_count"] = Revenue.objects.filter(
-            user=self.request.user,
-            approved__isnull=True,
-            camp=self.camp,
-        ).count()
-        context["approved_revenue_count"] = Revenue.objects.filter(
-            user=self.request.user,
-            approved=True,
-            camp=self.camp,
-        ).count()
-        context["rejected_revenue_count"] = Revenue.objects.filter(
-            user=self.request.user,
-            approved=False,
-            camp=self.camp,
-        ).count()
-        context["revenue_total"] = Revenue.objects.filter(
-            user=self.request.user,
-            camp=self.camp,
-        ).aggregate(Sum("amount"))["amount__sum"]
-
+        context.update(get_economy_rollup(self.camp, user=self.request.user))
         return context
 
 
@@ -381,8 +309,14 @@ class ReimbursementListView(LoginRequiredMixin, CampViewMixin, ListView):
     template_name = "reimbursement_list.html"
 
     def get_queryset(self):
-        # only return Expenses belonging to the current user
-        return super().get_queryset().filter(reimbursement_user=self.request.user)
+        # only return Reimbursements belonging to the current user
+        return (
+            super()
+            .get_queryset()
+            .filter(reimbursement_user=self.request.user)
+            .select_related("camp", "user", "reimbursement_user")
+            .with_amount()
+        )
 
 
 class ReimbursementDetailView(CampViewMixin, ReimbursementPermissionMixin, DetailView):
@@ -1,8 +1,5 @@
-import base64
-import io
 import logging
 
-import qrcode
 from django.contrib.gis.db.models import PointField
 from django.contrib.gis.geos import Point
 from django.contrib.postgres.constraints import ExclusionConstraint
@@ -15,6 +12,7 @@ from django_prometheus.models import ExportModelOperationsMixin
 from maps.utils import LeafletMarkerChoices
 from utils.models import CampRelatedModel
 from utils.models import UUIDModel
+from utils.qr import qr_code_data_url
 from utils.slugs import unique_slugify
 
 logger = logging.getLogger("bornhack.%s" % __name__)
@@ -158,15 +156,7 @@ class Facility(ExportModelOperationsMixin("facility"), CampRelatedModel, UUIDMod
         )
 
     def get_feedback_qr(self, request):
-        qr = qrcode.make(
-            self.get_feedback_url(request),
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-        ).resize((250, 250))
-        file_like = io.BytesIO()
-        qr.save(file_like, format="png")
-        qrcode_base64 = base64.b64encode(file_like.getvalue()).decode("utf-8")
-        return f"data:image/png;base64,{qrcode_base64}"
+        return qr_code_data_url(self.get_feedback_url(request), size=250)
 
     def unhandled_feedbacks(self):
         return self.feedbacks.filter(handled=False)
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.contrib import messages
 from django.core.exceptions import ValidationError
 
+from .models import AutoScheduleJob
 from .models import Event
 from .models import EventFeedback
 from .models import EventInstance
@@ -173,3 +174,19 @@ class EventFeedbackAdmin(admin.ModelAdmin):
         "approved",
     ]
     search_fields = ["event__title", "user__username"]
+
+
+@admin.register(AutoScheduleJob)
+class AutoScheduleJobAdmin(admin.ModelAdmin):
+    list_display = [
+        "pk",
+        "camp",
+        "user",
+        "schedule",
+        "apply",
+        "status",
+        "valid",
+        "applied",
+        "created",
+    ]
+    list_filter = ["camp", "schedule", "status"]
@@ -1,5 +1,6 @@
 from django.apps import AppConfig
 from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
 from django.db.models.signals import post_save
 
 
@@ -7,10 +8,34 @@ class ProgramConfig(AppConfig):
     name = "program"
 
     def ready(self):
-        from .models import EventSession, Speaker
+        from .models import (
+            Event,
+            EventInstance,
+            EventLocation,
+            EventSession,
+            EventSlot,
+            EventTrack,
+            EventType,
+            Speaker,
+            Url,
+        )
         from .signal_handlers import (
+            camp_frab_mark_dirty,
+            camp_ics_invalidate,
+            camp_schedule_invalidate,
             check_speaker_event_camp_consistency,
+            event_ics_invalidate,
+            event_schedule_delta,
             event_session_post_save,
+            event_slot_ics_post_delete,
+            event_slot_ics_post_save,
+            event_slot_schedule_delta,
+            event_speakers_schedule_delta,
+            event_type_frab_mark_dirty,
+            event_type_ics_post_save,
+            event_type_schedule_invalidate,
+            speaker_schedule_delta,
+            url_frab_mark_dirty,
         )
 
         m2m_changed.connect(
@@ -19,3 +44,41 @@ class ProgramConfig(AppConfig):
         )
 
         post_save.connect(event_session_post_save, sender=EventSession)
+
+        # keep the cached ICS feeds up to date
+        post_save.connect(event_slot_ics_post_save, sender=EventSlot)
+        post_delete.connect(event_slot_ics_post_delete, sender=EventSlot)
+        post_save.connect(event_ics_invalidate, sender=Event)
+        post_delete.connect(event_ics_invalidate, sender=Event)
+        post_save.connect(camp_ics_invalidate, sender=Speaker)
+        post_save.connect(camp_ics_invalidate, sender=EventLocation)
+        post_save.connect(event_type_ics_post_save, sender=EventType)
+        m2m_changed.connect(camp_ics_invalidate, sender=Speaker.events.through)
+
+        # mark the cached Frab XML as outdated, the frab worker rebuilds it
+        for model in (Event, EventLocation, EventSlot, Speaker):
+            post_save.connect(camp_frab_mark_dirty, sender=model)
+            post_delete.connect(camp_frab_mark_dirty, sender=model)
+        post_save.connect(url_frab_mark_dirty, sender=Url)
+        post_delete.connect(url_frab_mark_dirty, sender=Url)
+        post_save.connect(event_type_frab_mark_dirty, sender=EventType)
+        m2m_changed.connect(camp_frab_mark_dirty, sender=Speaker.events.through)
+
+        # drop the cached schedule snapshot used by the ScheduleConsumer
+        for model in (Event, EventInstance, EventLocation, EventTrack, Speaker):
+            post_save.connect(camp_schedule_invalidate, sender=model)
+            post_delete.connect(camp_schedule_invalidate, sender=model)
+        post_save.connect(event_type_schedule_invalidate, sender=EventType)
+        m2m_changed.connect(camp_schedule_invalidate, sender=Speaker.events.through)
+
+        # push schedule deltas to the clients in the schedule_users group
+        post_save.connect(event_slot_schedule_delta, sender=EventSlot)
+        post_delete.connect(event_slot_schedule_delta, sender=EventSlot)
+        post_save.connect(event_schedule_delta, sender=Event)
+        post_delete.connect(event_schedule_delta, sender=Event)
+        post_save.connect(speaker_schedule_delta, sender=Speaker)
+        post_delete.connect(speaker_schedule_delta, sender=Speaker)
+        m2m_changed.connect(
+            event_speakers_schedule_delta,
+            sender=Speaker.events.through,
+        )
@@ -1,18 +1,42 @@
 import logging
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime
 from datetime import timedelta
 
+import pulp
 from conference_scheduler import resources
 from conference_scheduler import scheduler
 from conference_scheduler.lp_problem import objective_functions
 from conference_scheduler.validator import is_valid_schedule
 from conference_scheduler.validator import schedule_violations
-from psycopg2.extras import DateTimeTZRange
-
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .availability import EventSlotAvailability
+from .frab import mark_camp_frab_dirty
+from .ics import invalidate_camp_ics
+from .models import EventSlot
 from .models import EventType
-from program.email import add_event_scheduled_email
+from .models import Speaker
+from .models import SpeakerAvailability
+from .schedule import broadcast_schedule_delta
+from camps.registry import is_camp_read_only
+from program.email import add_event_scheduled_emails
+from utils.models import CampReadOnlyModeError
 
 logger = logging.getLogger("bornhack.%s" % __name__)
 
+# the objective functions a new schedule can be optimised for. Similar and incremental
+# schedules always minimise the number of changes to the original schedule.
+AUTOSCHEDULER_OBJECTIVES = {
+    "efficiency": objective_functions.efficiency_capacity_demand_difference,
+    "equity": objective_functions.equity_capacity_demand_difference,
+}
+
 
 class AutoScheduler:
     """
@@ -25,24 +49,50 @@ class AutoScheduler:
     Event objects defining the data and constraints for the scheduler.
 
     Initialising this class takes a while because all the objects have to be created.
+
+    The solver options default to the AUTOSCHEDULER_* settings. time_limit is in seconds
+    (0 for no limit), gap is the relative optimality gap where the solver may stop, and
+    objective is a key in AUTOSCHEDULER_OBJECTIVES. When the time limit or gap is reached
+    the best feasible schedule found so far is returned.
     """
 
-    def __init__(self, camp, **kwargs):
+    def __init__(
+        self,
+        camp,
+        time_limit=None,
+        threads=None,
+        gap=None,
+        objective=None,
+        **kwargs,
+    ):
         """Get EventTypes, EventSessions and Events, build autoslot and autoevent objects"""
         self.camp = camp
 
+        # solver options
+        self.time_limit = (
+            settings.AUTOSCHEDULER_TIME_LIMIT if time_limit is None else time_limit
+        )
+        self.threads = settings.AUTOSCHEDULER_THREADS if threads is None else threads
+        self.gap = settings.AUTOSCHEDULER_GAP if gap is None else gap
+        self.objective = objective or "efficiency"
+        if self.objective not in AUTOSCHEDULER_OBJECTIVES:
+            raise ValueError(f"Unknown AutoScheduler objective {self.objective}")
+
         # Get all EventTypes which support autoscheduling
         self.event_types = self.get_event_types()
 
         # Get all EventSessions for the current event_types
         self.event_sessions = self.get_event_sessions(self.event_types)
 
-        # Build a lookup dict of lists of EventSession IDs per EventType (for easy lookups later)
+        # Build a lookup dict of lists of EventSession IDs per EventType (for easy lookups later),
+        # and a lookup dict of EventType per EventSession ID
         self.event_type_sessions = {}
+        session_event_types = {}
         for session in self.event_sessions:
             if session.event_type not in self.event_type_sessions:
                 self.event_type_sessions[session.event_type] = []
             self.event_type_sessions[session.event_type].append(session.id)
+            session_event_types[session.id] = session.event_type
 
         # Get all Events for the current event_types
         self.events = self.get_events(self.event_types)
@@ -53,13 +103,10 @@ class AutoScheduler:
         # Build a lookup dict of autoslots per EventType
         self.event_type_slots = {}
         for autoslot in self.autoslots:
-            # loop over event_type_sessions dict and find our
-            for et, sessions in self.event_type_sessions.items():
-                if autoslot.session in sessions:
-                    if et not in self.event_type_slots:
-                        self.event_type_slots[et] = []
-                    self.event_type_slots[et].append(autoslot)
-                    break
+            et = session_event_types[autoslot.session]
+            if et not in self.event_type_slots:
+                self.event_type_slots[et] = []
+            self.event_type_slots[et].append(autoslot)
 
         # get autoevents and a lookup dict which maps Event id to autoevent index
         self.autoevents, self.autoeventindex = self.get_autoevents(
@@ -90,13 +137,96 @@ class AutoScheduler:
     def get_autoslots(self, event_sessions):
         """Return a list of autoslots for all slots in all EventSessions"""
         autoslots = []
+        # one availability index for the whole camp
+        availability = EventSlotAvailability(camp=self.camp)
         # loop over the sessions
         for session in event_sessions:
             # loop over available slots in this session
-            for slot in session.get_available_slots(count_autoscheduled_as_free=True):
+            for slot in availability.get_available_slots(
+                session,
+                count_autoscheduled_as_free=True,
+            ):
                 autoslots.append(slot.get_autoscheduler_slot())
         return autoslots
 
+    def get_speaker_data(self, event_ids):
+        """
+        Bulk load everything we need to know about the speakers of the Events we are
+        scheduling. This uses a fixed number of queries no matter how many Events,
+        Speakers and availabilities the camp has, and returns a dict of lookup dicts:
+
+            - event_speakers: Event id -> list of Speaker ids
+            - speaker_events: Speaker id -> set of Event ids (only Events we are scheduling)
+            - speaker_conflicts: Speaker id -> list of Event ids the speaker wishes to attend
+            - conflict_slots: Event id -> list of EventSlot.when ranges, for scheduled
+              Events which the AutoScheduler is not handling
+            - availabilities: Speaker id -> list of positive availability ranges
+        """
+        data = {
+            "event_speakers": defaultdict(list),
+            "speaker_events": defaultdict(set),
+            "speaker_conflicts": defaultdict(list),
+            "conflict_slots": defaultdict(list),
+            "availabilities": defaultdict(list),
+        }
+
+        # speaker <> event relations for the events we are scheduling
+        for speaker_id, event_id in (
+            Speaker.events.through.objects.filter(event_id__in=event_ids)
+            .order_by("pk")
+            .values_list("speaker_id", "event_id")
+        ):
+            data["event_speakers"][event_id].append(speaker_id)
+            data["speaker_events"][speaker_id].add(event_id)
+        speaker_ids = list(data["speaker_events"].keys())
+
+        # the events each speaker wishes to attend
+        for speaker_id, event_id in (
+            Speaker.event_conflicts.through.objects.filter(speaker_id__in=speaker_ids)
+            .order_by("pk")
+            .values_list("speaker_id", "event_id")
+        ):
+            data["speaker_conflicts"][speaker_id].append(event_id)
+
+        # the scheduled slots of conflicting events which we are not scheduling
+        unhandled = {
+            event_id
+            for conflicts in data["speaker_conflicts"].values()
+            for event_id in conflicts
+            if event_id not in event_ids
+        }
+        for event_id, when in EventSlot.objects.filter(
+            event_id__in=unhandled,
+        ).values_list("event_id", "when"):
+            data["conflict_slots"][event_id].append(when)
+
+        # positive availability for all speakers
+        for speaker_id, when in SpeakerAvailability.objects.filter(
+            speaker_id__in=speaker_ids,
+            available=True,
+        ).values_list("speaker_id", "when"):
+            data["availabilities"][speaker_id].append(when)
+
+        return data
+
+    def get_autoslots_between(self, lower, upper):
+        """Return the indexes of autoslots starting in the period from lower
+        (inclusive) to upper (exclusive), using the sorted autoslot index"""
+        first = bisect_left(self._autoslot_starts, lower)
+        last = bisect_left(self._autoslot_starts, upper)
+        return self._autoslot_order[first:last]
+
+    def get_overlapping_autoslots(self, when):
+        """Return the indexes of autoslots overlapping the DateTimeTZRange when (with "[)" bounds)"""
+        return [
+            index
+            for index in self.get_autoslots_between(
+                when.lower - self._max_autoslot_duration,
+                when.upper,
+            )
+            if self._autoslot_ends[index] > when.lower
+        ]
+
     def get_autoevents(
         self,
         events,
@@ -105,114 +235,126 @@ class AutoScheduler:
         speaker_event_conflicts_constraint=True,
         speaker_availability_constraint=True,
     ):
-        """Return a list of resources.Event objects, one for each Event"""
+        """Return a list of resources.Event objects, one for each Event.
+
+        All data is loaded up front in a fixed number of queries, and constraints
+        are built from in-memory lookup dicts, so this scales linearly with the
+        number of Events."""
+        # build a sorted index of autoslot start times so we can find overlapping slots quickly
+        self._autoslot_ends = [
+            slot.starts_at + timedelta(minutes=slot.duration) for slot in self.autoslots
+        ]
+        self._autoslot_order = sorted(
+            range(len(self.autoslots)),
+            key=lambda index: self.autoslots[index].starts_at,
+        )
+        self._autoslot_starts = [
+            self.autoslots[index].starts_at for index in self._autoslot_order
+        ]
+        self._max_autoslot_duration = timedelta(
+            minutes=max((slot.duration for slot in self.autoslots), default=0),
+        )
+
         autoevents = []
         autoeventindex = {}
         eventindex = {}
-        for event in events:
+        for event in events.select_related("event_type").prefetch_related("tags"):
+            # create a dict of events with the autoevent index as key and the Event as value
+            autoeventindex[len(autoevents)] = event
+            # create a dict of event ids with the Event id as key and the autoevent index as value
+            eventindex[event.id] = len(autoevents)
             autoevents.append(
                 resources.Event(
                     name=event.id,
                     duration=event.duration_minutes,
-                    tags=event.tags.names(),
+                    tags=[tag.name for tag in event.tags.all()],
                     demand=event.demand,
                 ),
             )
-            # create a dict of events with the autoevent index as key and the Event as value
-            autoeventindex[autoevents.index(autoevents[-1])] = event
-            # create a dict of events with the Event as key and the autoevent index as value
-            eventindex[event] = autoevents.index(autoevents[-1])
+
+        data = self.get_speaker_data(event_ids=set(eventindex.keys()))
+
+        # the slots of all other EventTypes, per EventType id
+        other_event_type_slots = {}
+        for et in self.event_types:
+            other_event_type_slots[et.id] = [
+                slot
+                for other, slots in self.event_type_slots.items()
+                if other.id != et.id
+                for slot in slots
+            ]
+
+        # per speaker lists of autoslots, built the first time each speaker is seen
+        speaker_conflict_slots = {}
+        speaker_unavailable_slots = {}
 
         # loop over all autoevents to add unavailability...
         # (we have to do this in a seperate loop because we need all the autoevents to exist)
-        for autoevent in autoevents:
+        for index, autoevent in enumerate(autoevents):
+            event = autoeventindex[index]
             if event_type_constraint:
-                # get the Event
-                event = autoeventindex[autoevents.index(autoevent)]
-                # loop over all other event_types...
-                for et in self.event_types.all().exclude(pk=event.event_type.pk):
-                    if et in self.event_type_slots:
-                        # and add all slots for this EventType as unavailable for this event,
-                        # this means we don't schedule a talk in a workshop slot and vice versa.
-                        autoevent.add_unavailability(*self.event_type_slots[et])
+                # add all slots for other EventTypes as unavailable for this event,
+                # this means we don't schedule a talk in a workshop slot and vice versa.
+                autoevent.add_unavailability(
+                    *other_event_type_slots.get(event.event_type_id, []),
+                )
 
             # loop over all speakers for this event and add event conflicts
-            for speaker in event.speakers.all():
+            for speaker_id in data["event_speakers"][event.id]:
                 if speakers_other_events_constraint:
                     # loop over other events featuring this speaker, register each conflict,
                     # this means we dont schedule two events for the same speaker at the same time
-                    conflict_ids = speaker.events.exclude(id=event.id).values_list(
-                        "id",
-                        flat=True,
-                    )
-                    for conflictevent in autoevents:
-                        if conflictevent.name in conflict_ids:
-                            # only the event with the lowest index gets the unavailability,
-                            if autoevents.index(conflictevent) > autoevents.index(
-                                autoevent,
-                            ):
-                                autoevent.add_unavailability(conflictevent)
+                    for conflictindex in sorted(
+                        eventindex[event_id]
+                        for event_id in data["speaker_events"][speaker_id]
+                    ):
+                        # only the event with the lowest index gets the unavailability,
+                        if conflictindex > index:
+                            autoevent.add_unavailability(autoevents[conflictindex])
 
                 if speaker_event_conflicts_constraint:
                     # loop over event_conflicts for this speaker, register unavailability for each,
                     # this means we dont schedule this event at the same time as something the
                     # speaker wishes to attend.
                     # Only process Events which the AutoScheduler is handling
-                    for conflictevent in speaker.event_conflicts.filter(
-                        pk__in=events.values_list("pk", flat=True),
-                    ):
+                    for event_id in data["speaker_conflicts"][speaker_id]:
                         # only the event with the lowest index gets the unavailability
-                        if eventindex[conflictevent] > autoevents.index(autoevent):
+                        if event_id in eventindex and eventindex[event_id] > index:
                             autoevent.add_unavailability(
-                                autoevents[eventindex[conflictevent]],
+                                autoevents[eventindex[event_id]],
                             )
 
-                    # loop over event_conflicts for this speaker, register unavailability for each,
-                    # only process Events which the AutoScheduler is not handling, and which have
-                    # been scheduled in one or more EventSlots
-                    for conflictevent in speaker.event_conflicts.filter(
-                        event_slots__isnull=False,
-                    ).exclude(pk__in=events.values_list("pk", flat=True)):
-                        # loop over the EventSlots this conflict is scheduled in
-                        for conflictslot in conflictevent.event_slots.all():
-                            # loop over all slots
-                            for slot in self.autoslots:
-                                # check if this slot overlaps with the conflictevents slot
-                                if conflictslot.when & DateTimeTZRange(
-                                    slot.starts_at,
-                                    slot.starts_at + timedelta(minutes=slot.duration),
-                                ):
-                                    # this slot overlaps with the conflicting event
-                                    autoevent.add_unavailability(slot)
+                    # register unavailability for all slots overlapping with scheduled
+                    # EventSlots for Events which the AutoScheduler is not handling
+                    if speaker_id not in speaker_conflict_slots:
+                        speaker_conflict_slots[speaker_id] = [
+                            self.autoslots[slotindex]
+                            for event_id in data["speaker_conflicts"][speaker_id]
+                            for when in data["conflict_slots"][event_id]
+                            for slotindex in self.get_overlapping_autoslots(when)
+                        ]
+                    autoevent.add_unavailability(*speaker_conflict_slots[speaker_id])
 
                 if speaker_availability_constraint:
                     # Register all slots where we have no positive availability
                     # for this speaker as unavailable
-                    available = []
-                    for availability in speaker.availabilities.filter(
-                        available=True,
-                    ).values_list("when", flat=True):
-                        availability = DateTimeTZRange(
-                            availability.lower,
-                            availability.upper,
-                            "()",
-                        )
-                        for slot in self.autoslots:
-                            slotrange = DateTimeTZRange(
-                                slot.starts_at,
-                                slot.starts_at + timedelta(minutes=slot.duration),
-                                "()",
-                            )
-                            if slotrange in availability:
-                                # the speaker is available for this slot
-                                available.append(self.autoslots.index(slot))
-                    autoevent.add_unavailability(
-                        *[
-                            s
-                            for s in self.autoslots
-                            if not self.autoslots.index(s) in available
-                        ],
-                    )
+                    if speaker_id not in speaker_unavailable_slots:
+                        available = set()
+                        for availability in data["availabilities"][speaker_id]:
+                            # the speaker is available for all slots which are
+                            # fully contained in this availability
+                            for slotindex in self.get_autoslots_between(
+                                availability.lower,
+                                availability.upper,
+                            ):
+                                if self._autoslot_ends[slotindex] <= availability.upper:
+                                    available.add(slotindex)
+                        speaker_unavailable_slots[speaker_id] = [
+                            slot
+                            for slotindex, slot in enumerate(self.autoslots)
+                            if slotindex not in available
+                        ]
+                    autoevent.add_unavailability(*speaker_unavailable_slots[speaker_id])
 
         return autoevents, autoeventindex
 
@@ -222,34 +364,34 @@ class AutoScheduler:
         objects, one for each scheduled Event. This function is useful for creating an "original
         schedule" to base a new similar schedule off of."""
 
+        # build lookup dicts so we can find autoevents and autoslots quickly
+        autoevents = {autoevent.name: autoevent for autoevent in self.autoevents}
+        autoslots = {}
+        for autoslot in self.autoslots:
+            key = (autoslot.venue, autoslot.starts_at)
+            if key not in autoslots:
+                autoslots[key] = []
+            autoslots[key].append(autoslot)
+
         # loop over scheduled events and create a ScheduledItem object for each
         autoschedule = []
         for slot in self.camp.event_slots.filter(
             autoscheduled=True,
             event__in=self.events,
-        ):
-            # loop over all autoevents to find the index of this event
-            for autoevent in self.autoevents:
-                if autoevent.name == slot.event.id:
-                    # we need the index number of the event
-                    eventindex = self.autoevents.index(autoevent)
-                    break
-
-            # loop over the autoslots to find the index of the autoslot this event is scheduled in
+        ).select_related("event__event_type", "event_session__event_location"):
+            # find the autoslot this event is scheduled in
             scheduled = False
-            for autoslot in self.autoslots:
-                if (
-                    autoslot.venue == slot.event_location.id
-                    and autoslot.starts_at == slot.when.lower
-                    and autoslot.session
-                    in self.event_type_sessions[slot.event.event_type]
-                ):
+            for autoslot in autoslots.get(
+                (slot.event_location.id, slot.when.lower),
+                [],
+            ):
+                if autoslot.session in self.event_type_sessions[slot.event.event_type]:
                     # This autoslot starts at the same time as the EventSlot, and at the same
                     # location. It also has the session ID of a session with the right EventType.
                     autoschedule.append(
                         resources.ScheduledItem(
-                            event=self.autoevents[eventindex],
-                            slot=self.autoslots[self.autoslots.index(autoslot)],
+                            event=autoevents[slot.event.id],
+                            slot=autoslot,
                         ),
                     )
                     scheduled = True
@@ -264,26 +406,41 @@ class AutoScheduler:
         # schedule can still be used as a basis for creating a new similar schedule.
         return autoschedule
 
-    def calculate_autoschedule(self, original_schedule=None):
+    def calculate_autoschedule(self, original_schedule=None, events=None, slots=None):
         """Calculate autoschedule based on self.autoevents and self.autoslots,
-        optionally using original_schedule to minimise changes"""
+        optionally using original_schedule to minimise changes. Pass events and/or
+        slots to solve a subset of the problem instead (incremental scheduling)."""
         kwargs = {}
-        kwargs["events"] = self.autoevents
-        kwargs["slots"] = self.autoslots
+        kwargs["events"] = self.autoevents if events is None else events
+        kwargs["slots"] = self.autoslots if slots is None else slots
+        kwargs["solver"] = self.get_solver()
 
         # include another schedule in the calculation?
         if original_schedule:
             kwargs["original_schedule"] = original_schedule
             kwargs["objective_function"] = objective_functions.number_of_changes
         else:
-            # otherwise use the capacity demand difference thing
-            kwargs["objective_function"] = (
-                objective_functions.efficiency_capacity_demand_difference
-            )
+            # otherwise use the chosen capacity demand difference thing
+            kwargs["objective_function"] = AUTOSCHEDULER_OBJECTIVES[self.objective]
         # calculate the new schedule
+        start = time.monotonic()
         autoschedule = scheduler.schedule(**kwargs)
+        logger.info(
+            f"Calculated a schedule with {len(autoschedule)} Events in {len(kwargs['slots'])} slots in {time.monotonic() - start:.2f} seconds",
+        )
         return autoschedule
 
+    def get_solver(self):
+        """Return a PuLP CBC solver using the solver options of this AutoScheduler.
+        CBC returns the best feasible solution found when it hits the time limit,
+        and no solution (a ValueError from the scheduler) if it found none."""
+        return pulp.PULP_CBC_CMD(
+            msg=False,
+            timeLimit=self.time_limit or None,
+            threads=self.threads,
+            gapRel=self.gap,
+        )
+
     def calculate_similar_autoschedule(self, original_schedule=None):
         """Convenience method for creating similar schedules. If original_schedule
         is omitted the new schedule is based on the current schedule instead"""
@@ -297,45 +454,377 @@ class AutoScheduler:
         diff = self.diff(original_schedule, autoschedule)
         return autoschedule, diff
 
-    def apply(self, autoschedule):
-        """Apply an autoschedule by creating EventInstance objects to match it"""
+    def get_event_conflicts(self):
+        """Return a dict of sets with the names of the autoevents each autoevent
+        conflicts with, in both directions, including Events sharing a tag"""
+        conflicts = {autoevent.name: set() for autoevent in self.autoevents}
+        tags = {}
+        for autoevent in self.autoevents:
+            for u in autoevent.unavailability:
+                if isinstance(u, resources.Event):
+                    conflicts[autoevent.name].add(u.name)
+                    conflicts[u.name].add(autoevent.name)
+            for tag in autoevent.tags:
+                if tag not in tags:
+                    tags[tag] = set()
+                tags[tag].add(autoevent.name)
+        for names in tags.values():
+            for name in names:
+                conflicts[name].update(names - {name})
+        return conflicts
+
+    def get_touched_events(self, original_schedule, event_ids=None):
+        """
+        Return a set of Event ids which need to be (re)scheduled by an incremental
+        autoschedule run. An Event is touched if:
+
+            - it is in event_ids (for example Events in a changed EventSession, or
+              Events with a withdrawn speaker)
+            - it is not in the original schedule (a new Event, or an Event whose
+              EventSlot no longer exists)
+            - it is scheduled in a slot where it is unavailable, or at the same time
+              as another scheduled Event it conflicts with
+        """
+        touched = set(event_ids or [])
+        scheduled = {item.event.name for item in original_schedule}
+        touched.update(
+            autoevent.name
+            for autoevent in self.autoevents
+            if autoevent.name not in scheduled
+        )
 
-        # "The Clean Slate protocol sir?" - delete any existing autoscheduled Events
-        # TODO: investigate how this affects the FRAB XML export (for which we added a UUID on
-        # Slot objects). Make sure "favourite" functionality or bookmarks or w/e in
-        # FRAB clients still work after a schedule "re"apply. We might need a smaller hammer here.
-        deleted = self.camp.event_slots.filter(
-            # get all autoscheduled EventSlots
-            autoscheduled=True,
-        ).update(
-            # clear the Event
-            event=None,
-            # and autoscheduled status
-            autoscheduled=None,
+        # find items scheduled in a slot they are unavailable for
+        for item in original_schedule:
+            if (
+                item.slot in item.event.unavailability
+                or item.event.duration > item.slot.duration
+            ):
+                touched.add(item.event.name)
+
+        # find items clashing with other items, sweep over the items in start time order
+        conflicts = self.get_event_conflicts()
+        items = sorted(original_schedule, key=lambda item: item.slot.starts_at)
+        for index, item in enumerate(items):
+            for other in items[index + 1 :]:
+                if not self.slots_overlap(item.slot, other.slot):
+                    if other.slot.starts_at >= item.slot.starts_at + timedelta(
+                        minutes=item.slot.duration,
+                    ):
+                        # no more overlapping items
+                        break
+                    continue
+                if other.event.name in conflicts[item.event.name]:
+                    # the latest scheduled Event has to move
+                    touched.add(other.event.name)
+        return touched
+
+    def calculate_incremental_autoschedule(
+        self,
+        original_schedule=None,
+        event_ids=None,
+    ):
+        """
+        Calculate a new schedule by only re-solving the Events touched by changes
+        since the current schedule was applied, see get_touched_events(). All other
+        Events stay in their current slots, and only the free slots are considered.
+        If original_schedule is omitted the current schedule is used.
+
+        Returns the full new autoschedule (usable with apply()) and the diff.
+        """
+        if not original_schedule:
+            original_schedule = self.build_current_autoschedule()
+        touched = self.get_touched_events(original_schedule, event_ids=event_ids)
+        if not touched:
+            # nothing to do, the current schedule is the new schedule
+            return original_schedule, self.diff(original_schedule, original_schedule)
+
+        fixed = [item for item in original_schedule if item.event.name not in touched]
+        used_slots = {item.slot for item in fixed}
+        slots = [slot for slot in self.autoslots if slot not in used_slots]
+        conflicts = self.get_event_conflicts()
+
+        # build a copy of each touched autoevent where conflicts with fixed Events are
+        # turned into unavailability for the slots overlapping the fixed Events
+        events = {}
+        originals = {}
+        for autoevent in self.autoevents:
+            if autoevent.name not in touched:
+                continue
+            unavailability = [
+                u for u in autoevent.unavailability if isinstance(u, resources.Slot)
+            ]
+            for item in fixed:
+                if item.event.name in conflicts[autoevent.name]:
+                    unavailability += [
+                        slot for slot in slots if self.slots_overlap(slot, item.slot)
+                    ]
+            events[autoevent.name] = resources.Event(
+                name=autoevent.name,
+                duration=autoevent.duration,
+                tags=list(autoevent.tags),
+                demand=autoevent.demand,
+                unavailability=unavailability,
+            )
+            originals[autoevent.name] = autoevent
+
+        # conflicts between touched Events must point at the copies
+        for autoevent in originals.values():
+            events[autoevent.name].add_unavailability(
+                *[
+                    events[u.name]
+                    for u in autoevent.unavailability
+                    if isinstance(u, resources.Event) and u.name in events
+                ],
+            )
+
+        # keep touched Events in their current slot if possible
+        sub_schedule = [
+            resources.ScheduledItem(event=events[item.event.name], slot=item.slot)
+            for item in original_schedule
+            if item.event.name in touched and item.slot not in used_slots
+        ]
+
+        sub_autoschedule = self.calculate_autoschedule(
+            original_schedule=sub_schedule,
+            events=list(events.values()),
+            slots=slots,
         )
 
-        # loop and schedule events
-        scheduled = 0
-        for item in autoschedule:
-            # each item is an instance of conference_scheduler.resources.ScheduledItem
-            event = self.camp.events.get(id=item.event.name)
-            slot = self.camp.event_slots.get(
-                event_session_id=item.slot.session,
-                when=DateTimeTZRange(
-                    item.slot.starts_at,
-                    item.slot.starts_at + timedelta(minutes=item.slot.duration),
-                    "[)",  # remember to use the correct bounds when comparing
-                ),
+        # put the schedule back together using the original autoevents
+        autoschedule = fixed + [
+            resources.ScheduledItem(event=originals[item.event.name], slot=item.slot)
+            for item in sub_autoschedule
+        ]
+        diff = self.diff(original_schedule, autoschedule)
+        return autoschedule, diff
+
+    @staticmethod
+    def slots_overlap(slot, other):
+        """Return True if the two autoslots overlap in time"""
+        return slot.starts_at < other.starts_at + timedelta(
+            minutes=other.duration,
+        ) and other.starts_at < slot.starts_at + timedelta(minutes=slot.duration)
+
+    def apply(self, autoschedule, original_schedule=None):
+        """Apply an autoschedule by scheduling Events in EventSlots to match it.
+
+        If original_schedule is given only the differences between the two schedules
+        are applied, leaving all other EventSlots alone.
+
+        The whole schedule is loaded and validated in memory with the same rules as
+        EventSlot.clean_speakers() and EventSlot.clean_location(), see
+        validate_assignments(), and written with bulk updates in one transaction.
+        Nothing is changed if a ValidationError is raised."""
+        if is_camp_read_only(self.camp.pk):
+            raise CampReadOnlyModeError(f"The camp {self.camp} is in read only mode.")
+
+        if original_schedule is not None:
+            # only unschedule and reschedule the Events which moved
+            changes = scheduler.event_schedule_difference(
+                original_schedule,
+                autoschedule,
+            )
+            moved = {item.event.name for item in changes}
+            unschedule = self.camp.event_slots.filter(
+                autoscheduled=True,
+                event_id__in=moved,
+            )
+            autoschedule = [item for item in autoschedule if item.event.name in moved]
+        else:
+            # "The Clean Slate protocol sir?" - unschedule any existing autoscheduled Events
+            # TODO: investigate how this affects the FRAB XML export (for which we added a UUID on
+            # Slot objects). Make sure "favourite" functionality or bookmarks or w/e in
+            # FRAB clients still work after a schedule "re"apply. We might need a smaller hammer here.
+            unschedule = self.camp.event_slots.filter(autoscheduled=True)
+
+        with transaction.atomic():
+            # lock the EventSlots we unschedule and the EventSlots we schedule in
+            unscheduled_ids = set(
+                EventSlot.objects.select_for_update()
+                .filter(pk__in=unschedule.values("pk"))
+                .values_list("pk", flat=True),
+            )
+            slots = {
+                (slot.event_session_id, slot.when.lower): slot
+                for slot in EventSlot.objects.select_for_update(of=("self",))
+                .filter(
+                    event_session__camp=self.camp,
+                    event_session_id__in={item.slot.session for item in autoschedule},
+                )
+                .select_related(
+                    "event_session__camp",
+                    "event_session__event_location",
+                )
+            }
+            events = (
+                self.camp.events.select_related(
+                    "event_type",
+                    "track",
+                    "proposal__user",
+                )
+                .prefetch_related("speakers")
+                .in_bulk({item.event.name for item in autoschedule})
             )
-            slot.event = event
-            slot.autoscheduled = True
-            slot.save()
-            add_event_scheduled_email(slot)
 
-            scheduled += 1
+            # find the EventSlot and Event for each item
+            assignments = []
+            for item in autoschedule:
+                # each item is an instance of conference_scheduler.resources.ScheduledItem
+                slot = slots.get((item.slot.session, item.slot.starts_at))
+                if slot is None or slot.duration_minutes != item.slot.duration:
+                    raise ValidationError(
+                        f"There is no EventSlot in EventSession {item.slot.session} at {item.slot.starts_at}",
+                    )
+                if item.event.name not in events:
+                    raise ValidationError(
+                        f"There is no Event with id {item.event.name} in {self.camp}",
+                    )
+                if slot.event_id and slot.pk not in unscheduled_ids:
+                    raise ValidationError(
+                        f"The EventSlot {slot} already has an Event scheduled",
+                    )
+                assignments.append((slot, events[item.event.name]))
+            self.validate_assignments(assignments, unscheduled_ids)
+
+            # unschedule and schedule with one query each
+            now = timezone.now()
+            deleted = EventSlot.objects.filter(pk__in=unscheduled_ids).update(
+                # clear the Event
+                event=None,
+                # and autoscheduled status
+                autoscheduled=None,
+                updated=now,
+            )
+            for slot, event in assignments:
+                slot.event = event
+                slot.autoscheduled = True
+                slot.updated = now
+            scheduled_slots = [slot for slot, event in assignments]
+            EventSlot.objects.bulk_update(
+                scheduled_slots,
+                ["event", "autoscheduled", "updated"],
+            )
+            add_event_scheduled_emails(scheduled_slots)
+
+            # the bulk updates bypass the signals sending schedule deltas and keeping
+            # the ICS and Frab caches up to date, so do the same here
+            camp_slug = self.camp.slug
+            for slot_id in unscheduled_ids - {slot.pk for slot in scheduled_slots}:
+                broadcast_schedule_delta(camp_slug, "event_slot", "delete", slot_id)
+            for slot in scheduled_slots:
+                broadcast_schedule_delta(
+                    camp_slug,
+                    "event_slot",
+                    "update",
+                    slot.id,
+                    slot.serialize(),
+                )
+            transaction.on_commit(lambda: invalidate_camp_ics(camp_slug))
+            transaction.on_commit(lambda: mark_camp_frab_dirty(camp_slug))
 
         # return the numbers
-        return deleted, scheduled
+        return deleted, len(assignments)
+
+    @staticmethod
+    def find_overlaps(intervals):
+        """Yield pairs of overlapping (when, new, label) intervals where at least one
+        of them is new. when is a DateTimeTZRange with "[)" bounds."""
+        active = []
+        for interval in sorted(intervals, key=lambda interval: interval[0].lower):
+            when, new, label = interval
+            active = [other for other in active if other[0].upper > when.lower]
+            for other in active:
+                if new or other[1]:
+                    yield other, interval
+            active.append(interval)
+
+    def validate_assignments(self, assignments, unscheduled_ids):
+        """
+        Validate a list of (EventSlot, Event) assignments against each other and
+        against the rest of the schedule after the EventSlots in unscheduled_ids
+        have been unscheduled, using a fixed number of queries. Raises ValidationError if:
+
+            - an Event or EventSlot is used more than once
+            - an EventLocation has overlapping Events
+            - a Speaker has overlapping Events
+            - a Speaker who has registered availability is not available
+        """
+        slot_ids = set()
+        event_ids = set()
+        for slot, event in assignments:
+            if slot.pk in slot_ids:
+                raise ValidationError(f"The EventSlot {slot} is used more than once")
+            if event.pk in event_ids:
+                raise ValidationError(f"The Event {event} is scheduled more than once")
+            slot_ids.add(slot.pk)
+            event_ids.add(event.pk)
+
+        # the rest of the schedule as (when, location id, event id) tuples
+        remaining = list(
+            self.camp.event_slots.filter(event__isnull=False)
+            .exclude(pk__in=unscheduled_ids | slot_ids)
+            .values_list("when", "event_session__event_location_id", "event_id"),
+        )
+
+        # locations can only have one Event at a time
+        locations = defaultdict(list)
+        for when, location_id, event_id in remaining:
+            locations[location_id].append((when, False, None))
+        for slot, event in assignments:
+            locations[slot.event_location.id].append((slot.when, True, slot))
+        for intervals in locations.values():
+            for first, second in self.find_overlaps(intervals):
+                slot = second[2] or first[2]
+                raise ValidationError(
+                    f"The location {slot.event_location} is not available at this time",
+                )
+
+        # speakers can only be in one Event at a time
+        speaker_ids = {
+            speaker.pk
+            for slot, event in assignments
+            for speaker in event.speakers.all()
+        }
+        speaker_events = defaultdict(set)
+        for speaker_id, event_id in Speaker.events.through.objects.filter(
+            speaker_id__in=speaker_ids,
+        ).values_list("speaker_id", "event_id"):
+            speaker_events[speaker_id].add(event_id)
+        for speaker_id, events in speaker_events.items():
+            intervals = [
+                (when, False, None)
+                for when, location_id, event_id in remaining
+                if event_id in events
+            ] + [
+                (slot.when, True, slot)
+                for slot, event in assignments
+                if event.pk in events
+            ]
+            for first, second in self.find_overlaps(intervals):
+                raise ValidationError(
+                    f"The speaker {Speaker.objects.get(pk=speaker_id)} is not available at this time",
+                )
+
+        # speakers with registered availability must be available for the whole slot
+        availabilities = defaultdict(list)
+        for speaker_id, when, available in SpeakerAvailability.objects.filter(
+            speaker_id__in=speaker_ids,
+        ).values_list("speaker_id", "when", "available"):
+            availabilities[speaker_id].append((when, available))
+        for slot, event in assignments:
+            for speaker in event.speakers.all():
+                if speaker.pk not in availabilities:
+                    # no availability at all for this speaker, assume they are available
+                    continue
+                if not any(
+                    available
+                    and when.lower <= slot.when.lower
+                    and slot.when.upper <= when.upper
+                    for when, available in availabilities[speaker.pk]
+                ):
+                    raise ValidationError(
+                        f"The speaker {speaker} is not available at this time",
+                    )
 
     def diff(self, original_schedule, new_schedule):
         """
@@ -405,6 +894,89 @@ class AutoScheduler:
         # all good
         return {"event_diffs": event_output, "slot_diffs": slot_output}
 
+    @staticmethod
+    def serialize_autoschedule(autoschedule):
+        """Return a JSON serialisable list with a dict for each ScheduledItem in the
+        autoschedule, used to store calculated schedules on AutoScheduleJob objects"""
+        return [
+            {
+                "event": item.event.name,
+                "session": item.slot.session,
+                "venue": item.slot.venue,
+                "starts_at": item.slot.starts_at.isoformat(),
+                "duration": item.slot.duration,
+            }
+            for item in autoschedule
+        ]
+
+    def deserialize_autoschedule(self, data):
+        """Turn the output of serialize_autoschedule() back into an autoschedule using
+        the autoevents and autoslots of this AutoScheduler. Raises ValueError if an
+        Event or slot in the schedule no longer exists."""
+        autoevents = {autoevent.name: autoevent for autoevent in self.autoevents}
+        autoslots = {
+            (autoslot.session, autoslot.starts_at): autoslot
+            for autoslot in self.autoslots
+        }
+        autoschedule = []
+        for item in data:
+            autoevent = autoevents.get(item["event"])
+            autoslot = autoslots.get(
+                (item["session"], datetime.fromisoformat(item["starts_at"])),
+            )
+            if autoevent is None or autoslot is None:
+                raise ValueError(
+                    f"Event {item['event']} or the slot at {item['starts_at']} in session {item['session']} can no longer be autoscheduled",
+                )
+            autoschedule.append(
+                resources.ScheduledItem(event=autoevent, slot=autoslot),
+            )
+        return autoschedule
+
+    @staticmethod
+    def serialize_diff(diff):
+        """Return a JSON serialisable copy of the output of diff(), Events and
+        EventLocations are replaced by dicts with the fields the templates use"""
+
+        def event(value):
+            if isinstance(value, int):
+                # the Event was deleted
+                return value
+            return {"id": value.id, "title": value.title, "slug": value.slug}
+
+        def location(value):
+            return {"id": value.id, "name": value.name}
+
+        def side(value):
+            output = {}
+            if "event" in value:
+                output["event"] = event(value["event"])
+            if "event_location" in value:
+                output["event_location"] = location(value["event_location"])
+            if "starttime" in value:
+                output["starttime"] = value["starttime"].isoformat()
+            return output
+
+        return {
+            "event_diffs": [
+                {
+                    "event": event(item["event"]),
+                    "old": side(item["old"]),
+                    "new": side(item["new"]),
+                }
+                for item in diff["event_diffs"]
+            ],
+            "slot_diffs": [
+                {
+                    "event_location": location(item["event_location"]),
+                    "starttime": item["starttime"].isoformat(),
+                    "old": side(item["old"]),
+                    "new": side(item["new"]),
+                }
+                for item in diff["slot_diffs"]
+            ],
+        }
+
     def is_valid(self, autoschedule, return_violations=False):
         """Check if a schedule is valid, optionally returning a list of violations if invalid"""
         valid = is_valid_schedule(
@@ -0,0 +1,161 @@
+import logging
+from datetime import timedelta
+
+from django.utils import timezone
+
+from program.autoscheduler import AutoScheduler
+from program.models import AutoScheduleJob
+from utils.jobs import claim_pending_job
+from utils.jobs import fail_job
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+# running jobs started longer ago than this are failed by claim_pending_job()
+AUTOSCHEDULE_JOB_TIMEOUT = timedelta(hours=2)
+
+
+def do_work():
+    """
+    The autoschedule worker runs pending AutoScheduleJobs, oldest first, so the
+    backoffice never has to solve a schedule inside a request.
+    Run with: manage.py run_managepy_worker program.autoscheduleworker --sleep 10
+    """
+    while True:
+        job = claim_job()
+        if job is None:
+            return
+        run_job(job)
+
+
+def claim_job():
+    """Return the oldest pending job after marking it as running, or None"""
+    return claim_pending_job(
+        AutoScheduleJob.objects.select_related("camp"),
+        AUTOSCHEDULE_JOB_TIMEOUT,
+    )
+
+
+def run_job(job):
+    """Calculate the schedule for the job unless it was calculated already, and
+    apply it if the job asks for it"""
+    logger.info(f"Running {job}")
+    try:
+        if job.autoschedule is None:
+            scheduler, autoschedule, original_autoschedule = calculate_job(job)
+        else:
+            # the schedule was calculated by an earlier run of this job
+            scheduler, autoschedule, original_autoschedule = load_job(job)
+        if job.apply and job.valid:
+            apply_job(job, scheduler, autoschedule, original_autoschedule)
+        elif job.apply:
+            job.result = f"{job.result} Schedule is NOT valid, cannot apply!"
+        job.status = AutoScheduleJob.STATUS_DONE
+        job.progress = 100
+        job.progress_text = "Done"
+        job.finished = timezone.now()
+        job.save()
+    except Exception as E:
+        logger.exception(f"Got exception while running {job}")
+        fail_job(job, f"{job.result} {E}".strip())
+        return
+    logger.info(f"Finished {job}: {job.result}")
+
+
+def calculate_job(job):
+    """Build the AutoScheduler model, calculate the schedule and store it, its
+    diff and its violations on the job"""
+    job.set_progress(5, "Building the AutoScheduler model")
+    scheduler = AutoScheduler(camp=job.camp, **job.options)
+    summary = f"AutoScheduler has {len(scheduler.autoslots)} Slots based on {scheduler.event_sessions.count()} EventSessions for {scheduler.event_types.count()} EventTypes."
+
+    original_autoschedule = None
+    diff = None
+    if job.schedule == AutoScheduleJob.SCHEDULE_CURRENT:
+        job.set_progress(30, "Building the current schedule")
+        autoschedule = scheduler.build_current_autoschedule()
+        message = f"{summary} {scheduler.events.count()} Events in the schedule."
+    else:
+        if job.schedule != AutoScheduleJob.SCHEDULE_NEW:
+            job.set_progress(20, "Building the current schedule")
+            original_autoschedule = scheduler.build_current_autoschedule()
+        job.set_progress(30, f"Solving the {job.get_schedule_display().lower()}")
+        try:
+            if job.schedule == AutoScheduleJob.SCHEDULE_SIMILAR:
+                autoschedule, diff = scheduler.calculate_similar_autoschedule(
+                    original_autoschedule,
+                )
+            elif job.schedule == AutoScheduleJob.SCHEDULE_INCREMENTAL:
+                autoschedule, diff = scheduler.calculate_incremental_autoschedule(
+                    original_autoschedule,
+                )
+            else:
+                autoschedule = scheduler.calculate_autoschedule()
+        except ValueError:
+            job.result = "Unable to calculate autoschedule, no valid solution found!"
+            raise
+        if diff:
+            message = f"{summary} Differences to the current schedule: {len(diff['event_diffs'])} Event diffs and {len(diff['slot_diffs'])} Slot diffs."
+        else:
+            message = f"{summary} {scheduler.events.count()} Events in the schedule."
+
+    job.set_progress(80, "Validating the schedule")
+    valid, violations = scheduler.is_valid(autoschedule, return_violations=True)
+    if original_autoschedule is not None:
+        job.original_autoschedule = scheduler.serialize_autoschedule(
+            original_autoschedule,
+        )
+    job.autoschedule = scheduler.serialize_autoschedule(autoschedule)
+    job.diff = scheduler.serialize_diff(diff) if diff else None
+    job.valid = valid
+    job.violations = list(violations)
+    if valid:
+        job.result = f"The {job.get_schedule_display().lower()} is valid! {message}"
+    else:
+        job.result = f"The {job.get_schedule_display().lower()} is NOT valid! {message}"
+    job.save()
+    return scheduler, autoschedule, original_autoschedule
+
+
+def load_job(job):
+    """Build the AutoScheduler model and load the schedule stored on the job. Raises
+    ValueError if the schedule no longer matches the data in the database."""
+    job.set_progress(5, "Building the AutoScheduler model")
+    scheduler = AutoScheduler(camp=job.camp, **job.options)
+    job.set_progress(50, "Loading the calculated schedule")
+    autoschedule = scheduler.deserialize_autoschedule(job.autoschedule)
+    original_autoschedule = None
+    if job.schedule == AutoScheduleJob.SCHEDULE_INCREMENTAL:
+        # an incremental schedule only moves some Events, so the schedule it was
+        # calculated from must still be the current schedule
+        current = scheduler.serialize_autoschedule(
+            scheduler.build_current_autoschedule(),
+        )
+        if get_schedule_keys(current) != get_schedule_keys(job.original_autoschedule):
+            raise ValueError(
+                "The current schedule has changed since this incremental schedule was calculated, please calculate a new schedule.",
+            )
+        original_autoschedule = scheduler.deserialize_autoschedule(
+            job.original_autoschedule,
+        )
+    if not scheduler.is_valid(autoschedule):
+        raise ValueError(
+            "The calculated schedule is no longer valid, please calculate a new schedule.",
+        )
+    return scheduler, autoschedule, original_autoschedule
+
+
+def get_schedule_keys(data):
+    """Return a set of (Event, session, start time) tuples for a serialized autoschedule"""
+    return {(item["event"], item["session"], item["starts_at"]) for item in data}
+
+
+def apply_job(job, scheduler, autoschedule, original_autoschedule):
+    """Apply the calculated schedule of the job"""
+    job.set_progress(85, "Applying the schedule")
+    deleted, scheduled = scheduler.apply(
+        autoschedule,
+        original_schedule=original_autoschedule,
+    )
+    job.applied = timezone.now()
+    job.result = f"{job.result} Schedule has been applied! {deleted} Events removed from schedule, {scheduled} new Events scheduled."
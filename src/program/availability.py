@@ -0,0 +1,145 @@
+import logging
+from bisect import bisect_left
+from datetime import timedelta
+
+from .models import EventLocation
+from .models import EventSlot
+
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+
+class EventSlotAvailability:
+    """
+    Free/busy index for the EventSlots of a camp.
+
+    All EventSlots (optionally limited to those overlapping a period) and all
+    EventLocation conflicts are loaded in a constant number of queries. The busy
+    periods are then merged into sorted, non-overlapping intervals per EventLocation,
+    so checking if a slot is free is a bisect per conflicting location instead of
+    a query per EventSession.
+
+    Used by the AutoScheduler and the backoffice program views, and by the
+    EventSession methods when they are called on their own.
+    """
+
+    def __init__(self, camp, when=None):
+        """Load EventSlots and EventLocation conflicts and group them"""
+        self.camp = camp
+
+        # get all EventSlots in one query
+        slots = EventSlot.objects.filter(event_session__camp=camp).select_related(
+            "event_session__event_location",
+        )
+        if when:
+            slots = slots.filter(when__overlap=when)
+
+        # group EventSlots per EventSession and per EventLocation
+        self.session_slots = {}
+        self.location_slots = {}
+        for slot in slots:
+            self.session_slots.setdefault(slot.event_session_id, []).append(slot)
+            self.location_slots.setdefault(
+                slot.event_session.event_location_id,
+                [],
+            ).append(slot)
+        for session_slots in self.session_slots.values():
+            session_slots.sort(key=lambda slot: slot.when.lower)
+
+        # get all location conflicts in one query (the m2m is symmetrical)
+        self.location_conflicts = {}
+        for from_id, to_id in EventLocation.conflicts.through.objects.filter(
+            from_eventlocation__camp=camp,
+        ).values_list("from_eventlocation_id", "to_eventlocation_id"):
+            self.location_conflicts.setdefault(from_id, set()).add(to_id)
+
+        # busy intervals are built on demand, one dict per value of count_autoscheduled_as_free
+        self._busy = {}
+
+    @staticmethod
+    def is_busy(slot, count_autoscheduled_as_free=False):
+        """Return True if something is scheduled in the slot"""
+        if count_autoscheduled_as_free:
+            # a slot is busy if something is manually scheduled
+            return slot.autoscheduled is False
+        # a slot is busy if something is scheduled
+        return slot.event_id is not None
+
+    def get_busy_intervals(self, count_autoscheduled_as_free=False):
+        """Return a dict of (starts, ends) lists per EventLocation id. The intervals
+        are the merged busy periods of the location, sorted by start time."""
+        if count_autoscheduled_as_free in self._busy:
+            return self._busy[count_autoscheduled_as_free]
+
+        busy = {}
+        for location_id, slots in self.location_slots.items():
+            starts = []
+            ends = []
+            # sweep over the busy slots in start time order and merge overlapping periods
+            for when in sorted(
+                (
+                    slot.when
+                    for slot in slots
+                    if self.is_busy(slot, count_autoscheduled_as_free)
+                ),
+                key=lambda when: when.lower,
+            ):
+                if ends and when.lower < ends[-1]:
+                    ends[-1] = max(ends[-1], when.upper)
+                else:
+                    starts.append(when.lower)
+                    ends.append(when.upper)
+            busy[location_id] = (starts, ends)
+        self._busy[count_autoscheduled_as_free] = busy
+        return busy
+
+    def is_location_busy(self, location_id, when, count_autoscheduled_as_free=False):
+        """Return True if the location or a conflicting location is busy at some point during when"""
+        busy = self.get_busy_intervals(count_autoscheduled_as_free)
+        for lid in {location_id} | self.location_conflicts.get(location_id, set()):
+            if lid not in busy:
+                continue
+            starts, ends = busy[lid]
+            # the last interval starting before when ends is the only candidate
+            index = bisect_left(starts, when.upper) - 1
+            if index >= 0 and ends[index] > when.lower:
+                return True
+        return False
+
+    def get_available_slots(self, session, count_autoscheduled_as_free=False):
+        """Return a list of EventSlots in the session that have nothing scheduled,
+        considering conflicting locations too"""
+        available = []
+        for slot in self.session_slots.get(session.id, []):
+            if slot.event_id is not None and not (
+                count_autoscheduled_as_free and slot.autoscheduled
+            ):
+                # something is scheduled in this slot
+                continue
+            if self.is_location_busy(
+                session.event_location_id,
+                slot.when,
+                count_autoscheduled_as_free,
+            ):
+                # something is scheduled in the same or a conflicting location
+                continue
+            available.append(slot)
+        return available
+
+    def get_unavailable_slots(self, session, count_autoscheduled_as_free=False):
+        """Return a list of EventSlots in the session that are not available for some reason"""
+        available = {
+            slot.id
+            for slot in self.get_available_slots(session, count_autoscheduled_as_free)
+        }
+        return [
+            slot
+            for slot in self.session_slots.get(session.id, [])
+            if slot.id not in available
+        ]
+
+    def free_time(self, session):
+        """Return a timedelta of the free time in the session"""
+        return session.duration - timedelta(
+            minutes=session.event_duration_minutes
+            * len(self.get_unavailable_slots(session)),
+        )
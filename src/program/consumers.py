@@ -1,17 +1,36 @@
 from channels.generic.websocket import JsonWebsocketConsumer
 
-from .models import Event
 from .models import EventInstance
-from .models import EventLocation
-from .models import EventTrack
-from .models import EventType
 from .models import Favorite
-from .models import Speaker
-from camps.models import Camp
+from .schedule import get_schedule_deltas
+from .schedule import get_schedule_snapshot
+from .schedule import overlay_favorites
 
 
 class ScheduleConsumer(JsonWebsocketConsumer):
     groups = ["schedule_users"]
+    camp_slug = None
+
+    def get_init_data(self, camp_slug, user):
+        """Return the init payload, the shared snapshot is built once per schedule
+        change and only the favorites of this user are added per connection"""
+        snapshot = get_schedule_snapshot(camp_slug)
+        if not snapshot:
+            return {}
+        # only deltas for this camp are sent to this client
+        self.camp_slug = camp_slug
+        return {
+            "action": "init",
+            "version": snapshot["version"],
+            "events": snapshot["events"],
+            "event_instances": overlay_favorites(snapshot, user),
+            "event_slots": snapshot["event_slots"],
+            "event_locations": snapshot["event_locations"],
+            "event_types": snapshot["event_types"],
+            "event_tracks": snapshot["event_tracks"],
+            "speakers": snapshot["speakers"],
+            "days": snapshot["days"],
+        }
 
     def receive(self, text_data, **kwargs):
         user = self.scope["user"]
@@ -20,52 +39,25 @@ class ScheduleConsumer(JsonWebsocketConsumer):
         data = {}
 
         if action == "init":
+            data = self.get_init_data(content.get("camp_slug"), user)
+
+        if action == "resync":
+            # send the deltas since the version the client has, or a full init
+            # if the delta log does not go back that far
             camp_slug = content.get("camp_slug")
             try:
-                camp = Camp.objects.get(slug=camp_slug)
-                days = [
-                    {
-                        "repr": day.lower.strftime("%A %Y-%m-%d"),
-                        "iso": day.lower.strftime("%Y-%m-%d"),
-                        "day_name": day.lower.strftime("%A"),
-                    }
-                    for day in camp.get_days("camp")
-                ]
-
-                events_query_set = Event.objects.filter(track__camp=camp)
-                events = [x.serialize() for x in events_query_set]
-
-                event_instances_query_set = EventInstance.objects.filter(
-                    event__track__camp=camp,
-                )
-                event_instances = [
-                    x.serialize(user=user) for x in event_instances_query_set
-                ]
-
-                event_locations_query_set = EventLocation.objects.filter(camp=camp)
-                event_locations = [x.serialize() for x in event_locations_query_set]
-
-                event_types_query_set = EventType.objects.filter()
-                event_types = [x.serialize() for x in event_types_query_set]
-
-                event_tracks_query_set = EventTrack.objects.filter(camp=camp)
-                event_tracks = [x.serialize() for x in event_tracks_query_set]
-
-                speakers_query_set = Speaker.objects.filter(camp=camp)
-                speakers = [x.serialize() for x in speakers_query_set]
-
-                data = {
-                    "action": "init",
-                    "events": events,
-                    "event_instances": event_instances,
-                    "event_locations": event_locations,
-                    "event_types": event_types,
-                    "event_tracks": event_tracks,
-                    "speakers": speakers,
-                    "days": days,
-                }
-            except Camp.DoesNotExist:
-                pass
+                version = int(content.get("version", 0))
+            except (TypeError, ValueError):
+                # a client without a valid version gets a full init
+                version = None
+            deltas = None
+            if version is not None:
+                deltas = get_schedule_deltas(camp_slug, version)
+            if deltas is None:
+                data = self.get_init_data(camp_slug, user)
+            else:
+                self.camp_slug = camp_slug
+                data = {"action": "resync", "deltas": deltas}
 
         if action == "favorite":
             event_instance_id = content.get("event_instance_id")
@@ -88,5 +80,11 @@ class ScheduleConsumer(JsonWebsocketConsumer):
         if data:
             self.send_json(data)
 
+    def schedule_delta(self, event):
+        """Forward schedule deltas sent to the schedule_users group by
+        program.schedule.broadcast_schedule_delta()"""
+        if event["delta"]["camp_slug"] == self.camp_slug:
+            self.send_json(event["delta"])
+
     def disconnect(self, message, **kwargs):
         pass
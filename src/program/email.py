@@ -4,6 +4,8 @@ from django.core.exceptions import ObjectDoesNotExist
 
 from teams.models import Team
 from utils.email import add_outgoing_email
+from utils.email import build_outgoing_email
+from utils.models import OutgoingEmail
 
 logger = logging.getLogger("bornhack.%s" % __name__)
 
@@ -169,26 +171,43 @@ def add_event_proposal_accepted_email(event_proposal):
 
 
 def add_event_scheduled_email(slot):
-    formatdict = {"slot": slot}
-    # add all speaker emails
-    recipients = [speaker.email for speaker in slot.event.speakers.all()]
-    # also add the submitting users email
-    recipients.append(slot.event.proposal.user.email)
+    return add_event_scheduled_emails([slot])
+
+
+def add_event_scheduled_emails(slots):
+    """Queue the event scheduled emails for a list of EventSlots from the same camp
+    with one query for the Content team and one bulk insert. The caller should
+    prefetch event__speakers and event__proposal__user."""
+    if not slots:
+        return 0
 
     try:
-        content_team = Team.objects.get(camp=slot.camp, name="Content")
+        content_team = Team.objects.get(camp=slots[0].camp, name="Content")
     except ObjectDoesNotExist as e:
         logger.info(f"There is no team with name Content: {e}")
         return False
 
-    # loop over unique recipients and send an email to each
-    for rcpt in set(recipients):
-        add_outgoing_email(
-            responsible_team=content_team,
-            text_template="emails/event_scheduled.txt",
-            html_template="emails/event_scheduled.html",
-            to_recipients=rcpt,
-            formatdict=formatdict,
-            subject=f"Your {slot.camp.title} event '{slot.event.title}' has been scheduled!",
-            hold=True,
-        )
+    emails = []
+    for slot in slots:
+        formatdict = {"slot": slot}
+        # add all speaker emails
+        recipients = [speaker.email for speaker in slot.event.speakers.all()]
+        # also add the submitting users email
+        if slot.event.proposal:
+            recipients.append(slot.event.proposal.user.email)
+
+        # loop over unique recipients and build an email for each
+        for rcpt in set(recipients):
+            email = build_outgoing_email(
+                responsible_team=content_team,
+                text_template="emails/event_scheduled.txt",
+                html_template="emails/event_scheduled.html",
+                to_recipients=rcpt,
+                formatdict=formatdict,
+                subject=f"Your {slot.camp.title} event '{slot.event.title}' has been scheduled!",
+                hold=True,
+            )
+            if email:
+                emails.append(email)
+    OutgoingEmail.objects.bulk_create(emails)
+    return len(emails)
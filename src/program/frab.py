@@ -0,0 +1,186 @@
+import hashlib
+import logging
+
+from django.core.cache import cache
+from django.utils import timezone
+from lxml import etree
+from lxml import objectify
+
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+# if a camp has been marked dirty for longer than this the frab worker is probably
+# not running, and the view rebuilds the XML in the request instead
+FRAB_STALE_SECONDS = 300
+
+
+def get_frab_cache_key(camp_slug):
+    return f"program_frab_{camp_slug}"
+
+
+def get_frab_dirty_key(camp_slug):
+    return f"program_frab_dirty_{camp_slug}"
+
+
+def get_event_slots(camp):
+    """Return a queryset of scheduled EventSlots with everything the XML needs"""
+    from .models import EventSlot
+
+    return (
+        EventSlot.objects.filter(event_session__camp=camp, event__isnull=False)
+        .select_related(
+            "event__event_type",
+            "event__track__camp",
+            "event_session__event_location",
+        )
+        .prefetch_related("event__urls__url_type", "event__speakers")
+        .order_by("when")
+    )
+
+
+def render_frab_xml(camp, base_url, version):
+    """
+    Render the Frab XML for a camp. All scheduled EventSlots are loaded in a
+    constant number of queries and grouped per day and location in memory.
+    XSD is from https://raw.githubusercontent.com/wiki/frab/frab/images/schedule.xsd
+    """
+    slots = list(get_event_slots(camp))
+
+    # all locations with something scheduled are included on every day
+    locations = sorted(
+        {slot.event_session.event_location for slot in slots},
+        key=lambda location: location.name,
+    )
+
+    E = objectify.ElementMaker(annotate=False)
+    days = ()
+    # loop over days
+    for i, day in enumerate(camp.get_days("camp")[:-1], start=1):
+        rooms = {location.id: () for location in locations}
+        for slot in slots:
+            if slot.when.lower < day.lower or slot.when.upper > day.upper:
+                continue
+            location = slot.event_session.event_location
+            # build a tuple of speakers for this event
+            speakers = tuple(
+                E.person(speaker.name, id=str(speaker.pk))
+                for speaker in slot.event.speakers.all()
+            )
+            # build a tuple of URLs for this Event
+            urls = tuple(
+                E.link(url.url_type.name, href=url.url) for url in slot.event.urls.all()
+            )
+            rooms[location.id] += (
+                E.event(
+                    E.date(slot.when.lower.isoformat()),
+                    E.start(slot.when.lower.time()),
+                    E.duration(slot.event.duration),
+                    E.room(location.name),
+                    E.slug(f"{slot.pk}-{slot.event.slug}"),
+                    E.url(base_url + slot.event.get_absolute_url().lstrip("/")),
+                    E.recording(
+                        E.license("CC BY-SA 4.0"),
+                        E.optout(
+                            "false" if slot.event.video_recording else "true",
+                        ),
+                    ),
+                    E.title(slot.event.title),
+                    # our Events have no subtitle
+                    E.subtitle(""),
+                    E.track(slot.event.track),
+                    E.type(slot.event.event_type),
+                    # our Events have no language attribute but are mostly english
+                    E.language("en"),
+                    E.abstract(slot.event.abstract),
+                    # our Events have no long description
+                    E.description(""),
+                    E.persons(*speakers),
+                    E.links(*urls),
+                    E.attachments,
+                    id=str(slot.id),
+                    guid=str(slot.uuid),
+                ),
+            )
+
+        # add this day to the days tuple
+        days += (
+            E.day(
+                *(
+                    E.room(*rooms[location.id], name=location.name)
+                    for location in locations
+                ),
+                index=str(i),
+                date=str(day.lower.date()),
+                start=day.lower.isoformat(),
+                end=day.upper.isoformat(),
+            ),
+        )
+
+    # put the XML together
+    xml = E.schedule(
+        E.version(f"BornHack Frab XML Generator v2.0 - schedule version {version}"),
+        E.conference(
+            E.title(camp.title),
+            E.acronym(str(camp.camp.lower.year)),
+            E.start(camp.camp.lower.date().isoformat()),
+            E.end(camp.camp.upper.date().isoformat()),
+            E.days(len(camp.get_days("camp"))),
+            E.timeslot_duration("00:30"),
+            E.base_url(base_url),
+        ),
+        *days,
+    )
+    return etree.tostring(xml, pretty_print=True, xml_declaration=True)
+
+
+def validate_frab_xml(xml):
+    """Return True if the XML validates against the Frab schema"""
+    schema = etree.XMLSchema(file="program/xsd/schedule.xml.xsd")
+    parser = objectify.makeparser(schema=schema)
+    try:
+        objectify.fromstring(xml, parser)
+    except etree.XMLSyntaxError:
+        logger.exception("Something went sideways when validating frab xml :(")
+        return False
+    return True
+
+
+def build_camp_frab(camp, base_url):
+    """Render and validate the Frab XML for a camp and store it in the cache.
+    Returns the cached data, or None if the XML does not validate."""
+    # clear the dirty flag first so changes made while we render are not lost
+    cache.delete(get_frab_dirty_key(camp.slug))
+    previous = cache.get(get_frab_cache_key(camp.slug))
+    now = timezone.now()
+    version = int(now.timestamp() * 1000)
+    if previous:
+        version = max(version, previous["version"] + 1)
+    xml = render_frab_xml(camp, base_url, version)
+    if not validate_frab_xml(xml):
+        # keep serving the previous version if we have one
+        return previous
+    data = {
+        "version": version,
+        "last_modified": now,
+        "base_url": base_url,
+        "etag": '"{}-{}"'.format(version, hashlib.md5(xml).hexdigest()[:12]),
+        "xml": xml,
+    }
+    cache.set(get_frab_cache_key(camp.slug), data, timeout=None)
+    logger.debug(f"Built Frab XML version {version} for camp {camp.slug}")
+    return data
+
+
+def get_camp_frab(camp_slug):
+    """Return the cached Frab data for a camp, or None"""
+    return cache.get(get_frab_cache_key(camp_slug))
+
+
+def mark_camp_frab_dirty(camp_slug):
+    """Mark the Frab XML for a camp as outdated, the frab worker rebuilds it.
+    The first time the camp was marked dirty is kept."""
+    cache.add(get_frab_dirty_key(camp_slug), timezone.now(), timeout=None)
+
+
+def get_camp_frab_dirty(camp_slug):
+    """Return the time the Frab XML for a camp was marked dirty, or None"""
+    return cache.get(get_frab_dirty_key(camp_slug))
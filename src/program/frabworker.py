@@ -0,0 +1,33 @@
+import logging
+
+from django.core.cache import cache
+
+from camps.models import Camp
+from program.frab import build_camp_frab
+from program.frab import get_camp_frab
+from program.frab import get_camp_frab_dirty
+from program.frab import get_frab_dirty_key
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+
+def do_work():
+    """
+    The frab worker rebuilds the cached Frab XML for camps where program data
+    has changed since the XML was built. Camps which have never been requested
+    are left alone, the view builds those on the first request.
+    Run with: manage.py run_managepy_worker program.frabworker --sleep 10
+    """
+    for camp in Camp.objects.all():
+        if not get_camp_frab_dirty(camp.slug):
+            continue
+        data = get_camp_frab(camp.slug)
+        if data is None:
+            cache.delete(get_frab_dirty_key(camp.slug))
+            continue
+        data = build_camp_frab(camp, data["base_url"])
+        if data:
+            logger.info(
+                f"Rebuilt Frab XML for camp {camp.slug}, version is now {data['version']}",
+            )
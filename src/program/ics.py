@@ -0,0 +1,140 @@
+import hashlib
+import logging
+
+import icalendar
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+
+def get_ics_cache_key(camp_slug):
+    return f"program_ics_{camp_slug}"
+
+
+def get_ics_header():
+    """Return the VCALENDAR header as bytes, the feed is the header followed by
+    the VEVENT blobs and a END:VCALENDAR line"""
+    cal = icalendar.Calendar()
+    cal.add("prodid", "-//BornHack Website iCal Generator//bornhack.dk//")
+    cal.add("version", "2.0")
+    return cal.to_ical()[: -len(b"END:VCALENDAR\r\n")]
+
+
+def render_event_slot(slot):
+    """Return a dict with the pre-rendered VEVENT and the fields the ICS feeds filter on"""
+    return {
+        "event_id": slot.event_id,
+        "starts_at": slot.when.lower,
+        "event_type": slot.event.event_type.slug,
+        "location": slot.event_session.event_location.slug,
+        "video_recording": slot.event.video_recording,
+        "ics": slot.get_ics_event().to_ical(),
+    }
+
+
+def get_event_slots(camp_slug, **kwargs):
+    """Return a queryset of scheduled EventSlots with everything get_ics_event() needs"""
+    from .models import EventSlot
+
+    return EventSlot.objects.filter(
+        event_session__camp__slug=camp_slug,
+        event__isnull=False,
+        **kwargs,
+    ).prefetch_related(
+        "event__event_type",
+        "event__speakers",
+        "event__track__camp",
+        "event_session__event_location",
+    )
+
+
+def get_ics_generation_key(camp_slug):
+    return f"program_ics_generation_{camp_slug}"
+
+
+def get_ics_generation(camp_slug):
+    """Return the current generation of the ICS data for a camp. The generation is
+    bumped atomically by invalidate_camp_ics(), cached data from an older generation
+    is never served."""
+    key = get_ics_generation_key(camp_slug)
+    # start from a timestamp so an evicted counter never repeats an old generation
+    cache.add(key, int(timezone.now().timestamp() * 1000), timeout=None)
+    return cache.get(key)
+
+
+def build_camp_ics(camp_slug):
+    """Render all scheduled EventSlots for a camp and store them in the cache"""
+    # read the generation before the EventSlots, so data rendered from rows which
+    # change while we render is stored with a generation which is already outdated
+    generation = get_ics_generation(camp_slug)
+    now = timezone.now()
+    data = {
+        "generation": generation,
+        "version": int(now.timestamp() * 1000),
+        "last_modified": now,
+        "slots": {
+            slot.id: render_event_slot(slot) for slot in get_event_slots(camp_slug)
+        },
+    }
+    cache.set(get_ics_cache_key(camp_slug), data, timeout=None)
+    return data
+
+
+def get_cached_camp_ics(camp_slug):
+    """Return the cached ICS data for a camp, or None if it is missing or outdated"""
+    data = cache.get(get_ics_cache_key(camp_slug))
+    if data is None or data.get("generation") != get_ics_generation(camp_slug):
+        return None
+    return data
+
+
+def get_camp_ics(camp_slug):
+    """Return the cached ICS data for a camp, building it if needed"""
+    data = get_cached_camp_ics(camp_slug)
+    if data is None:
+        data = build_camp_ics(camp_slug)
+    return data
+
+
+def invalidate_camp_ics(camp_slug):
+    """Mark the cached ICS data for a camp as outdated, it will be rebuilt on the
+    next request. Call this when the transaction changing the program commits, see
+    invalidate_camp_ics_on_commit()."""
+    key = get_ics_generation_key(camp_slug)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # the counter is gone, start a new one
+        get_ics_generation(camp_slug)
+    cache.delete(get_ics_cache_key(camp_slug))
+
+
+def invalidate_camp_ics_on_commit(camp_slug):
+    """Invalidate the cached ICS data for a camp when the current transaction
+    commits, so a rolled back change never reaches the cache and a rebuild never
+    reads data from before the commit"""
+    transaction.on_commit(lambda: invalidate_camp_ics(camp_slug))
+
+
+def get_ics_etag(data, query_string):
+    """The ETag depends on the cached version and the filters in the query string"""
+    digest = hashlib.md5(query_string.encode("utf-8")).hexdigest()[:12]
+    return f'"{data["version"]}-{digest}"'
+
+
+def assemble_ics(data, event_types=None, locations=None, video_recording=None):
+    """Concatenate the cached VEVENTs matching the filters into a VCALENDAR"""
+    slots = sorted(data["slots"].values(), key=lambda slot: slot["starts_at"])
+    parts = [get_ics_header()]
+    for slot in slots:
+        if event_types is not None and slot["event_type"] not in event_types:
+            continue
+        if locations is not None and slot["location"] not in locations:
+            continue
+        if video_recording is not None and slot["video_recording"] != video_recording:
+            continue
+        parts.append(slot["ics"])
+    parts.append(b"END:VCALENDAR\r\n")
+    return b"".join(parts)
@@ -0,0 +1,229 @@
+import logging
+import math
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db import transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange
+
+from camps.factories import CampFactory
+from program.autoscheduler import AUTOSCHEDULER_OBJECTIVES
+from program.autoscheduler import AutoScheduler
+from program.models import Event
+from program.models import EventLocation
+from program.models import EventSession
+from program.models import EventTrack
+from program.models import EventType
+from program.models import Speaker
+from program.models import SpeakerAvailability
+
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+
+class Command(BaseCommand):
+    args = "none"
+    help = "Build synthetic camps of increasing size and measure how long it takes to build the AutoScheduler model, and optionally how long it takes to solve a new schedule and how good the schedule is with different solver options. Everything is rolled back afterwards."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--events",
+            type=int,
+            nargs="+",
+            default=[1000],
+            help="The number of Events in each synthetic camp (default 1000)",
+        )
+        parser.add_argument(
+            "--solve",
+            action="store_true",
+            help="Also solve a new schedule for each camp, for each number of --threads",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            nargs="+",
+            default=[1],
+            help="The solver thread counts to benchmark (default 1)",
+        )
+        parser.add_argument(
+            "--time-limit",
+            type=int,
+            default=60,
+            help="The solver time limit in seconds, 0 for no limit (default 60)",
+        )
+        parser.add_argument(
+            "--gap",
+            type=float,
+            default=None,
+            help="The relative optimality gap where the solver may stop (default none)",
+        )
+        parser.add_argument(
+            "--objective",
+            choices=sorted(AUTOSCHEDULER_OBJECTIVES),
+            default="efficiency",
+            help="The objective function to optimise for (default efficiency)",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=1,
+            help="Seed for the random generator, to make runs comparable",
+        )
+
+    def output(self, message):
+        self.stdout.write(
+            "{}: {}".format(timezone.now().strftime("%Y-%m-%d %H:%M:%S"), message),
+        )
+
+    def create_synthetic_camp(self, events, rng):
+        """Create a camp with the requested number of autoschedulable Events, with
+        enough EventSlots to hold them, plus speakers, conflicts and availability"""
+        camp = CampFactory()
+        track = EventTrack.objects.create(camp=camp, name="Benchmark", slug="benchmark")
+        event_type, _ = EventType.objects.get_or_create(
+            slug="benchmark",
+            defaults={
+                "name": "Benchmark",
+                "color": "#000000",
+                "event_duration_minutes": 60,
+                "support_autoscheduling": True,
+            },
+        )
+
+        # sessions from 10 to 22 every day of the camp, as many locations as needed
+        days = camp.get_days(camppart="camp")
+        locationcount = math.ceil(events / (len(days) * 12))
+        for i in range(locationcount):
+            location = EventLocation.objects.create(
+                camp=camp,
+                name=f"Benchmark Location {i}",
+                slug=f"benchmark-location-{i}",
+                icon="comment",
+                capacity=rng.randint(20, 200),
+            )
+            for day in days:
+                start = day.lower.replace(hour=10, minute=0, second=0, microsecond=0)
+                EventSession.objects.create(
+                    camp=camp,
+                    event_type=event_type,
+                    event_location=location,
+                    when=DateTimeTZRange(start, start + timedelta(hours=12)),
+                )
+
+        eventlist = Event.objects.bulk_create(
+            [
+                Event(
+                    title=f"Benchmark Event {i}",
+                    slug=f"benchmark-event-{i}",
+                    abstract="Benchmark",
+                    event_type=event_type,
+                    track=track,
+                    duration_minutes=60,
+                    demand=rng.randint(0, 150),
+                )
+                for i in range(events)
+            ],
+        )
+
+        # about 0.8 speakers per event, so some speakers have more than one event
+        speakers = Speaker.objects.bulk_create(
+            [
+                Speaker(
+                    camp=camp,
+                    name=f"Benchmark Speaker {i}",
+                    slug=f"benchmark-speaker-{i}",
+                    email=f"speaker{i}@example.com",
+                    biography="Benchmark",
+                )
+                for i in range(max(1, int(events * 0.8)))
+            ],
+        )
+        Speaker.events.through.objects.bulk_create(
+            [
+                Speaker.events.through(
+                    speaker_id=speakers[i % len(speakers)].id,
+                    event_id=event.id,
+                )
+                for i, event in enumerate(eventlist)
+            ],
+        )
+        conflicts = set()
+        for speaker in speakers:
+            for event in rng.sample(eventlist, min(len(eventlist), rng.randint(0, 3))):
+                conflicts.add((speaker.id, event.id))
+        Speaker.event_conflicts.through.objects.bulk_create(
+            [
+                Speaker.event_conflicts.through(speaker_id=s, event_id=e)
+                for s, e in conflicts
+            ],
+        )
+
+        # every speaker is available for a random part of the camp
+        availabilities = []
+        for speaker in speakers:
+            first = rng.randint(0, len(days) - 1)
+            last = rng.randint(first, len(days) - 1)
+            availabilities.append(
+                SpeakerAvailability(
+                    speaker=speaker,
+                    when=DateTimeTZRange(days[first].lower, days[last].upper),
+                    available=True,
+                ),
+            )
+        SpeakerAvailability.objects.bulk_create(availabilities)
+        return camp
+
+    def solve(self, scheduler, threads):
+        """Solve a new schedule with the given number of threads and output the
+        time it took and the quality of the schedule"""
+        scheduler.threads = threads
+        start = time.monotonic()
+        try:
+            autoschedule = scheduler.calculate_autoschedule()
+        except ValueError:
+            self.output(
+                f"{threads} threads: no feasible schedule found in {time.monotonic() - start:.2f} seconds",
+            )
+            return
+        duration = time.monotonic() - start
+        valid = scheduler.is_valid(autoschedule)
+        # the objective functions compare Event demand with Slot capacity
+        overflows = [item.event.demand - item.slot.capacity for item in autoschedule]
+        self.output(
+            f"{threads} threads: solved in {duration:.2f} seconds, {len(autoschedule)} of {len(scheduler.autoevents)} Events scheduled, valid: {valid}, total demand/capacity difference: {sum(overflows)}, largest demand/capacity difference: {max(overflows, default=0)}",
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        for events in options["events"]:
+            with transaction.atomic():
+                self.output(f"Creating synthetic camp with {events} Events...")
+                camp = self.create_synthetic_camp(events, rng)
+
+                self.output("Building AutoScheduler model...")
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.monotonic()
+                    scheduler = AutoScheduler(
+                        camp=camp,
+                        time_limit=options["time_limit"],
+                        gap=options["gap"],
+                        objective=options["objective"],
+                    )
+                    duration = time.monotonic() - start
+                self.output(
+                    f"Built model with {len(scheduler.autoevents)} autoevents and {len(scheduler.autoslots)} autoslots in {duration:.2f} seconds using {len(queries)} queries",
+                )
+
+                if options["solve"]:
+                    self.output(
+                        f"Solving with time limit {options['time_limit'] or 'none'}, gap {options['gap'] or 'none'} and objective {options['objective']}...",
+                    )
+                    for threads in options["threads"]:
+                        self.solve(scheduler, threads)
+
+                # leave the database as we found it
+                transaction.set_rollback(True)
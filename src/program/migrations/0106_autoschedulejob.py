@@ -0,0 +1,188 @@
+# Generated by Django 4.2.5 on 2026-10-18 12:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django_prometheus.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("camps", "0036_camp_economy_team"),
+        ("program", "0105_cascade_delete_event_urls"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AutoScheduleJob",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+                (
+                    "schedule",
+                    models.CharField(
+                        choices=[
+                            ("current", "Current schedule"),
+                            ("similar", "Similar schedule"),
+                            ("incremental", "Incremental schedule"),
+                            ("new", "New schedule"),
+                        ],
+                        help_text="Which schedule to calculate.",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "options",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        help_text="The keyword arguments for the AutoScheduler, for example the constraints to use.",
+                    ),
+                ),
+                (
+                    "apply",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Apply the schedule when it has been calculated, if it is valid.",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        db_index=True,
+                        default="pending",
+                        help_text="The status of this job.",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "progress",
+                    models.PositiveSmallIntegerField(
+                        default=0,
+                        help_text="How far the worker has come with this job, in percent.",
+                    ),
+                ),
+                (
+                    "progress_text",
+                    models.CharField(
+                        blank=True,
+                        help_text="What the worker is doing right now.",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "started",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="When the worker started this job.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "finished",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="When the worker finished this job.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "original_autoschedule",
+                    models.JSONField(
+                        blank=True,
+                        help_text="The schedule the calculated schedule is based on, see AutoScheduler.serialize_autoschedule().",
+                        null=True,
+                    ),
+                ),
+                (
+                    "autoschedule",
+                    models.JSONField(
+                        blank=True,
+                        help_text="The calculated schedule, see AutoScheduler.serialize_autoschedule().",
+                        null=True,
+                    ),
+                ),
+                (
+                    "diff",
+                    models.JSONField(
+                        blank=True,
+                        help_text="The differences between the original and the calculated schedule, see AutoScheduler.serialize_diff().",
+                        null=True,
+                    ),
+                ),
+                (
+                    "valid",
+                    models.BooleanField(
+                        blank=True,
+                        help_text="True if the calculated schedule is valid.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "violations",
+                    models.JSONField(
+                        blank=True,
+                        default=list,
+                        help_text="The schedule violations if the calculated schedule is not valid.",
+                    ),
+                ),
+                (
+                    "applied",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="When the calculated schedule was applied.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "result",
+                    models.TextField(
+                        blank=True,
+                        help_text="A message with the result of this job, or the error if it failed.",
+                    ),
+                ),
+                (
+                    "camp",
+                    models.ForeignKey(
+                        help_text="The Camp to calculate a schedule for.",
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="autoschedule_jobs",
+                        to="camps.camp",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="The user who created this job.",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created"],
+            },
+            bases=(
+                django_prometheus.models.ExportModelOperationsMixin("autoschedule_job"),
+                models.Model,
+            ),
+        ),
+    ]
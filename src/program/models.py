@@ -1,3 +1,4 @@
+import copy
 import logging
 import uuid
 from datetime import timedelta
@@ -14,11 +15,12 @@ from django.contrib.sites.models import Site
 from django.core.exceptions import ValidationError
 from django.core.files.storage import FileSystemStorage
 from django.db import models
+from django.db import transaction
 from django.db.models import F
-from django.db.models import Q
 from django.urls import reverse
 from django.urls import reverse_lazy
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.safestring import mark_safe
 from django_prometheus.models import ExportModelOperationsMixin
 from psycopg2.extras import DateTimeTZRange
@@ -29,6 +31,7 @@ from .email import add_event_proposal_rejected_email
 from .email import add_speaker_proposal_accepted_email
 from .email import add_speaker_proposal_rejected_email
 from utils.database import CastToInteger
+from utils.models import CampReadOnlyModeError
 from utils.models import CampRelatedModel
 from utils.models import CreatedUpdatedModel
 from utils.models import UUIDModel
@@ -867,6 +870,56 @@ class EventType(ExportModelOperationsMixin("event_type"), CreatedUpdatedModel):
         ordering = ["order"]
 
 
+class EventSessionQuerySet(models.QuerySet):
+    def fixup_event_slots(self):
+        """
+        Create and delete EventSlots for all EventSessions in this QuerySet so each
+        session has exactly the EventSlots it needs. Existing and needed slot ranges
+        are diffed in memory and the changes are written with one bulk delete and one
+        bulk_create, no matter how many sessions and slots are involved.
+
+        Returns a tuple of the number of deleted and created EventSlots.
+        """
+        sessions = list(self.select_related("camp"))
+
+        # check read only mode once per camp rather than once per slot
+        for camp in {session.camp for session in sessions}:
+            if camp.read_only:
+                raise CampReadOnlyModeError(f"The camp {camp} is in read only mode.")
+
+        # get the EventSlots we have in DB, per session
+        db_slot_times = {}
+        for slot_id, session_id, when in EventSlot.objects.filter(
+            event_session__in=sessions,
+        ).values_list("id", "event_session_id", "when"):
+            db_slot_times.setdefault(session_id, {})[when] = slot_id
+
+        delete_ids = []
+        new_slots = []
+        for session in sessions:
+            # get a set of DateTimeTZRange objects representing the EventSlots we need
+            needed_slot_times = set(session.get_slot_times(bounds="[)"))
+            existing = db_slot_times.get(session.id, {})
+            delete_ids += [
+                slot_id
+                for when, slot_id in existing.items()
+                if when not in needed_slot_times
+            ]
+            new_slots += [
+                EventSlot(event_session=session, when=when)
+                for when in needed_slot_times
+                if when not in existing
+            ]
+
+        with transaction.atomic():
+            # delete first so new slots do not overlap old slots with another duration
+            if delete_ids:
+                EventSlot.objects.filter(id__in=delete_ids).delete()
+            if new_slots:
+                EventSlot.objects.bulk_create(new_slots)
+        return len(delete_ids), len(new_slots)
+
+
 class EventSession(ExportModelOperationsMixin("event_session"), CampRelatedModel):
     """
     An EventSession define the "opening hours" for an EventType in an EventLocation.
@@ -941,6 +994,8 @@ class EventSession(ExportModelOperationsMixin("event_session"), CampRelatedModel
         help_text="Description of this session (optional).",
     )
 
+    objects = EventSessionQuerySet.as_manager()
+
     def __str__(self):
         return f"EventSession for {self.event_type} in {self.event_location.name}: {self.when}"
 
@@ -954,59 +1009,35 @@ class EventSession(ExportModelOperationsMixin("event_session"), CampRelatedModel
         """Just return a timedelta of the lenght of this Session"""
         return self.when.upper - self.when.lower
 
+    def get_availability(self):
+        """Return the EventSlotAvailability to use for this session. Views can set
+        self.availability to share one index between many sessions."""
+        if hasattr(self, "availability"):
+            return self.availability
+        from .availability import EventSlotAvailability
+
+        return EventSlotAvailability(camp=self.camp, when=self.when)
+
     @property
     def free_time(self):
         """Returns a timedelta of the free time in this Session."""
-        return self.duration - timedelta(
-            minutes=self.event_duration_minutes * self.get_unavailable_slots().count(),
-        )
+        return self.get_availability().free_time(self)
 
     def get_available_slots(self, count_autoscheduled_as_free=False, bounds="()"):
         """
-        Return a queryset of slots that have nothing scheduled, remember to consider
+        Return a list of slots that have nothing scheduled, remember to consider
         conflicting locations too.
         """
-        # do we want to count slots with autoscheduled Events as free or not?
-        if count_autoscheduled_as_free:
-            # a slot is available if nothing is scheduled, or if the event is autoscheduled
-            availablefilter = Q(event__isnull=True) | Q(autoscheduled=True)
-            # a slot is busy if something is manually scheduled
-            busyfilter = Q(autoscheduled=False)
-        else:
-            # a slot is available if nothing is scheduled
-            availablefilter = Q(event__isnull=True)
-            # a slot is busy if something is scheduled
-            busyfilter = Q(event__isnull=False)
-
-        # get the times of all busy slots in the same or conflicting
-        # locations which overlap with this session
-        conflict_slot_times = self.camp.event_slots.filter(
-            # get slots at the same or a conflicting location
-            Q(event_session__event_location__in=self.event_location.conflicts.all())
-            | Q(event_session__event_location=self.event_location),
-            # which have something scheduled in them
-            busyfilter,
-            # at the same time as this session
-            when__overlap=self.when,
-        ).values_list("when", flat=True)
-
-        # build the excludefilter so we exclude any slots that overlap with any
-        # of our conflict_slot_times
-        excludefilter = Q()
-        for slot in conflict_slot_times:
-            # slot is a DateTimeTZRange with bounds "[)"
-            excludefilter |= Q(when__overlap=slot)
-
-        # do the thing
-        return self.event_slots.filter(availablefilter).exclude(excludefilter)
+        return self.get_availability().get_available_slots(
+            self,
+            count_autoscheduled_as_free=count_autoscheduled_as_free,
+        )
 
     def get_unavailable_slots(self, count_autoscheduled_as_free=False, bounds="[)"):
         """Return a list of slots that are not available for some reason"""
-        return self.event_slots.exclude(
-            id__in=self.get_available_slots(
-                count_autoscheduled_as_free=count_autoscheduled_as_free,
-                bounds=bounds,
-            ).values_list("id", flat=True),
+        return self.get_availability().get_unavailable_slots(
+            self,
+            count_autoscheduled_as_free=count_autoscheduled_as_free,
         )
 
     def get_slot_times(self, bounds="[)"):
@@ -1034,19 +1065,7 @@ class EventSession(ExportModelOperationsMixin("event_session"), CampRelatedModel
 
     def fixup_event_slots(self):
         """This method takes care of creating and deleting EventSlots when the EventSession is created, updated or deleted"""
-        # get a set of DateTimeTZRange objects representing the EventSlots we need
-        needed_slot_times = set(self.get_slot_times(bounds="[)"))
-
-        # get a set of DateTimeTZRange objects representing the EventSlots we have in DB
-        db_slot_times = set(self.event_slots.all().values_list("when", flat=True))
-
-        # loop over and delete unneeded slots
-        for slot in db_slot_times.difference(needed_slot_times):
-            self.event_slots.get(when=slot).delete()
-
-        # loop over and create missing slots
-        for slot in needed_slot_times.difference(db_slot_times):
-            self.event_slots.create(event_session=self, when=slot)
+        return self.__class__.objects.filter(pk=self.pk).fixup_event_slots()
 
     def scheduled_event_slots(self):
         return self.event_slots.filter(event__isnull=False)
@@ -1205,7 +1224,7 @@ class EventSlot(ExportModelOperationsMixin("event_slot"), CampRelatedModel):
         ievent = icalendar.Event()
         ievent["summary"] = self.event.title
         domain = Site.objects.get_current().domain
-        speakers = ", ".join(self.event.speakers.all().values_list("name", flat=True))
+        speakers = ", ".join(speaker.name for speaker in self.event.speakers.all())
         recorded = "Yes" if self.event.video_recording else "No"
         ievent["description"] = (
             f"URL: https://{domain}{self.event.get_absolute_url()}\n\n"
@@ -1222,6 +1241,37 @@ class EventSlot(ExportModelOperationsMixin("event_slot"), CampRelatedModel):
         ievent["location"] = icalendar.vText(self.event_location.name)
         return ievent
 
+    def serialize(self):
+        """Serialize a scheduled EventSlot for the schedule websocket, using the
+        same keys as EventInstance.serialize()"""
+        end = self.when.lower + self.event.duration
+        data = {
+            "title": self.event.title,
+            "slug": self.event.slug + "-" + str(self.id),
+            "event_slug": self.event.slug,
+            "from": self.when.lower.isoformat(),
+            "to": end.isoformat(),
+            "url": str(self.event.get_absolute_url()),
+            "id": self.id,
+            "bg-color": self.event.event_type.color,
+            "fg-color": "#fff" if self.event.event_type.light_text else "#000",
+            "event_type": self.event.event_type.slug,
+            "event_track": self.event.track.slug,
+            "location": self.event_location.slug,
+            "location_icon": self.event_location.icon,
+            "timeslots": self.event.duration_minutes
+            / settings.SCHEDULE_TIMESLOT_LENGTH_MINUTES,
+        }
+
+        if self.event.video_recording:
+            video_state = "to-be-recorded"
+        else:
+            video_state = "not-to-be-recorded"
+
+        data["video_state"] = video_state
+
+        return data
+
     def get_absolute_url(self):
         return reverse("program:event_detail", kwargs={"event_slug": self.slug})
 
@@ -1746,6 +1796,194 @@ class EventFeedback(
 # classes and functions below here was used by picture handling for speakers before it was removed in May 2018 by tyk
 
 
+class AutoScheduleJob(
+    ExportModelOperationsMixin("autoschedule_job"),
+    CampRelatedModel,
+):
+    """
+    An AutoScheduleJob is a request to calculate (and optionally apply) a schedule
+    with the AutoScheduler. Solving the schedule can take minutes, so jobs are
+    created by the backoffice and run by program.autoscheduleworker. The worker
+    stores the calculated schedule, diff and violations on the job, so a valid
+    schedule can be applied later without solving it again.
+    """
+
+    class Meta:
+        ordering = ["-created"]
+
+    camp = models.ForeignKey(
+        "camps.Camp",
+        related_name="autoschedule_jobs",
+        on_delete=models.PROTECT,
+        help_text="The Camp to calculate a schedule for.",
+    )
+
+    user = models.ForeignKey(
+        "auth.User",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        help_text="The user who created this job.",
+    )
+
+    SCHEDULE_CURRENT = "current"
+    SCHEDULE_SIMILAR = "similar"
+    SCHEDULE_INCREMENTAL = "incremental"
+    SCHEDULE_NEW = "new"
+
+    SCHEDULE_CHOICES = [
+        (SCHEDULE_CURRENT, "Current schedule"),
+        (SCHEDULE_SIMILAR, "Similar schedule"),
+        (SCHEDULE_INCREMENTAL, "Incremental schedule"),
+        (SCHEDULE_NEW, "New schedule"),
+    ]
+
+    schedule = models.CharField(
+        max_length=20,
+        choices=SCHEDULE_CHOICES,
+        help_text="Which schedule to calculate.",
+    )
+
+    options = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="The keyword arguments for the AutoScheduler, for example the constraints to use.",
+    )
+
+    apply = models.BooleanField(
+        default=False,
+        help_text="Apply the schedule when it has been calculated, if it is valid.",
+    )
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        db_index=True,
+        help_text="The status of this job.",
+    )
+
+    progress = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="How far the worker has come with this job, in percent.",
+    )
+
+    progress_text = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="What the worker is doing right now.",
+    )
+
+    started = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the worker started this job.",
+    )
+
+    finished = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the worker finished this job.",
+    )
+
+    original_autoschedule = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="The schedule the calculated schedule is based on, see AutoScheduler.serialize_autoschedule().",
+    )
+
+    autoschedule = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="The calculated schedule, see AutoScheduler.serialize_autoschedule().",
+    )
+
+    diff = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="The differences between the original and the calculated schedule, see AutoScheduler.serialize_diff().",
+    )
+
+    valid = models.BooleanField(
+        null=True,
+        blank=True,
+        help_text="True if the calculated schedule is valid.",
+    )
+
+    violations = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="The schedule violations if the calculated schedule is not valid.",
+    )
+
+    applied = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the calculated schedule was applied.",
+    )
+
+    result = models.TextField(
+        blank=True,
+        help_text="A message with the result of this job, or the error if it failed.",
+    )
+
+    def __str__(self):
+        return f"AutoScheduleJob {self.pk} ({self.get_schedule_display()}) for {self.camp}: {self.get_status_display()}"
+
+    @property
+    def is_finished(self):
+        return self.status in [self.STATUS_DONE, self.STATUS_FAILED]
+
+    @property
+    def can_apply(self):
+        """A valid calculated schedule can be applied once, unless another job is applying it right now"""
+        return (
+            self.status == self.STATUS_DONE
+            and self.valid
+            and self.autoschedule is not None
+            and not self.applied
+            and self.schedule != self.SCHEDULE_CURRENT
+        )
+
+    def set_progress(self, progress, text):
+        """Record the progress of a running job so the backoffice can show it"""
+        logger.info(f"{self}: {progress}% {text}")
+        self.progress = progress
+        self.progress_text = text
+        self.save(update_fields=["progress", "progress_text", "updated"])
+
+    def get_diff(self):
+        """Return the stored diff with the start times as datetimes, for the diff table template"""
+        if not self.diff:
+            return None
+        diff = copy.deepcopy(self.diff)
+        for item in diff["event_diffs"]:
+            for side in [item["old"], item["new"]]:
+                if "starttime" in side:
+                    side["starttime"] = parse_datetime(side["starttime"])
+        for item in diff["slot_diffs"]:
+            item["starttime"] = parse_datetime(item["starttime"])
+        return diff
+
+    def get_absolute_url(self):
+        return reverse(
+            "backoffice:autoschedule_job_detail",
+            kwargs={"camp_slug": self.camp.slug, "pk": self.pk},
+        )
+
+
 class CustomUrlStorage(FileSystemStorage):
     """
     Must exist because it is mentioned in old migrations.
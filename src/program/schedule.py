@@ -0,0 +1,202 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+# the number of deltas a client can resync from a known version, clients further
+# behind get a full init
+SCHEDULE_DELTA_LOG_LENGTH = 200
+
+# the number of seconds each delta is kept for clients resyncing
+SCHEDULE_DELTA_TIMEOUT = 60 * 60 * 24
+
+
+def get_schedule_cache_key(camp_slug):
+    return f"program_schedule_{camp_slug}"
+
+
+def get_schedule_version_key(camp_slug):
+    return f"program_schedule_version_{camp_slug}"
+
+
+def get_schedule_delta_key(camp_slug, version):
+    return f"program_schedule_delta_{camp_slug}_{version}"
+
+
+def get_schedule_version(camp_slug):
+    """Return the current schedule version for a camp. The counter starts at the
+    current time in milliseconds so it keeps increasing if the cache is cleared."""
+    key = get_schedule_version_key(camp_slug)
+    cache.add(key, int(timezone.now().timestamp() * 1000), timeout=None)
+    return cache.get(key)
+
+
+def next_schedule_version(camp_slug):
+    """Increment and return the schedule version for a camp"""
+    key = get_schedule_version_key(camp_slug)
+    cache.add(key, int(timezone.now().timestamp() * 1000), timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # the key was evicted between add() and incr()
+        return get_schedule_version(camp_slug) + 1
+
+
+def build_schedule_snapshot(camp):
+    """
+    Serialize the schedule of a camp the way the ScheduleConsumer init action
+    sends it and store it in the cache. Everything is loaded in a constant
+    number of queries. Favorites are per user and not part of the snapshot,
+    see overlay_favorites().
+    """
+    from .models import Event
+    from .models import EventInstance
+    from .models import EventLocation
+    from .models import EventSlot
+    from .models import EventTrack
+    from .models import EventType
+    from .models import Speaker
+
+    data = {
+        "version": get_schedule_version(camp.slug),
+        "days": [
+            {
+                "repr": day.lower.strftime("%A %Y-%m-%d"),
+                "iso": day.lower.strftime("%Y-%m-%d"),
+                "day_name": day.lower.strftime("%A"),
+            }
+            for day in camp.get_days("camp")
+        ],
+        "events": [
+            event.serialize()
+            for event in Event.objects.filter(track__camp=camp)
+            .select_related("event_type")
+            .prefetch_related("speakers")
+        ],
+        "event_instances": [
+            instance.serialize()
+            for instance in EventInstance.objects.filter(
+                event__track__camp=camp,
+            ).select_related("event__event_type", "event__track__camp", "location")
+        ],
+        "event_slots": [
+            slot.serialize()
+            for slot in EventSlot.objects.filter(
+                event_session__camp=camp,
+                event__isnull=False,
+            ).select_related(
+                "event__event_type",
+                "event__track__camp",
+                "event_session__event_location",
+            )
+        ],
+        "event_locations": [
+            location.serialize() for location in EventLocation.objects.filter(camp=camp)
+        ],
+        "event_types": [
+            event_type.serialize() for event_type in EventType.objects.all()
+        ],
+        "event_tracks": [
+            track.serialize() for track in EventTrack.objects.filter(camp=camp)
+        ],
+        "speakers": [
+            speaker.serialize() for speaker in Speaker.objects.filter(camp=camp)
+        ],
+    }
+    cache.set(get_schedule_cache_key(camp.slug), data, timeout=None)
+    return data
+
+
+def get_schedule_snapshot(camp_slug):
+    """Return the cached schedule snapshot for a camp, building it if needed.
+    Returns None if the camp does not exist."""
+    from camps.models import Camp
+
+    data = cache.get(get_schedule_cache_key(camp_slug))
+    if data is None:
+        try:
+            camp = Camp.objects.get(slug=camp_slug)
+        except Camp.DoesNotExist:
+            return None
+        data = build_schedule_snapshot(camp)
+    return data
+
+
+def invalidate_schedule_snapshot(camp_slug):
+    """Drop the cached schedule snapshot for a camp, it will be rebuilt on the next init"""
+    cache.delete(get_schedule_cache_key(camp_slug))
+
+
+def overlay_favorites(data, user):
+    """Return a copy of the event_instances in a snapshot with is_favorited set
+    for the user, using one query for all favorites"""
+    if not user or not user.is_authenticated:
+        return data["event_instances"]
+    favorites = set(user.favorites.values_list("event_instance_id", flat=True))
+    return [
+        {**instance, "is_favorited": instance["id"] in favorites}
+        for instance in data["event_instances"]
+    ]
+
+
+def get_schedule_deltas(camp_slug, version):
+    """Return the list of deltas newer than version, or None if any of them is
+    missing from the cache and the client has to fetch a full snapshot"""
+    current = get_schedule_version(camp_slug)
+    if version >= current:
+        return []
+    if current - version > SCHEDULE_DELTA_LOG_LENGTH:
+        return None
+    keys = [
+        get_schedule_delta_key(camp_slug, v) for v in range(version + 1, current + 1)
+    ]
+    deltas = cache.get_many(keys)
+    if len(deltas) != len(keys):
+        # a gap in the log, never let a client replay part of it
+        return None
+    return [deltas[key] for key in keys]
+
+
+def broadcast_schedule_delta(camp_slug, model, op, key, data=None):
+    """
+    Send a delta to the schedule_users group once the current transaction commits.
+
+    model is one of "event_slot", "event" or "speaker", op is "update" or "delete",
+    key identifies the object (the id for EventSlots, the slug otherwise) and data
+    is the serialized object for updates. Each delta gets the next schedule version
+    for the camp from an atomic counter and is stored under its own key, so
+    concurrent deltas never overwrite each other and clients can resync.
+    """
+
+    def send():
+        delta = {
+            "action": "delta",
+            "camp_slug": camp_slug,
+            "version": next_schedule_version(camp_slug),
+            "model": model,
+            "op": op,
+            "key": key,
+            "data": data,
+        }
+        cache.set(
+            get_schedule_delta_key(camp_slug, delta["version"]),
+            delta,
+            timeout=SCHEDULE_DELTA_TIMEOUT,
+        )
+        # the snapshot is rebuilt with the new version on the next init
+        invalidate_schedule_snapshot(camp_slug)
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        async_to_sync(channel_layer.group_send)(
+            "schedule_users",
+            {"type": "schedule.delta", "delta": delta},
+        )
+
+    transaction.on_commit(send)
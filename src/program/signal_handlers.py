@@ -1,6 +1,9 @@
 import logging
 
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
 
 logger = logging.getLogger("bornhack.%s" % __name__)
 
@@ -37,3 +40,176 @@ def check_speaker_event_camp_consistency(sender, instance, **kwargs):
 def event_session_post_save(sender, instance, created, **kwargs):
     """Make sure we have the number of EventSlots we need to have, adjust if not"""
     instance.fixup_event_slots()
+
+
+def event_slot_ics_post_save(sender, instance, **kwargs):
+    """Drop the cached ICS feed for the camp of this EventSlot"""
+    from .ics import invalidate_camp_ics_on_commit
+
+    invalidate_camp_ics_on_commit(instance.camp.slug)
+
+
+def event_slot_ics_post_delete(sender, instance, **kwargs):
+    """Drop the cached ICS feed for the camp of this EventSlot, empty slots are never cached"""
+    if instance.event_id is None:
+        return
+    from .ics import invalidate_camp_ics_on_commit
+
+    invalidate_camp_ics_on_commit(instance.camp.slug)
+
+
+def event_ics_invalidate(sender, instance, **kwargs):
+    """Drop the cached ICS feed for the camp of a saved or deleted Event. Deleting an
+    Event unschedules its EventSlots with a queryset update, which sends no signals"""
+    from .ics import invalidate_camp_ics_on_commit
+
+    invalidate_camp_ics_on_commit(instance.camp.slug)
+
+
+def camp_ics_invalidate(sender, instance, **kwargs):
+    """Drop the cached ICS feed for the camp of a Speaker or EventLocation"""
+    from .ics import invalidate_camp_ics_on_commit
+
+    if instance.camp:
+        invalidate_camp_ics_on_commit(instance.camp.slug)
+
+
+def event_type_ics_post_save(sender, instance, **kwargs):
+    """EventTypes are not camp specific, drop the cached ICS feeds for all camps"""
+    from camps.models import Camp
+
+    from .ics import invalidate_camp_ics_on_commit
+
+    for slug in Camp.objects.values_list("slug", flat=True):
+        invalidate_camp_ics_on_commit(slug)
+
+
+def camp_frab_mark_dirty(sender, instance, **kwargs):
+    """Mark the Frab XML for the camp of a changed program object as outdated"""
+    from .frab import mark_camp_frab_dirty
+
+    if instance.camp:
+        # after the commit, so the frab worker never rebuilds from old data
+        slug = instance.camp.slug
+        transaction.on_commit(lambda: mark_camp_frab_dirty(slug))
+
+
+def url_frab_mark_dirty(sender, instance, **kwargs):
+    """Mark the Frab XML as outdated when an Url belonging to an Event changes"""
+    if instance.event_id:
+        camp_frab_mark_dirty(sender, instance.event, **kwargs)
+
+
+def event_type_frab_mark_dirty(sender, instance, **kwargs):
+    """EventTypes are not camp specific, mark the Frab XML for all camps as outdated"""
+    from camps.models import Camp
+
+    from .frab import mark_camp_frab_dirty
+
+    for slug in Camp.objects.values_list("slug", flat=True):
+        transaction.on_commit(lambda slug=slug: mark_camp_frab_dirty(slug))
+
+
+def camp_schedule_invalidate(sender, instance, **kwargs):
+    """Drop the cached schedule snapshot for the camp of a changed program object
+    when the transaction commits, so a snapshot is never rebuilt from old rows"""
+    from .schedule import invalidate_schedule_snapshot
+
+    if instance.camp:
+        slug = instance.camp.slug
+        transaction.on_commit(lambda: invalidate_schedule_snapshot(slug))
+
+
+def event_type_schedule_invalidate(sender, instance, **kwargs):
+    """EventTypes are not camp specific, drop the cached schedule snapshots for all camps"""
+    from camps.models import Camp
+
+    from .schedule import invalidate_schedule_snapshot
+
+    for slug in Camp.objects.values_list("slug", flat=True):
+        transaction.on_commit(lambda slug=slug: invalidate_schedule_snapshot(slug))
+
+
+def event_slot_schedule_delta(sender, instance, **kwargs):
+    """Send a schedule delta for a saved or deleted EventSlot. Empty EventSlots are
+    not part of the schedule, so unscheduling an EventSlot is sent as a delete."""
+    from .schedule import broadcast_schedule_delta
+
+    if kwargs["signal"] == post_delete and instance.event_id is None:
+        return
+    if kwargs["signal"] == post_save and instance.event_id:
+        broadcast_schedule_delta(
+            instance.camp.slug,
+            "event_slot",
+            "update",
+            instance.id,
+            instance.serialize(),
+        )
+    else:
+        broadcast_schedule_delta(
+            instance.camp.slug,
+            "event_slot",
+            "delete",
+            instance.id,
+        )
+
+
+def event_schedule_delta(sender, instance, **kwargs):
+    """Send a schedule delta for a saved or deleted Event"""
+    from .schedule import broadcast_schedule_delta
+
+    if kwargs["signal"] == post_save:
+        broadcast_schedule_delta(
+            instance.camp.slug,
+            "event",
+            "update",
+            instance.slug,
+            instance.serialize(),
+        )
+    else:
+        broadcast_schedule_delta(instance.camp.slug, "event", "delete", instance.slug)
+
+
+def speaker_schedule_delta(sender, instance, **kwargs):
+    """Send a schedule delta for a saved or deleted Speaker"""
+    from .schedule import broadcast_schedule_delta
+
+    if not instance.camp:
+        return
+    if kwargs["signal"] == post_save:
+        broadcast_schedule_delta(
+            instance.camp.slug,
+            "speaker",
+            "update",
+            instance.slug,
+            instance.serialize(),
+        )
+    else:
+        broadcast_schedule_delta(instance.camp.slug, "speaker", "delete", instance.slug)
+
+
+def event_speakers_schedule_delta(sender, instance, action, pk_set, **kwargs):
+    """The speaker_slugs of Events change when speakers are added or removed"""
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+    from .models import Event
+    from .schedule import broadcast_schedule_delta
+
+    if isinstance(instance, Event):
+        events = [instance]
+    elif pk_set is None:
+        # the events of a speaker were cleared, we do not know which ones
+        if not instance.camp:
+            return
+        broadcast_schedule_delta(instance.camp.slug, "schedule", "reload", None)
+        return
+    else:
+        events = Event.objects.filter(id__in=pk_set)
+    for event in events:
+        broadcast_schedule_delta(
+            event.camp.slug,
+            "event",
+            "update",
+            event.slug,
+            event.serialize(),
+        )
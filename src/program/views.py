@@ -1,7 +1,6 @@
 import logging
 from collections import OrderedDict
 
-import icalendar
 from django import forms
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
@@ -15,7 +14,10 @@ from django.template import Context
 from django.template import Engine
 from django.urls import reverse
 from django.urls import reverse_lazy
+from django.utils.cache import get_conditional_response
+from django.utils import timezone
 from django.utils.decorators import method_decorator
+from django.utils.http import http_date
 from django.views.generic import DetailView
 from django.views.generic import ListView
 from django.views.generic import TemplateView
@@ -23,8 +25,6 @@ from django.views.generic import View
 from django.views.generic.edit import CreateView
 from django.views.generic.edit import DeleteView
 from django.views.generic.edit import UpdateView
-from lxml import etree
-from lxml import objectify
 
 from . import models
 from .email import add_event_proposal_updated_email
@@ -33,6 +33,14 @@ from .email import add_new_speaker_proposal_email
 from .email import add_speaker_proposal_updated_email
 from .forms import EventProposalForm
 from .forms import SpeakerProposalForm
+from .frab import FRAB_STALE_SECONDS
+from .frab import build_camp_frab
+from .frab import get_camp_frab
+from .frab import get_camp_frab_dirty
+from .ics import assemble_ics
+from .ics import get_camp_ics
+from .ics import get_cached_camp_ics
+from .ics import get_ics_etag
 from .mixins import AvailabilityMatrixViewMixin
 from .mixins import EnsureCFPOpenMixin
 from .mixins import EnsureUserOwnsProposalMixin
@@ -44,6 +52,7 @@ from .multiform import MultiModelForm
 from .utils import get_speaker_availability_form_matrix
 from .utils import save_speaker_availability
 from camps.mixins import CampViewMixin
+from camps.models import Camp
 from utils.middleware import RedirectException
 from utils.mixins import GetObjectMixin
 from utils.mixins import UserIsObjectOwnerMixin
@@ -55,59 +64,63 @@ logger = logging.getLogger("bornhack.%s" % __name__)
 # ical calendar
 
 
-class ICSView(CampViewMixin, View):
+class ICSView(View):
+    """
+    Serve the ICS feed for a camp from the pre-rendered VEVENTs in program.ics,
+    filtered by type, location and video state. Conditional GET requests are
+    answered from the cache alone, without touching the database.
+    """
+
     def get(self, request, *args, **kwargs):
-        query_kwargs = {}
+        camp_slug = self.kwargs["camp_slug"]
+        data = get_cached_camp_ics(camp_slug)
+        if data is None:
+            # make sure the camp exists before building the cache
+            get_object_or_404(Camp, slug=camp_slug)
+            data = get_camp_ics(camp_slug)
+
+        etag = get_ics_etag(data, request.META.get("QUERY_STRING", ""))
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(data["last_modified"].timestamp()),
+        )
+        if response:
+            return response
+
+        filter_kwargs = {}
         # Type query
         type_query = request.GET.get("type", None)
         if type_query:
-            type_slugs = type_query.split(",")
-            query_kwargs["event__event_type__in"] = models.EventType.objects.filter(
-                slug__in=type_slugs,
-            )
+            filter_kwargs["event_types"] = type_query.split(",")
 
         # Location query
         location_query = request.GET.get("location", None)
         if location_query:
-            location_slugs = location_query.split(",")
-            query_kwargs["location__in"] = models.EventLocation.objects.filter(
-                slug__in=location_slugs,
-                camp=self.camp,
-            )
+            filter_kwargs["locations"] = location_query.split(",")
 
         # Video recording query
         video_query = request.GET.get("video", None)
         if video_query:
             video_states = video_query.split(",")
 
-            if "has-recording" in video_states:
-                query_kwargs["event__video_url__isnull"] = False
-
+            # "has-recording" is accepted but ignored, Events have no recording url
             if "to-be-recorded" in video_states:
-                query_kwargs["event__video_recording"] = True
+                filter_kwargs["video_recording"] = True
 
             if "not-to-be-recorded" in video_states:
-                if "event__video_recording" in query_kwargs:
-                    del query_kwargs["event__video_recording"]
+                if "video_recording" in filter_kwargs:
+                    del filter_kwargs["video_recording"]
                 else:
-                    query_kwargs["event__video_recording"] = False
-
-        event_slots = models.EventSlot.objects.filter(
-            event__track__camp=self.camp,
-            **query_kwargs,
-        ).prefetch_related("event", "event_session__event_location")
+                    filter_kwargs["video_recording"] = False
 
-        cal = icalendar.Calendar()
-        cal.add("prodid", "-//BornHack Website iCal Generator//bornhack.dk//")
-        cal.add("version", "2.0")
-        for slot in event_slots:
-            cal.add_component(slot.get_ics_event())
-
-        response = HttpResponse(cal.to_ical())
+        response = HttpResponse(assemble_ics(data, **filter_kwargs))
         response["Content-Type"] = "text/calendar"
         response["Content-Disposition"] = "inline; filename={}.ics".format(
-            self.camp.slug,
+            camp_slug,
         )
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(data["last_modified"].timestamp())
         return response
 
 
@@ -1029,131 +1042,42 @@ class CallForParticipationView(CampViewMixin, TemplateView):
     template_name = "call_for_participation.html"
 
 
-class FrabXmlView(CampViewMixin, View):
+class FrabXmlView(View):
     """
-    This view returns an XML schedule in Frab format
-    XSD is from https://raw.githubusercontent.com/wiki/frab/frab/images/schedule.xsd
+    This view returns an XML schedule in Frab format. The XML is rendered by
+    program.frab and kept in the cache, and rebuilt by the frab worker when
+    program data changes. The response has the schedule version in the
+    X-Schedule-Version header and an ETag, so conditional GET requests are
+    answered from the cache alone.
     """
 
-    def get(self, *args, **kwargs):
-        # get all EventSlots with something scheduled
-        qs = (
-            models.EventSlot.objects.filter(event__track__camp=self.camp)
-            .prefetch_related(
-                "event__urls",
-                "event__speakers",
-                "event_session__event_location",
-            )
-            .order_by("when", "event_session__event_location")
-        )
-        E = objectify.ElementMaker(annotate=False)
-        days = ()
-        i = 0
-        # loop over days
-        for day in self.camp.get_days("camp")[:-1]:
-            i += 1
-            # build a tuple of locations
-            locations = ()
-            # loop over locations
-            for location in models.EventLocation.objects.filter(
-                id__in=qs.filter(event__isnull=False).values_list(
-                    "event_session__event_location_id",
-                    flat=True,
-                ),
-            ):
-                # build a tuple of scheduled events at this location
-                instances = ()
-                for slot in qs.filter(
-                    when__contained_by=day,
-                    event_session__event_location=location,
-                ):
-                    # build a tuple of speakers for this event
-                    speakers = ()
-                    for speaker in slot.event.speakers.all():
-                        speakers += (E.person(speaker.name, id=str(speaker.pk)),)
-
-                    # build a tuple of URLs for this Event
-                    urls = ()
-                    for url in slot.event.urls.all():
-                        urls += (E.link(url.url_type.name, href=url.url),)
-
-                    # add this event to the instances tuple
-                    instances += (
-                        E.event(
-                            E.date(slot.when.lower.isoformat()),
-                            E.start(slot.when.lower.time()),
-                            E.duration(slot.event.duration),
-                            E.room(location.name),
-                            E.slug(f"{slot.pk}-{slot.event.slug}"),
-                            E.url(
-                                self.request.build_absolute_uri(
-                                    slot.event.get_absolute_url(),
-                                ),
-                            ),
-                            E.recording(
-                                E.license("CC BY-SA 4.0"),
-                                E.optout(
-                                    "false" if slot.event.video_recording else "true",
-                                ),
-                            ),
-                            E.title(slot.event.title),
-                            # our Events have no subtitle
-                            E.subtitle(""),
-                            E.track(slot.event.track),
-                            E.type(slot.event.event_type),
-                            # our Events have no language attribute but are mostly english
-                            E.language("en"),
-                            E.abstract(slot.event.abstract),
-                            # our Events have no long description
-                            E.description(""),
-                            E.persons(*speakers),
-                            E.links(*urls),
-                            E.attachments,
-                            id=str(slot.id),
-                            guid=str(slot.uuid),
-                        ),
-                    )
-                # add the events for this location on this day to the locations tuple
-                locations += (E.room(*instances, name=location.name),)
-
-            # add this day to the days tuple
-            days += (
-                E.day(
-                    *locations,
-                    index=str(i),
-                    date=str(day.lower.date()),
-                    start=day.lower.isoformat(),
-                    end=day.upper.isoformat(),
-                ),
+    def get(self, request, *args, **kwargs):
+        camp_slug = self.kwargs["camp_slug"]
+        data = get_camp_frab(camp_slug)
+        dirty = get_camp_frab_dirty(camp_slug)
+        if data is None or (
+            dirty and (timezone.now() - dirty).total_seconds() > FRAB_STALE_SECONDS
+        ):
+            # first request for this camp, or the frab worker is not running
+            camp = get_object_or_404(Camp, slug=camp_slug)
+            data = build_camp_frab(
+                camp,
+                data["base_url"] if data else request.build_absolute_uri("/"),
             )
-
-        # put the XML together
-        xml = E.schedule(
-            E.version("BornHack Frab XML Generator v2.0"),
-            E.conference(
-                E.title(self.camp.title),
-                E.acronym(str(self.camp.camp.lower.year)),
-                E.start(self.camp.camp.lower.date().isoformat()),
-                E.end(self.camp.camp.upper.date().isoformat()),
-                E.days(len(self.camp.get_days("camp"))),
-                E.timeslot_duration("00:30"),
-                E.base_url(self.request.build_absolute_uri("/")),
-            ),
-            *days,
+            if data is None:
+                # we are generating invalid XML
+                return HttpResponseServerError()
+
+        response = get_conditional_response(
+            request,
+            etag=data["etag"],
+            last_modified=int(data["last_modified"].timestamp()),
         )
-        xml = etree.tostring(xml, pretty_print=True, xml_declaration=True)
-
-        # let's play nice - validate the XML before returning it
-        schema = etree.XMLSchema(file="program/xsd/schedule.xml.xsd")
-        parser = objectify.makeparser(schema=schema)
-        try:
-            objectify.fromstring(xml, parser)
-        except etree.XMLSyntaxError:
-            # we are generating invalid XML
-            logger.exception("Something went sideways when validating frab xml :(")
-            return HttpResponseServerError()
-        response = HttpResponse(content_type="application/xml")
-        response.write(xml)
+        if response is None:
+            response = HttpResponse(data["xml"], content_type="application/xml")
+        response["ETag"] = data["etag"]
+        response["Last-Modified"] = http_date(data["last_modified"].timestamp())
+        response["X-Schedule-Version"] = data["version"]
         return response
 
 
@@ -1,9 +1,22 @@
 import logging
 
 from django.apps import AppConfig
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
 
 logger = logging.getLogger("bornhack.%s" % __name__)
 
 
 class ShopConfig(AppConfig):
     name = "shop"
+
+    def ready(self):
+        from .models import Order
+        from .models import OrderProductRelation
+        from .signal_handlers import opr_update_stock_reserved
+        from .signal_handlers import order_update_stock_reserved
+
+        # keep Product.stock_reserved up to date
+        post_save.connect(order_update_stock_reserved, sender=Order)
+        post_save.connect(opr_update_stock_reserved, sender=OrderProductRelation)
+        post_delete.connect(opr_update_stock_reserved, sender=OrderProductRelation)
@@ -1,10 +1,12 @@
-def current_order(request):
-    if request.user.is_authenticated:
-        order = None
-        orders = request.user.orders.filter(open__isnull=False)
+from django.utils.functional import SimpleLazyObject
 
-        if orders:
-            order = orders[0]
 
-        return {"current_order": order}
+def current_order(request):
+    if request.user.is_authenticated:
+        # only query for the open order if the template uses it
+        return {
+            "current_order": SimpleLazyObject(
+                lambda: request.user.orders.filter(open__isnull=False).first(),
+            ),
+        }
     return {}
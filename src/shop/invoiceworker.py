@@ -11,12 +11,55 @@ from shop.models import CustomOrder
 from shop.models import Invoice
 from shop.models import Order
 from shop.models import Refund
-from utils.pdf import generate_pdf_letter
+from utils.pdf import generate_pdf_letters
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("bornhack.%s" % __name__)
 
 
+def bank_details():
+    return {
+        "bank": settings.BANKACCOUNT_BANK,
+        "bank_iban": settings.BANKACCOUNT_IBAN,
+        "bank_bic": settings.BANKACCOUNT_SWIFTBIC,
+        "bank_dk_reg": settings.BANKACCOUNT_REG,
+        "bank_dk_accno": settings.BANKACCOUNT_ACCOUNT,
+    }
+
+
+def proforma_invoice_letter(order):
+    return (
+        order.filename,
+        "pdf/proforma_invoice.html",
+        {"hostname": settings.ALLOWED_HOSTS[0], "order": order, **bank_details()},
+    )
+
+
+def invoice_letter(invoice):
+    if invoice.customorder:
+        template = "pdf/custominvoice.html"
+    else:
+        template = "pdf/invoice.html"
+    return invoice.filename, template, {"invoice": invoice, **bank_details()}
+
+
+def creditnote_letter(creditnote):
+    return creditnote.filename, "pdf/creditnote.html", {"creditnote": creditnote}
+
+
+def generate_pdfs(queryset, letter):
+    """
+    Generate PDFs for the objects in the queryset in batches of settings.PDF_BATCH_SIZE.
+    Each batch is rendered by a pool of settings.PDF_RENDER_WORKERS processes.
+    letter is a function returning a (filename, template, formatdict) tuple for an
+    object. Yields (object, BytesIO) tuples, or (object, exception) if it failed.
+    """
+    objects = list(queryset)
+    for i in range(0, len(objects), settings.PDF_BATCH_SIZE):
+        batch = objects[i : i + settings.PDF_BATCH_SIZE]
+        yield from zip(batch, generate_pdf_letters([letter(obj) for obj in batch]))
+
+
 def do_work():
     """
     The invoice worker creates Invoice objects for shop orders and
@@ -26,24 +69,19 @@ def do_work():
     """
 
     # check if we need to generate any proforma invoices for shop orders
-    for order in Order.objects.filter(
-        Q(pdf="") | Q(pdf__isnull=True),
-        open__isnull=True,
+    for order, pdffile in generate_pdfs(
+        Order.objects.filter(
+            Q(pdf="") | Q(pdf__isnull=True),
+            open__isnull=True,
+        ),
+        proforma_invoice_letter,
     ):
-        # generate proforma invoice for this Order
-        pdffile = generate_pdf_letter(
-            filename=order.filename,
-            template="pdf/proforma_invoice.html",
-            formatdict={
-                "hostname": settings.ALLOWED_HOSTS[0],
-                "order": order,
-                "bank": settings.BANKACCOUNT_BANK,
-                "bank_iban": settings.BANKACCOUNT_IBAN,
-                "bank_bic": settings.BANKACCOUNT_SWIFTBIC,
-                "bank_dk_reg": settings.BANKACCOUNT_REG,
-                "bank_dk_accno": settings.BANKACCOUNT_ACCOUNT,
-            },
-        )
+        if isinstance(pdffile, Exception):
+            logger.exception(
+                f"Unable to generate proforma invoice PDF for order {order}. Error: {pdffile}",
+                exc_info=pdffile,
+            )
+            continue
         # update order object with the file
         order.pdf.save(str(order.filename), File(pdffile))
         order.save()
@@ -74,32 +112,18 @@ def do_work():
         logger.info(f"Generated CreditNote object for {refund}")
 
     # check if we need to generate any pdf invoices
-    for invoice in Invoice.objects.filter(Q(pdf="") | Q(pdf__isnull=True)):
-        # generate the pdf
-        try:
-            if invoice.customorder:
-                template = "pdf/custominvoice.html"
-            else:
-                template = "pdf/invoice.html"
-            pdffile = generate_pdf_letter(
-                filename=invoice.filename,
-                template=template,
-                formatdict={
-                    "invoice": invoice,
-                    "bank": settings.BANKACCOUNT_BANK,
-                    "bank_iban": settings.BANKACCOUNT_IBAN,
-                    "bank_bic": settings.BANKACCOUNT_SWIFTBIC,
-                    "bank_dk_reg": settings.BANKACCOUNT_REG,
-                    "bank_dk_accno": settings.BANKACCOUNT_ACCOUNT,
-                },
-            )
-            logger.info("Generated pdf for invoice %s" % invoice)
-        except Exception as E:
+    for invoice, pdffile in generate_pdfs(
+        Invoice.objects.filter(Q(pdf="") | Q(pdf__isnull=True)),
+        invoice_letter,
+    ):
+        if isinstance(pdffile, Exception):
             logger.exception(
                 "Unable to generate PDF file for invoice #%s. Error: %s"
-                % (invoice.pk, E),
+                % (invoice.pk, pdffile),
+                exc_info=pdffile,
             )
             continue
+        logger.info("Generated pdf for invoice %s" % invoice)
 
         # update invoice object with the file
         invoice.pdf.save(str(invoice.filename), File(pdffile))
@@ -129,21 +153,18 @@ def do_work():
             )
 
     # check if we need to generate any pdf creditnotes?
-    for creditnote in CreditNote.objects.filter(Q(pdf="") | Q(pdf__isnull=True)):
-        # generate the pdf
-        try:
-            pdffile = generate_pdf_letter(
-                filename=creditnote.filename,
-                template="pdf/creditnote.html",
-                formatdict={"creditnote": creditnote},
-            )
-            logger.info("Generated pdf for creditnote %s" % creditnote)
-        except Exception as E:
+    for creditnote, pdffile in generate_pdfs(
+        CreditNote.objects.filter(Q(pdf="") | Q(pdf__isnull=True)),
+        creditnote_letter,
+    ):
+        if isinstance(pdffile, Exception):
             logger.exception(
                 "Unable to generate PDF file for creditnote #%s. Error: %s"
-                % (creditnote.pk, E),
+                % (creditnote.pk, pdffile),
+                exc_info=pdffile,
             )
             continue
+        logger.info("Generated pdf for creditnote %s" % creditnote)
 
         # update creditnote object with the file
         creditnote.pdf.save(creditnote.filename, File(pdffile))
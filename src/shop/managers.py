@@ -1,6 +1,10 @@
+from django.db import transaction
 from django.db.models import Exists
 from django.db.models import OuterRef
 from django.db.models import QuerySet
+from django.db.models import Subquery
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 
@@ -18,6 +22,37 @@ class ProductQuerySet(QuerySet):
             has_subproducts=Exists(subproducts),
         )
 
+    def update_stock_reserved(self):
+        """Recount Product.stock_reserved for the products in this queryset which have
+        a limited stock. The product rows are locked before counting so concurrent
+        recounts and reservations in Order.close() are serialised per product.
+        """
+        from .models import OrderProductRelation
+
+        reserved = (
+            OrderProductRelation.objects.filter(
+                product=OuterRef("pk"),
+                order__open=None,
+                order__cancelled=False,
+            )
+            .order_by()
+            .values("product")
+            .annotate(total=Sum("quantity"))
+            .values("total")
+        )
+        with transaction.atomic():
+            pks = list(
+                self.filter(stock_amount__isnull=False)
+                .select_for_update()
+                .order_by("pk")
+                .values_list("pk", flat=True),
+            )
+            if not pks:
+                return 0
+            return self.model.objects.filter(pk__in=pks).update(
+                stock_reserved=Coalesce(Subquery(reserved), 0),
+            )
+
 
 class OrderQuerySet(QuerySet):
     def not_cancelled(self):
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_stock_reserved(apps, schema_editor):
+    Product = apps.get_model("shop", "Product")
+    OrderProductRelation = apps.get_model("shop", "OrderProductRelation")
+    reserved = (
+        OrderProductRelation.objects.filter(
+            product=OuterRef("pk"),
+            order__open=None,
+            order__cancelled=False,
+        )
+        .order_by()
+        .values("product")
+        .annotate(total=Sum("quantity"))
+        .values("total")
+    )
+    Product.objects.filter(stock_amount__isnull=False).update(
+        stock_reserved=Coalesce(Subquery(reserved), 0),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shop", "0084_subproductrelation_product_sub_products"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="stock_reserved",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="The number of units reserved by closed orders which are not cancelled. Maintained by ProductQuerySet.update_stock_reserved()",
+            ),
+        ),
+        migrations.RunPython(count_stock_reserved, migrations.RunPython.noop),
+    ]
@@ -31,8 +31,10 @@ from .managers import OrderQuerySet
 from .managers import ProductQuerySet
 from tickets.models import ShopTicket
 from tickets.models import TicketGroup
+from tickets.models import TicketToken
 from utils.models import CreatedUpdatedModel
 from utils.models import UUIDModel
+from utils.models import writable_camps
 from utils.slugs import unique_slugify
 
 logger = logging.getLogger("bornhack.%s" % __name__)
@@ -68,6 +70,10 @@ class CustomOrder(ExportModelOperationsMixin("custom_order"), CreatedUpdatedMode
             return 0
 
 
+class OutOfStockError(ValidationError):
+    pass
+
+
 class Order(ExportModelOperationsMixin("order"), CreatedUpdatedModel):
     class Meta:
         unique_together = ("user", "open")
@@ -233,6 +239,40 @@ class Order(ExportModelOperationsMixin("order"), CreatedUpdatedModel):
     def get_tickets(self):
         return chain(*[opr.shoptickets.all() for opr in self.oprs.all()])
 
+    def close(self):
+        """Close the order and reserve stock for the products in it.
+
+        The rows of the limited products are locked until the transaction commits, so
+        concurrent checkouts wait for each other and stock can't be oversold.
+        Raises OutOfStockError without closing the order if a product is sold out.
+        """
+        with transaction.atomic():
+            quantities = dict(
+                self.oprs.order_by()
+                .values("product")
+                .annotate(total=Sum("quantity"))
+                .values_list("product", "total"),
+            )
+            out_of_stock = [
+                product
+                for product in Product.objects.filter(
+                    pk__in=quantities,
+                    stock_amount__isnull=False,
+                )
+                .select_for_update()
+                .order_by("pk")
+                if product.left_in_stock < quantities[product.pk]
+            ]
+            if out_of_stock:
+                raise OutOfStockError(
+                    "Not enough left in stock of: %s"
+                    % ", ".join(product.name for product in out_of_stock),
+                )
+
+            # saving the closed order updates Product.stock_reserved
+            self.open = None
+            self.save()
+
     def mark_as_paid(self, request=None):
         self.paid = True
         self.open = None
@@ -559,6 +599,15 @@ class Product(ExportModelOperationsMixin("product"), CreatedUpdatedModel, UUIDMo
         blank=True,
     )
 
+    stock_reserved = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text=(
+            "The number of units reserved by closed orders which are not cancelled. "
+            "Maintained by ProductQuerySet.update_stock_reserved()"
+        ),
+    )
+
     cost = models.IntegerField(
         default=0,
         help_text="The cost for this product, including VAT. Used for profit calculations in the economy system.",
@@ -579,6 +628,15 @@ class Product(ExportModelOperationsMixin("product"), CreatedUpdatedModel, UUIDMo
         if self.category.name == "Tickets" and not self.ticket_type:
             raise ValidationError("Products with category Tickets need a ticket_type")
 
+    def save(self, **kwargs):
+        """Recount the reserved stock after saving, the instance may hold an old count
+        and stock_amount may have changed."""
+        with transaction.atomic():
+            super().save(**kwargs)
+            if self.stock_amount:
+                Product.objects.filter(pk=self.pk).update_stock_reserved()
+                self.refresh_from_db(fields=["stock_reserved"])
+
     def is_available(self):
         """Is the product available or not?
 
@@ -622,16 +680,9 @@ class Product(ExportModelOperationsMixin("product"), CreatedUpdatedModel, UUIDMo
             #
             # This means that an order has either been paid (by card or blockchain)
             # or is marked to be paid with cash or bank transfer, meaning it is a
-            # "reservation" of the product in question.
-            sold = OrderProductRelation.objects.filter(
-                product=self,
-                order__open=None,
-                order__cancelled=False,
-            ).aggregate(Sum("quantity"))["quantity__sum"]
-
-            total_left = self.stock_amount - (sold or 0)
-
-            return total_left
+            # "reservation" of the product in question. The reserved count is kept
+            # up to date when orders are closed or cancelled, see signal_handlers.py
+            return self.stock_amount - self.stock_reserved
         return None
 
     @property
@@ -737,15 +788,23 @@ class OrderProductRelation(
         *,
         product: Product,
         number_of_tickets: int = 1,
+        already_created_tickets: int = 0,
+        refunded: int = 0,
         bundle_product: Optional[Product] = None,
         ticket_group: Optional[TicketGroup] = None,
         request: Optional[HttpRequest] = None,
     ) -> list[ShopTicket]:
+        """Return the unsaved tickets needed for this product, create_tickets() inserts them.
+
+        The number of tickets which already exist and the number of refunded
+        products are counted by the caller so a bundle doesn't need queries per ticket group.
+        """
         if not product.ticket_type:
             return []
 
         # put reusable kwargs together
         query_kwargs = {
+            "opr": self,
             "product": product,
             "ticket_type": product.ticket_type,
         }
@@ -759,12 +818,8 @@ class OrderProductRelation(
         if product.ticket_type.single_ticket_per_product:
             # For this ticket type we create one ticket regardless of quantity,
             # so 20 chairs don't result in 20 tickets
-
-            new_tickets = []
-            ticket, created = self.shoptickets.get_or_create(**query_kwargs)
-
-            if created:
-                new_tickets.append(ticket)
+            created = not already_created_tickets
+            new_tickets = [ShopTicket(**query_kwargs)] if created else []
 
             if request:
                 if created:
@@ -780,28 +835,18 @@ class OrderProductRelation(
                 messages.success(request, msg)
         else:
             # For this ticket type we create a ticket per item,
-            # find out if any have already been created
-            already_created_tickets = self.shoptickets.filter(
-                **query_kwargs,
-            ).count()
-
             # find out how many we need to create
             tickets_to_create = max(
                 0,
-                number_of_tickets
-                - already_created_tickets
-                - (self.rprs.aggregate(models.Sum("quantity"))["quantity__sum"] or 0),
+                number_of_tickets - already_created_tickets - refunded,
             )
 
             if not tickets_to_create:
                 return []
 
-            query_kwargs["opr"] = self
-            # create the number of tickets required
             new_tickets = [
                 ShopTicket(**query_kwargs) for _i in range(tickets_to_create)
             ]
-            self.shoptickets.bulk_create(new_tickets)
 
             if request:
                 msg = f"Created {number_of_tickets} tickets of type: {product.ticket_type.name}"
@@ -819,15 +864,22 @@ class OrderProductRelation(
 
         Calling this method multiple times will not result in duplicate tickets being created,
         and the number of tickets created takes the number of refunded into consideration too.
+
+        The tickets get their tokens before they are inserted, so all tickets, ticket groups
+        and token index rows are created with a few bulk queries regardless of quantity.
         """
 
         tickets = []
         with transaction.atomic():
             # do we even generate tickets for this type of product?
-            sub_product_relations = self.product.sub_product_relations.all()
+            sub_product_relations = self.product.sub_product_relations.select_related(
+                "sub_product__ticket_type__camp",
+            )
             if not self.product.ticket_type and not sub_product_relations:
                 return tickets
 
+            refunded = self.rprs.aggregate(Sum("quantity"))["quantity__sum"] or 0
+
             if sub_product_relations:
                 # If there are sub products, we need to create a ticket group to match
                 # the quantity of the OPR.
@@ -839,38 +891,80 @@ class OrderProductRelation(
                 if len(ticket_groups) < self.quantity:
                     # We want to create the difference between the quantity of the OPR and the number of ticket groups
                     difference = self.quantity - len(ticket_groups)
-                    for _i in range(difference):
-                        ticket_group = TicketGroup.objects.create(opr=self)
-                        ticket_groups.append(ticket_group)
+                    ticket_groups.extend(
+                        TicketGroup.objects.bulk_create(
+                            [TicketGroup(opr=self) for _i in range(difference)],
+                        ),
+                    )
+
+                # count the existing tickets per sub product and ticket group in one query
+                existing_tickets = (
+                    self.shoptickets.filter(bundle_product=self.product)
+                    .values("product", "ticket_type", "ticket_group")
+                    .annotate(count=Count("pk"))
+                    .order_by()
+                )
+                existing = {
+                    (
+                        row["product"],
+                        row["ticket_type"],
+                        row["ticket_group"],
+                    ): row["count"]
+                    for row in existing_tickets
+                }
 
                 # For each bought product we create a ticket for each sub product
                 for ticket_group in ticket_groups:
                     for sub_product_relation in sub_product_relations:
-                        new_tickets = self._create_tickets_helper(
-                            product=sub_product_relation.sub_product,
-                            bundle_product=self.product,
-                            number_of_tickets=sub_product_relation.number_of_tickets,
-                            ticket_group=ticket_group,
-                            request=request,
+                        sub_product = sub_product_relation.sub_product
+                        tickets.extend(
+                            self._create_tickets_helper(
+                                product=sub_product,
+                                bundle_product=self.product,
+                                number_of_tickets=sub_product_relation.number_of_tickets,
+                                already_created_tickets=existing.get(
+                                    (
+                                        sub_product.pk,
+                                        sub_product.ticket_type_id,
+                                        ticket_group.pk,
+                                    ),
+                                    0,
+                                ),
+                                refunded=refunded,
+                                ticket_group=ticket_group,
+                                request=request,
+                            ),
                         )
             else:
                 # If there are no sub products, we just create a ticket for the product
-                new_tickets = self._create_tickets_helper(
-                    product=self.product,
-                    number_of_tickets=self.quantity,
-                    request=request,
+                tickets.extend(
+                    self._create_tickets_helper(
+                        product=self.product,
+                        number_of_tickets=self.quantity,
+                        already_created_tickets=self.shoptickets.filter(
+                            product=self.product,
+                            ticket_type=self.product.ticket_type,
+                        ).count(),
+                        refunded=refunded,
+                        request=request,
+                    ),
                 )
 
-            tickets.extend(new_tickets)
+            if tickets:
+                # set the tokens before inserting, the uuid pk is assigned on init and
+                # ticket.opr is this instance so the order user is only fetched once
+                for ticket in tickets:
+                    ticket.token = ticket._get_token()
+                    ticket.badge_token = ticket._get_badge_token()
+                # bulk_create() skips the read only check in CampRelatedModel.save()
+                with writable_camps({ticket.ticket_type.camp_id for ticket in tickets}):
+                    ShopTicket.objects.bulk_create(tickets)
+                    TicketToken.register(tickets)
 
             # and mark the OPR as ticket_generated=True
             self.ticket_generated = timezone.now()
             self.save()
 
-            # At last save all tickets to persist the token to the database.
-            for ticket in tickets:
-                ticket.save()
-
             return tickets
 
     @property
@@ -0,0 +1,24 @@
+import logging
+
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+
+def order_update_stock_reserved(sender, instance, **kwargs):
+    """Recount the reserved stock of the products in an order when it is closed or
+    cancelled. Open orders don't reserve stock so they are skipped."""
+    if instance.open:
+        return
+    from .models import Product
+
+    Product.objects.filter(
+        pk__in=instance.oprs.values("product"),
+    ).update_stock_reserved()
+
+
+def opr_update_stock_reserved(sender, instance, **kwargs):
+    """Recount the reserved stock of a product when an OPR on a closed order changes"""
+    if not instance.product.stock_amount or instance.order.open:
+        return
+    from .models import Product
+
+    Product.objects.filter(pk=instance.product_id).update_stock_reserved()
@@ -14,6 +14,7 @@ from .factories import ProductFactory
 from .factories import SubProductRelationFactory
 from .models import Order
 from .models import OrderProductRelation
+from .models import OutOfStockError
 from .models import Product
 from .models import RefundEnum
 from camps.factories import CampFactory
@@ -23,7 +24,9 @@ from shop.forms import OrderProductRelationForm
 from tickets.factories import TicketTypeFactory
 from tickets.models import ShopTicket
 from tickets.models import TicketGroup
+from tickets.models import TicketToken
 from utils.factories import UserFactory
+from utils.models import CampReadOnlyModeError
 
 
 class ProductAvailabilityTest(TestCase):
@@ -42,6 +45,8 @@ class ProductAvailabilityTest(TestCase):
         OrderProductRelationFactory(product=product, order__open=None)
         opr = OrderProductRelationFactory(product=product, order__open=None)
 
+        # the reserved stock is counted in the database
+        product.refresh_from_db()
         self.assertEqual(product.left_in_stock, 0)
         self.assertFalse(product.is_stock_available)
         self.assertFalse(product.is_available())
@@ -50,10 +55,36 @@ class ProductAvailabilityTest(TestCase):
         opr.order.cancelled = True
         opr.order.save()
 
+        product.refresh_from_db()
         self.assertEqual(product.left_in_stock, 1)
         self.assertTrue(product.is_stock_available)
         self.assertTrue(product.is_available())
 
+    def test_close_order_reserves_stock(self):
+        """Closing an order reserves stock, and fails if there isn't enough left."""
+        product = ProductFactory(stock_amount=3)
+        opr = OrderProductRelationFactory(product=product, quantity=2)
+
+        opr.order.close()
+        product.refresh_from_db()
+        self.assertIsNone(opr.order.open)
+        self.assertEqual(product.stock_reserved, 2)
+        self.assertEqual(product.left_in_stock, 1)
+
+        opr2 = OrderProductRelationFactory(product=product, quantity=2)
+        with self.assertRaises(OutOfStockError):
+            opr2.order.close()
+        opr2.order.refresh_from_db()
+        self.assertTrue(opr2.order.open)
+
+        # cancelling the first order releases the stock
+        opr.order.mark_as_cancelled()
+        product.refresh_from_db()
+        self.assertEqual(product.left_in_stock, 3)
+        opr2.order.close()
+        product.refresh_from_db()
+        self.assertEqual(product.left_in_stock, 1)
+
     def test_product_available_by_time(self):
         """The product is available if now is in the right timeframe."""
         product = ProductFactory()
@@ -111,6 +142,7 @@ class TestOrderProductRelationForm(TestCase):
         OrderProductRelationFactory(product=product, quantity=1, order__open=None)
 
         # There should only be 1 product left, since we just reserved 1
+        product.refresh_from_db()
         opr2 = OrderProductRelationFactory(product=product)
 
         form = OrderProductRelationForm({"quantity": 2}, instance=opr2)
@@ -523,6 +555,48 @@ class TestTicketCreation(TestCase):
             2,
         )
 
+    def test_bundle_tickets_have_tokens(self):
+        """Test that tickets created in bulk get their tokens and are in the token index."""
+        bundle_product = ProductFactory()
+        sub_product = ProductFactory(
+            ticket_type=TicketTypeFactory(single_ticket_per_product=False),
+        )
+        bundle_product.sub_products.add(
+            sub_product,
+            through_defaults={"number_of_tickets": 3},
+        )
+        order = OrderFactory(user=self.user)
+        OrderProductRelationFactory(order=order, product=bundle_product, quantity=2)
+        order.mark_as_paid()
+
+        tickets = ShopTicket.objects.filter(opr__order=order)
+        self.assertEqual(tickets.count(), 6)
+        for ticket in tickets:
+            self.assertEqual(ticket.token, ticket._get_token())
+            self.assertEqual(ticket.badge_token, ticket._get_badge_token())
+            self.assertEqual(TicketToken.get_ticket(ticket.token), ticket)
+            self.assertEqual(TicketToken.get_ticket(ticket.badge_token), ticket)
+
+    def test_no_tickets_for_read_only_camp(self):
+        """Test that tickets created in bulk are not created in a read only camp."""
+        bundle_product = ProductFactory()
+        sub_product = ProductFactory(
+            ticket_type=TicketTypeFactory(single_ticket_per_product=False),
+        )
+        bundle_product.sub_products.add(
+            sub_product,
+            through_defaults={"number_of_tickets": 3},
+        )
+        opr = OrderProductRelationFactory(product=bundle_product, quantity=2)
+        camp = sub_product.ticket_type.camp
+        camp.read_only = True
+        camp.save()
+
+        with self.assertRaises(CampReadOnlyModeError):
+            opr.create_tickets()
+        self.assertFalse(ShopTicket.objects.filter(opr=opr).exists())
+        self.assertFalse(TicketGroup.objects.filter(opr=opr).exists())
+
 
 class TestOrderProductRelationModel(TestCase):
     def test_refunded_cannot_be_larger_than_quantity(self):
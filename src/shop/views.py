@@ -33,6 +33,7 @@ from .quickpay import QuickPay
 from shop.models import CreditNote
 from shop.models import Order
 from shop.models import OrderProductRelation
+from shop.models import OutOfStockError
 from shop.models import Product
 from shop.models import ProductCategory
 from shop.models import QuickPayAPICallback
@@ -404,10 +405,15 @@ class OrderReviewAndPayView(
                 )
                 return self.render_to_response(self.get_context_data())
 
-            # Set payment method and mark the order as closed
+            # Set payment method and mark the order as closed, reserving the stock
             order.payment_method = payment_method
-            order.open = None
-            order.save()
+            try:
+                order.close()
+            except OutOfStockError as e:
+                messages.error(request, e.message)
+                return HttpResponseRedirect(
+                    reverse("shop:order_detail", kwargs={"pk": order.pk}),
+                )
 
             reverses = {
                 Order.PaymentMethods.CREDIT_CARD: reverse_lazy(
@@ -0,0 +1,101 @@
+import logging
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from tickets.factories import TicketTypeFactory
+from tickets.models import DiscountTicket
+from tickets.models import ShopTicket
+from tickets.models import SponsorTicket
+from tickets.models import TicketToken
+
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+
+def legacy_ticket_getter_by_token(token):
+    """The scan lookup used before the TicketToken index, for comparison"""
+    for ticket_class in [ShopTicket, SponsorTicket, DiscountTicket]:
+        try:
+            return ticket_class.objects.get(Q(token=token) | Q(badge_token=token))
+        except ticket_class.DoesNotExist:
+            continue
+
+
+class Command(BaseCommand):
+    args = "none"
+    help = "Create a camp with many tickets and measure the latency of looking up scanned ticket tokens. Everything is rolled back afterwards."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tickets",
+            type=int,
+            default=10000,
+            help="The number of tickets to create (default 10000)",
+        )
+        parser.add_argument(
+            "--scans",
+            type=int,
+            default=1000,
+            help="The number of scans to time (default 1000)",
+        )
+
+    def output(self, message):
+        self.stdout.write(
+            "{}: {}".format(timezone.now().strftime("%Y-%m-%d %H:%M:%S"), message),
+        )
+
+    def time_scans(self, getter, tokens):
+        """Return a list of lookup durations in milliseconds"""
+        durations = []
+        for token in tokens:
+            start = time.perf_counter()
+            ticket = getter(token)
+            durations.append((time.perf_counter() - start) * 1000)
+            assert ticket is not None
+        return durations
+
+    def report(self, name, durations):
+        durations.sort()
+        self.output(
+            f"{name}: mean {statistics.mean(durations):.2f} ms, median {durations[len(durations) // 2]:.2f} ms, 95th percentile {durations[int(len(durations) * 0.95)]:.2f} ms",
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(1)
+        with transaction.atomic():
+            self.output(f"Creating {options['tickets']} tickets...")
+            ticket_type = TicketTypeFactory()
+            tickets = [
+                DiscountTicket(ticket_type=ticket_type, price=0)
+                for _ in range(options["tickets"])
+            ]
+            # bulk_create() bypasses save() so set the tokens here
+            for ticket in tickets:
+                ticket.token = ticket._get_token()
+                ticket.badge_token = ticket._get_badge_token()
+            DiscountTicket.objects.bulk_create(tickets, batch_size=1000)
+            TicketToken.register(tickets)
+
+            # scan a random mix of ticket and badge tokens
+            tokens = [
+                rng.choice([ticket.token, ticket.badge_token])
+                for ticket in rng.choices(tickets, k=options["scans"])
+            ]
+
+            self.output(f"Timing {options['scans']} scans...")
+            self.report(
+                "Per ticket class lookup",
+                self.time_scans(legacy_ticket_getter_by_token, tokens),
+            )
+            self.report(
+                "TicketToken lookup",
+                self.time_scans(TicketToken.get_ticket, tokens),
+            )
+
+            # leave the database as we found it
+            transaction.set_rollback(True)
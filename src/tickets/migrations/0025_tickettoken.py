@@ -0,0 +1,106 @@
+# Generated by Django 4.2.3 on 2026-10-18 12:00
+
+import django.db.models.deletion
+import django_prometheus.models
+from django.db import migrations
+from django.db import models
+
+
+def populate_ticket_tokens(apps, schema_editor):
+    """Index the stored tokens of all existing tickets"""
+    TicketToken = apps.get_model("tickets", "TicketToken")
+    for field in ("shopticket", "sponsorticket", "discountticket"):
+        model = apps.get_model("tickets", field)
+        rows = []
+        for ticket in model.objects.select_related("ticket_type").iterator():
+            for token, badge in ((ticket.token, False), (ticket.badge_token, True)):
+                if token:
+                    rows.append(
+                        TicketToken(
+                            token=token,
+                            badge=badge,
+                            camp_id=ticket.ticket_type.camp_id,
+                            **{field: ticket},
+                        ),
+                    )
+        TicketToken.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("camps", "0036_camp_economy_team"),
+        ("tickets", "0024_shopticket_bundle_product_ticketgroup_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TicketToken",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+                ("token", models.CharField(max_length=64, unique=True)),
+                (
+                    "badge",
+                    models.BooleanField(
+                        default=False,
+                        help_text="True if this is the badge token of the ticket",
+                    ),
+                ),
+                (
+                    "camp",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="+",
+                        to="camps.camp",
+                    ),
+                ),
+                (
+                    "discountticket",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tokens",
+                        to="tickets.discountticket",
+                    ),
+                ),
+                (
+                    "shopticket",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tokens",
+                        to="tickets.shopticket",
+                    ),
+                ),
+                (
+                    "sponsorticket",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tokens",
+                        to="tickets.sponsorticket",
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+            },
+            bases=(
+                django_prometheus.models.ExportModelOperationsMixin("ticket_token"),
+                models.Model,
+            ),
+        ),
+        migrations.RunPython(populate_ticket_tokens, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,8 @@
-import base64
 import hashlib
-import io
 import logging
+from typing import Optional
 from typing import Union
 
-import qrcode
 from django.conf import settings
 from django.db import models
 from django.db.models import Avg
@@ -30,6 +28,7 @@ from utils.models import CampRelatedModel
 from utils.models import CreatedUpdatedModel
 from utils.models import UUIDModel
 from utils.pdf import generate_pdf_letter
+from utils.qr import qr_code_base64 as cached_qr_code_base64
 
 logger = logging.getLogger("bornhack.%s" % __name__)
 
@@ -117,15 +116,8 @@ def create_ticket_token(string):
 
 
 def qr_code_base64(token):
-    qr = qrcode.make(
-        token,
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_H,
-    ).resize((250, 250))
-    file_like = io.BytesIO()
-    qr.save(file_like, format="png")
-    qrcode_base64 = base64.b64encode(file_like.getvalue())
-    return qrcode_base64
+    """Return a 250x250 QR code PNG for the token as base64, from the QR code cache"""
+    return cached_qr_code_base64(token, size=250)
 
 
 class BaseTicket(CampRelatedModel, UUIDModel):
@@ -162,9 +154,18 @@ class BaseTicket(CampRelatedModel, UUIDModel):
         return self.ticket_type.camp
 
     def save(self, **kwargs):
-        self.token = self._get_token()
-        self.badge_token = self._get_badge_token()
+        token = self._get_token()
+        badge_token = self._get_badge_token()
+        # only update the token index when the tokens change
+        register = self._state.adding or (token, badge_token) != (
+            self.token,
+            self.badge_token,
+        )
+        self.token = token
+        self.badge_token = badge_token
         super().save(**kwargs)
+        if register:
+            TicketToken.register([self])
 
     def _get_token(self):
         return create_ticket_token(
@@ -183,13 +184,14 @@ class BaseTicket(CampRelatedModel, UUIDModel):
         )
 
     def get_qr_code_url(self):
+        # the stored token is kept up to date by save(), computing it can take queries
         return "data:image/png;base64,{}".format(
-            qr_code_base64(self._get_token()).decode("utf-8"),
+            qr_code_base64(self.token or self._get_token()).decode("utf-8"),
         )
 
     def get_qr_badge_code_url(self):
         return "data:image/png;base64,{}".format(
-            qr_code_base64(self._get_badge_token()).decode("utf-8"),
+            qr_code_base64(self.badge_token or self._get_badge_token()).decode("utf-8"),
         )
 
     def get_pdf_formatdict(self):
@@ -366,3 +368,116 @@ class ShopTicket(ExportModelOperationsMixin("shop_ticket"), BaseTicket):
 
 
 TicketTypeUnion = Union[ShopTicket, SponsorTicket, DiscountTicket]
+
+
+class TicketToken(ExportModelOperationsMixin("ticket_token"), CampRelatedModel):
+    """
+    An index of the ticket and badge tokens of all ticket classes, so a scanned
+    token is resolved with one lookup on a unique index instead of trying each
+    ticket class with an OR over both token fields.
+
+    Rows are written by BaseTicket.save() when the tokens of a ticket change,
+    and by TicketToken.register() for tickets created with bulk_create().
+    """
+
+    token = models.CharField(max_length=64, unique=True)
+
+    badge = models.BooleanField(
+        default=False,
+        help_text="True if this is the badge token of the ticket",
+    )
+
+    camp = models.ForeignKey(
+        "camps.Camp",
+        on_delete=models.PROTECT,
+        related_name="+",
+    )
+
+    # exactly one of these is set, the field names match the ticket model names
+    shopticket = models.ForeignKey(
+        "tickets.ShopTicket",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="tokens",
+    )
+
+    sponsorticket = models.ForeignKey(
+        "tickets.SponsorTicket",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="tokens",
+    )
+
+    discountticket = models.ForeignKey(
+        "tickets.DiscountTicket",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="tokens",
+    )
+
+    camp_filter = "camp"
+
+    TICKET_MODELS = {
+        "shopticket": ShopTicket,
+        "sponsorticket": SponsorTicket,
+        "discountticket": DiscountTicket,
+    }
+
+    def __str__(self):
+        return f"TicketToken: {self.token}"
+
+    @property
+    def ticket_model(self):
+        """Return the ticket model and pk this token belongs to"""
+        for field, model in self.TICKET_MODELS.items():
+            pk = getattr(self, f"{field}_id")
+            if pk:
+                return model, pk
+
+    @classmethod
+    def register(cls, tickets):
+        """
+        Create or update the index rows for the tokens of a list of tickets in one
+        query, and delete any old tokens for them. The tickets must have their
+        token and badge_token set and can be of any ticket class.
+        """
+        rows = []
+        for ticket in tickets:
+            for token, badge in ((ticket.token, False), (ticket.badge_token, True)):
+                if not token:
+                    continue
+                row = cls(token=token, badge=badge, camp_id=ticket.camp.pk)
+                setattr(row, ticket._meta.model_name, ticket)
+                rows.append(row)
+        if not rows:
+            return
+
+        # tokens only change if the SECRET_KEY changes, but don't leave old ones around
+        tokens = [row.token for row in rows]
+        for field in cls.TICKET_MODELS:
+            pks = [ticket.pk for ticket in tickets if ticket._meta.model_name == field]
+            if pks:
+                cls.objects.filter(**{f"{field}__in": pks}).exclude(
+                    token__in=tokens,
+                ).delete()
+
+        cls.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["token"],
+            update_fields=["badge", "camp", *cls.TICKET_MODELS, "updated"],
+        )
+
+    @classmethod
+    def get_ticket(cls, token) -> Optional[TicketTypeUnion]:
+        """Return the ticket with this ticket or badge token, or None"""
+        try:
+            entry = cls.objects.get(token=token)
+        except cls.DoesNotExist:
+            return None
+        model, pk = entry.ticket_model
+        # use the default manager of the ticket model, ShopTicket annotates quantity
+        return model.objects.filter(pk=pk).first()
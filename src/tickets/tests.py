@@ -1,8 +1,20 @@
+import json
+
+from django.contrib.auth.models import Permission
+from django.test import Client
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
 
 from .factories import TicketTypeFactory
 from .models import ShopTicket
+from .models import TicketToken
+from backoffice.views.infodesk import scan_bundle_hash
+from camps.factories import CampFactory
+from economy.factories import PosFactory
 from shop.factories import OrderProductRelationFactory
+from teams.factories import TeamFactory
+from utils.factories import UserFactory
 
 
 class TicketTests(TestCase):
@@ -18,3 +30,203 @@ class TicketTests(TestCase):
         self.assertNotEqual(shop_ticket.token, shop_ticket.badge_token)
         self.assertEqual(shop_ticket.token, shop_ticket._get_token())
         self.assertEqual(shop_ticket.badge_token, shop_ticket._get_badge_token())
+
+    def test_ticket_token_lookup(self):
+        ticket_type = TicketTypeFactory()
+        opr = OrderProductRelationFactory()
+        shop_ticket = ShopTicket.objects.create(
+            ticket_type=ticket_type,
+            product=opr.product,
+            opr=opr,
+        )
+
+        self.assertEqual(TicketToken.get_ticket(shop_ticket.token), shop_ticket)
+        self.assertEqual(TicketToken.get_ticket(shop_ticket.badge_token), shop_ticket)
+        self.assertIsNone(TicketToken.get_ticket("not-a-token"))
+
+
+class OfflineScanTests(TestCase):
+    """Test the offline scan bundle and sync endpoints of the infodesk"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.info_user = UserFactory(username="info")
+        backoffice_permission = Permission.objects.get(codename="backoffice_permission")
+        infoteam_permission = Permission.objects.get(codename="infoteam_permission")
+        cls.info_user.user_permissions.set([backoffice_permission, infoteam_permission])
+
+        cls.camp = CampFactory()
+        cls.pos = PosFactory(team=TeamFactory(camp=cls.camp))
+        ticket_type = TicketTypeFactory(camp=cls.camp)
+        opr = OrderProductRelationFactory(quantity=2)
+        cls.ticket, cls.used_ticket = [
+            ShopTicket.objects.create(
+                ticket_type=ticket_type,
+                product=opr.product,
+                opr=opr,
+            )
+            for i in range(2)
+        ]
+        cls.used_ticket.mark_as_used(pos=cls.pos, user=cls.info_user)
+
+    def get_url(self, name):
+        return reverse(
+            f"backoffice:{name}",
+            kwargs={"camp_slug": self.camp.slug, "pos_slug": self.pos.slug},
+        )
+
+    def sync(self, events, client=None, **kwargs):
+        return (client or self.client).post(
+            self.get_url("scan_tickets_sync"),
+            data=json.dumps({"events": events}),
+            content_type="application/json",
+            **kwargs,
+        )
+
+    def test_bundle_contents(self):
+        """The bundle has the hashes of the tokens of the camp, not the tokens."""
+        self.client.force_login(self.info_user)
+        response = self.client.get(self.get_url("scan_tickets_bundle"))
+        self.assertEqual(response.status_code, 200)
+        bundle = response.json()
+        self.assertEqual(bundle["camp"], self.camp.slug)
+        self.assertEqual(bundle["pos"], self.pos.slug)
+        self.assertCountEqual(
+            bundle["tickets"],
+            [
+                [
+                    scan_bundle_hash(self.ticket.token),
+                    f"shopticket:{self.ticket.pk}",
+                    0,
+                    0,
+                ],
+                [
+                    scan_bundle_hash(self.ticket.badge_token),
+                    f"shopticket:{self.ticket.pk}",
+                    1,
+                    0,
+                ],
+                [
+                    scan_bundle_hash(self.used_ticket.token),
+                    f"shopticket:{self.used_ticket.pk}",
+                    0,
+                    1,
+                ],
+                [
+                    scan_bundle_hash(self.used_ticket.badge_token),
+                    f"shopticket:{self.used_ticket.pk}",
+                    1,
+                    0,
+                ],
+            ],
+        )
+        self.assertNotIn(self.ticket.token, response.content.decode())
+
+    def test_sync_deduplicates_events(self):
+        """Repeated scans of a ticket are applied once with the earliest time."""
+        self.client.force_login(self.info_user)
+        first = timezone.now() - timezone.timedelta(hours=1)
+        events = [
+            {
+                "ticket": f"shopticket:{self.ticket.pk}",
+                "action": "check_in",
+                "at": at.isoformat(),
+            }
+            for at in [timezone.now(), first, timezone.now()]
+        ]
+        events.append(
+            {
+                "ticket": f"shopticket:{self.ticket.pk}",
+                "action": "badge",
+                "at": first.isoformat(),
+            },
+        )
+        response = self.sync(events)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "checked_in": 1,
+                "badges": 1,
+                "already_done": 0,
+                "unknown": 0,
+                "invalid": 0,
+            },
+        )
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.used_at, first)
+        self.assertEqual(self.ticket.used_pos, self.pos)
+        self.assertEqual(self.ticket.used_pos_user, self.info_user)
+        self.assertTrue(self.ticket.badge_handed_out)
+
+    def test_sync_leaves_used_tickets_alone(self):
+        """Check-ins of tickets which are already used are counted, not applied."""
+        self.client.force_login(self.info_user)
+        used_at = self.used_ticket.used_at
+        response = self.sync(
+            [
+                {
+                    "ticket": f"shopticket:{self.used_ticket.pk}",
+                    "action": "check_in",
+                    "at": (used_at - timezone.timedelta(hours=1)).isoformat(),
+                },
+            ],
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["already_done"], 1)
+        self.assertEqual(response.json()["checked_in"], 0)
+        self.used_ticket.refresh_from_db()
+        self.assertEqual(self.used_ticket.used_at, used_at)
+
+    def test_sync_malformed_events(self):
+        """Malformed events are counted and skipped, malformed bodies are refused."""
+        self.client.force_login(self.info_user)
+        now = timezone.now().isoformat()
+        response = self.sync(
+            [
+                {"ticket": "shopticket:not-a-uuid", "action": "check_in", "at": now},
+                {"ticket": f"ticket:{self.ticket.pk}", "action": "check_in", "at": now},
+                {"ticket": f"shopticket:{self.ticket.pk}", "action": "eat", "at": now},
+                {"ticket": f"shopticket:{self.ticket.pk}", "action": "badge"},
+                {"ticket": f"shopticket:{self.ticket.pk}", "at": "yesterday"},
+                "not an event",
+            ],
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["invalid"], 6)
+        self.ticket.refresh_from_db()
+        self.assertIsNone(self.ticket.used_at)
+        self.assertFalse(self.ticket.badge_handed_out)
+
+        response = self.client.post(
+            self.get_url("scan_tickets_sync"),
+            data="not json",
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            self.get_url("scan_tickets_sync"),
+            data=json.dumps({"events": "not a list"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_sync_requires_csrf_token(self):
+        """Devices must send the CSRF token from the bundle."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.info_user)
+        event = {
+            "ticket": f"shopticket:{self.ticket.pk}",
+            "action": "check_in",
+            "at": timezone.now().isoformat(),
+        }
+        self.assertEqual(self.sync([event], client=client).status_code, 403)
+
+        response = client.get(self.get_url("scan_tickets_bundle"))
+        response = self.sync(
+            [event],
+            client=client,
+            HTTP_X_CSRFTOKEN=response.json()["csrf_token"],
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["checked_in"], 1)
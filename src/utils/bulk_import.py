@@ -0,0 +1,151 @@
+import logging
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import models
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+# the number of rows handled per query by bulk_import()
+BULK_IMPORT_BATCH_SIZE = 1000
+
+
+class ImportProgress:
+    """Counters for a running import, the backoffice import views show them to the user."""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.start = time.monotonic()
+        self.end = None
+
+    @property
+    def duration(self):
+        return (self.end or time.monotonic()) - self.start
+
+    @property
+    def rows_per_second(self):
+        duration = self.duration
+        return self.rows / duration if duration else 0
+
+    def __str__(self):
+        return f"{self.rows} rows read, {self.created} created, {self.updated} updated and {self.skipped} skipped in {self.duration:.2f} seconds ({self.rows_per_second:.0f} rows/sec)"
+
+
+def bulk_import(
+    rows,
+    queryset,
+    key_fields,
+    update_fields=None,
+    ordered=False,
+    batch_size=BULK_IMPORT_BATCH_SIZE,
+    progress=None,
+):
+    """Import an iterable of dicts with field values for the model of queryset.
+
+    Rows are identified by the values of key_fields. A row with a key which exists
+    in queryset, or earlier in the import, is skipped like get_or_create() would,
+    or if update_fields is given those fields are updated like update_or_create()
+    would. The rows are read in batches of batch_size and each batch is handled
+    in one transaction with one query to find the existing rows, one bulk_create()
+    and one bulk_update(). The first key field should be the most selective one,
+    the existing rows are found with a __in lookup on it.
+
+    Field values are converted with field.to_python(), naive datetimes are made aware
+    in the default timezone like the database layer would, and the model clean() method
+    is called for each new or updated object, but clean_fields() and validate_unique()
+    are not, as they would cost queries per row.
+
+    With ordered=True the created timestamps of new objects follow the order of the
+    rows, bulk_create() can give objects created in the same microsecond the same timestamp.
+
+    Returns the number of created objects, progress is updated as the import runs.
+    """
+    model = queryset.model
+    key_fields = [model._meta.get_field(name) for name in key_fields]
+    convert_fields = [
+        field for field in model._meta.concrete_fields if not field.is_relation
+    ]
+    progress = progress or ImportProgress()
+    has_updated = any(field.name == "updated" for field in convert_fields)
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        progress.rows += len(batch)
+
+        # build the objects, later rows with the same key update or are skipped
+        objects = {}
+        for values in batch:
+            obj = model(**values)
+            for field in convert_fields:
+                value = field.to_python(getattr(obj, field.attname))
+                if (
+                    isinstance(field, models.DateTimeField)
+                    and value is not None
+                    and settings.USE_TZ
+                    and timezone.is_naive(value)
+                ):
+                    # make the value comparable to the values from the database
+                    value = timezone.make_aware(value)
+                setattr(obj, field.attname, value)
+            key = tuple(field.value_from_object(obj) for field in key_fields)
+            if key not in objects:
+                objects[key] = obj
+            elif update_fields:
+                for name in update_fields:
+                    setattr(objects[key], name, getattr(obj, name))
+            else:
+                progress.skipped += 1
+
+        with transaction.atomic():
+            existing = queryset.filter(
+                **{f"{key_fields[0].name}__in": {key[0] for key in objects}},
+            )
+            updated = []
+            if update_fields:
+                for obj in existing:
+                    key = tuple(field.value_from_object(obj) for field in key_fields)
+                    if key in objects:
+                        new = objects.pop(key)
+                        for name in update_fields:
+                            setattr(obj, name, getattr(new, name))
+                        updated.append(obj)
+            else:
+                for key in existing.values_list(*[f.name for f in key_fields]):
+                    if objects.pop(key, None):
+                        progress.skipped += 1
+
+            created = list(objects.values())
+            for obj in created + updated:
+                obj.clean()
+            model.objects.bulk_create(created)
+            if ordered and created:
+                now = timezone.now()
+                for i, obj in enumerate(created):
+                    obj.created = now + timedelta(microseconds=i)
+                model.objects.bulk_update(created, ["created"])
+            if updated:
+                fields = list(update_fields)
+                if has_updated:
+                    # bulk_update() doesn't touch auto_now fields
+                    now = timezone.now()
+                    for obj in updated:
+                        obj.updated = now
+                    fields.append("updated")
+                model.objects.bulk_update(updated, fields)
+
+        progress.created += len(created)
+        progress.updated += len(updated)
+        logger.debug(f"{model.__name__} import: {progress}")
+
+    progress.end = time.monotonic()
+    logger.info(f"{model.__name__} import done: {progress}")
+    return progress.created
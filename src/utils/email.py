@@ -23,7 +23,10 @@ def _send_email(
     sender="BornHack <info@bornhack.dk>",
     attachment=None,
     attachment_filename="",
+    connection=None,
 ):
+    """Send an email right away. Pass an open connection from
+    django.core.mail.get_connection() to reuse it for several emails."""
     to_recipients = to_recipients or []
     cc_recipients = cc_recipients or []
     bcc_recipients = bcc_recipients or []
@@ -50,6 +53,7 @@ def _send_email(
                 else [settings.ARCHIVE_EMAIL]
             ),
             cc_recipients,
+            connection=connection,
         )
 
         # is there a html version of this email?
@@ -75,7 +79,7 @@ def _send_email(
     return True
 
 
-def add_outgoing_email(
+def build_outgoing_email(
     text_template,
     formatdict,
     subject,
@@ -84,13 +88,12 @@ def add_outgoing_email(
     bcc_recipients=None,
     html_template="",
     sender="BornHack <info@bornhack.dk>",
-    attachment=None,
-    attachment_filename="",
     responsible_team=None,
     hold=False,
 ):
-    """adds an email to the outgoing queue
-    recipients is a list of to recipients
+    """Render the templates and return an unsaved OutgoingEmail, or None if a
+    recipient is invalid. Use this with OutgoingEmail.objects.bulk_create() to
+    queue many emails at once.
     """
     to_recipients = to_recipients or []
     cc_recipients = cc_recipients or []
@@ -116,11 +119,11 @@ def add_outgoing_email(
             validate_email(recipient)
         except ValidationError:
             logger.error(
-                f"There was a problem validating the email {recipient} - returning False",
+                f"There was a problem validating the email {recipient} - returning None",
             )
-            return False
+            return None
 
-    email = OutgoingEmail.objects.create(
+    return OutgoingEmail(
         text_template=text_template,
         html_template=html_template,
         subject=subject,
@@ -132,6 +135,40 @@ def add_outgoing_email(
         responsible_team=responsible_team,
     )
 
+
+def add_outgoing_email(
+    text_template,
+    formatdict,
+    subject,
+    to_recipients=None,
+    cc_recipients=None,
+    bcc_recipients=None,
+    html_template="",
+    sender="BornHack <info@bornhack.dk>",
+    attachment=None,
+    attachment_filename="",
+    responsible_team=None,
+    hold=False,
+):
+    """adds an email to the outgoing queue
+    recipients is a list of to recipients
+    """
+    email = build_outgoing_email(
+        text_template=text_template,
+        formatdict=formatdict,
+        subject=subject,
+        to_recipients=to_recipients,
+        cc_recipients=cc_recipients,
+        bcc_recipients=bcc_recipients,
+        html_template=html_template,
+        sender=sender,
+        responsible_team=responsible_team,
+        hold=hold,
+    )
+    if email is None:
+        return False
+    email.save()
+
     if attachment:
         django_file = ContentFile(attachment)
         django_file.name = attachment_filename
@@ -0,0 +1,78 @@
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+
+def claim_pending_job(queryset, timeout):
+    """
+    Return the oldest pending job in queryset after marking it as running, or None.
+
+    Jobs are models like program.AutoScheduleJob and economy.AccountingExport with
+    the STATUS_* constants and the status, started, finished, progress,
+    progress_text and result fields, run by a worker with run_managepy_worker.
+    The job is claimed with SELECT ... FOR UPDATE SKIP LOCKED so any number of
+    workers can run. Running jobs started more than timeout ago are failed first,
+    see fail_stale_jobs().
+    """
+    model = queryset.model
+    with transaction.atomic():
+        fail_stale_jobs(model, timeout)
+        job = (
+            queryset.select_for_update(skip_locked=True, of=("self",))
+            .filter(status=model.STATUS_PENDING)
+            .order_by("created")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = model.STATUS_RUNNING
+        job.started = timezone.now()
+        job.finished = None
+        job.progress = 0
+        # update() so a job for a read only camp can still be claimed and failed
+        model.objects.filter(pk=job.pk).update(
+            status=job.status,
+            started=job.started,
+            finished=job.finished,
+            progress=job.progress,
+            updated=job.started,
+        )
+    return job
+
+
+def fail_stale_jobs(model, timeout):
+    """Fail running jobs started more than timeout ago, the worker running them has
+    died. They are not run again as the job itself may have killed the worker, or
+    died halfway through changing data."""
+    now = timezone.now()
+    count = model.objects.filter(
+        status=model.STATUS_RUNNING,
+        started__lt=now - timeout,
+    ).update(
+        status=model.STATUS_FAILED,
+        progress_text="Failed",
+        result=f"The worker running this {model._meta.verbose_name} stopped, please create a new one.",
+        finished=now,
+        updated=now,
+    )
+    if count:
+        logger.warning(
+            f"Failed {count} {model._meta.verbose_name_plural} left running by a dead worker",
+        )
+    return count
+
+
+def fail_job(job, result):
+    """Mark a job as failed with the error in result, with update() so it works
+    for jobs of read only camps and does not save a half finished job"""
+    now = timezone.now()
+    job.__class__.objects.filter(pk=job.pk).update(
+        status=job.STATUS_FAILED,
+        progress_text="Failed",
+        result=result,
+        finished=now,
+        updated=now,
+    )
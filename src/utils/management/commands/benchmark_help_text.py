@@ -0,0 +1,68 @@
+import logging
+import time
+import tracemalloc
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from economy.models import BankTransaction
+from tickets.models import ShopTicket
+
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+
+def add_legacy_help_text_getters(instance):
+    """What HelpTextModel.__init__ used to do for every instance"""
+    for field in instance._meta.fields:
+        method_name = f"get_{field.name}_help_text"
+        partial_method = partial(instance._get_help_text, field_name=field.name)
+        setattr(instance, method_name, partial_method)
+
+
+class Command(BaseCommand):
+    args = "none"
+    help = "Measure the time and memory used to construct model instances with and without the per-instance help_text getters HelpTextModel used to add. Nothing is written to the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--instances",
+            type=int,
+            default=10000,
+            help="The number of instances of each model to construct (default 10000)",
+        )
+
+    def output(self, message):
+        self.stdout.write(
+            "{}: {}".format(timezone.now().strftime("%Y-%m-%d %H:%M:%S"), message),
+        )
+
+    def measure(self, model, count, legacy):
+        """Construct count instances and return the seconds and bytes it took"""
+        tracemalloc.start()
+        start = time.monotonic()
+        instances = []
+        for _i in range(count):
+            instance = model()
+            if legacy:
+                add_legacy_help_text_getters(instance)
+            instances.append(instance)
+        duration = time.monotonic() - start
+        size, _peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return duration, size
+
+    def handle(self, *args, **options):
+        count = options["instances"]
+        for model in (ShopTicket, BankTransaction):
+            results = {}
+            for legacy in (True, False):
+                results[legacy] = self.measure(model, count, legacy)
+                label = "with per-instance getters" if legacy else "lazy getters"
+                duration, size = results[legacy]
+                self.output(
+                    f"{model.__name__} x {count} ({label}): {duration:.3f} seconds, {size / 1024 / 1024:.1f} MB ({duration / count * 1000000:.1f} us and {size / count:.0f} bytes per instance)",
+                )
+            self.output(
+                f"{model.__name__}: saved {results[True][0] - results[False][0]:.3f} seconds and {(results[True][1] - results[False][1]) / 1024 / 1024:.1f} MB for {count} instances",
+            )
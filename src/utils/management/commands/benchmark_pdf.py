@@ -0,0 +1,61 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+from shop.invoiceworker import invoice_letter
+from shop.models import Invoice
+from utils.pdf import render_letter_html
+from utils.pdf import render_pdfs
+
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+
+class Command(BaseCommand):
+    args = "none"
+    help = "Measure how many PDF documents per minute the PDF rendering pool can produce, using the newest Invoice as the document. Nothing is written to disk or the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--documents",
+            type=int,
+            default=100,
+            help="The number of documents to render in each run (default 100)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            nargs="+",
+            default=[1, 2, 4],
+            help="The pool sizes to benchmark (default 1 2 4)",
+        )
+
+    def output(self, message):
+        self.stdout.write(
+            "{}: {}".format(timezone.now().strftime("%Y-%m-%d %H:%M:%S"), message),
+        )
+
+    def handle(self, *args, **options):
+        invoice = Invoice.objects.order_by("-created").first()
+        if not invoice:
+            raise CommandError("There are no Invoices to render")
+
+        filename, template, formatdict = invoice_letter(invoice)
+        self.output(f"Rendering HTML for {invoice}...")
+        html = render_letter_html(template, formatdict)
+
+        for workers in options["workers"]:
+            self.output(
+                f"Rendering {options['documents']} PDFs with {workers} workers...",
+            )
+            start = time.monotonic()
+            results = render_pdfs([html] * options["documents"], workers=workers)
+            duration = time.monotonic() - start
+            failed = len(
+                [result for result in results if isinstance(result, Exception)],
+            )
+            self.output(
+                f"Rendered {len(results) - failed} PDFs ({failed} failed) in {duration:.2f} seconds ({len(results) / duration * 60:.0f} documents/minute)",
+            )
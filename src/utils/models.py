@@ -1,9 +1,12 @@
 import logging
 import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
 from functools import partial
 
 from django.contrib import messages
 from django.contrib.postgres.fields import ArrayField
+from django.core.exceptions import FieldDoesNotExist
 from django.core.exceptions import ValidationError
 from django.db import models
 from django_prometheus.models import ExportModelOperationsMixin
@@ -19,13 +22,20 @@ class HelpTextModel(models.Model):
     class Meta:
         abstract = True
 
-    def __init__(self, *args, **kwargs):
-        """Loop over fields and add a new help_text getter method for each."""
-        super().__init__(*args, **kwargs)
-        for field in self._meta.fields:
-            method_name = f"get_{field.name}_help_text"
-            partial_method = partial(self._get_help_text, field_name=field.name)
-            setattr(self, method_name, partial_method)
+    def __getattr__(self, name):
+        """Return a help_text getter for get_<field>_help_text names.
+
+        This is only called when normal attribute lookup fails, so instances don't
+        need a getter per field and loading large querysets doesn't create them.
+        """
+        if name.startswith("get_") and name.endswith("_help_text"):
+            field_name = name[len("get_") : -len("_help_text")]
+            for field in self._meta.fields:
+                if field.name == field_name:
+                    return partial(self._get_help_text, field_name=field_name)
+        raise AttributeError(
+            f"'{type(self).__name__}' object has no attribute '{name}'",
+        )
 
     def _get_help_text(self, field_name):
         """Loop over all fields and return the help_text for the requested field."""
@@ -86,6 +96,28 @@ class CampReadOnlyModeError(ValidationError):
     pass
 
 
+# the ids of the camps checked by writable_camps(), the per row check is skipped for them
+_writable_camp_ids = ContextVar("writable_camp_ids", default=frozenset())
+
+
+@contextmanager
+def writable_camps(camp_ids):
+    """Check once that none of the camps are in read only mode, and skip the per row
+    check in CampRelatedModel.save() and delete() for them inside the block.
+    Use this around bulk writes."""
+    from camps.registry import is_camp_read_only
+
+    camp_ids = frozenset(camp_ids)
+    for camp_id in camp_ids:
+        if is_camp_read_only(camp_id):
+            raise CampReadOnlyModeError(f"The camp {camp_id} is in read only mode.")
+    token = _writable_camp_ids.set(_writable_camp_ids.get() | camp_ids)
+    try:
+        yield
+    finally:
+        _writable_camp_ids.reset(token)
+
+
 class CampRelatedModel(CreatedUpdatedModel):
     camp_filter = "camp"
 
@@ -93,7 +125,7 @@ class CampRelatedModel(CreatedUpdatedModel):
         abstract = True
 
     def save(self, **kwargs):
-        if self.camp.read_only:
+        if self.is_camp_read_only():
             if hasattr(self, "request"):
                 messages.error(self.request, f"Camp {self.camp} is in read only mode.")
             raise CampReadOnlyModeError(f"The camp {self.camp} is in read only mode.")
@@ -101,7 +133,7 @@ class CampRelatedModel(CreatedUpdatedModel):
         super().save(**kwargs)
 
     def delete(self, **kwargs):
-        if self.camp.read_only:
+        if self.is_camp_read_only():
             if hasattr(self, "request"):
                 messages.error(self.request, "Camp is in read only mode.")
             raise CampReadOnlyModeError("This camp is in read only mode.")
@@ -112,6 +144,55 @@ class CampRelatedModel(CreatedUpdatedModel):
     def get_camp_filter(cls):
         return cls.camp_filter
 
+    def get_camp_id(self):
+        """Return the id of the camp without loading the Camp object.
+
+        The camp_filter is followed through the related objects which are already
+        loaded, and the rest of the way in one query, so a model with a camp FK
+        or a loaded parent object costs no queries.
+        """
+        camp_filter = self.get_camp_filter()
+        if not isinstance(camp_filter, str):
+            # more than one way to the camp, use the camp property
+            return self.camp.pk
+
+        path = camp_filter.split("__")
+        obj = self
+        for i, name in enumerate(path):
+            try:
+                field = obj._meta.get_field(name)
+            except FieldDoesNotExist:
+                # the camp is a property on this model
+                return self.camp.pk
+            if i == len(path) - 1:
+                camp_id = getattr(obj, field.attname)
+                if camp_id is None:
+                    break
+                return camp_id
+            if not field.is_cached(obj):
+                pk = getattr(obj, field.attname)
+                if pk is None:
+                    break
+                return (
+                    field.related_model.objects.filter(pk=pk)
+                    .values_list("__".join(path[i + 1 :]), flat=True)
+                    .first()
+                )
+            obj = getattr(obj, name)
+            if obj is None:
+                break
+        return self.camp.pk
+
+    def is_camp_read_only(self):
+        """Return True if the camp of this object is in read only mode. The flag comes
+        from the camp registry, see camps.registry.is_camp_read_only()"""
+        from camps.registry import is_camp_read_only
+
+        camp_id = self.get_camp_id()
+        if camp_id in _writable_camp_ids.get():
+            return False
+        return is_camp_read_only(camp_id)
+
 
 class OutgoingEmail(ExportModelOperationsMixin("outgoing_email"), CreatedUpdatedModel):
     """The OutgoingEmail model contains all system emails, both unsent and sent."""
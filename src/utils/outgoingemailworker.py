@@ -1,4 +1,12 @@
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import connection
+from django.db import transaction
+from django.utils import timezone
 
 from .email import _send_email
 from .models import OutgoingEmail
@@ -7,24 +15,63 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("bornhack.%s" % __name__)
 
 
-def do_work():
+def send_batch(batch_size, failed_ids):
     """
-    The outgoing email worker sends emails added to the OutgoingEmail
-    queue.
+    Claim up to batch_size unprocessed emails and send them over one SMTP connection.
+    Emails which fail are added to failed_ids and are not retried by this sender
+    until the next do_work() call. Errors are handled per email, so the emails
+    which were sent are always marked as processed.
+
+    The rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED and stay locked
+    until the batch is marked as processed, so any number of senders and worker
+    processes can drain the queue without sending an email twice. If the worker
+    dies halfway the transaction is rolled back and the batch is picked up again.
+
+    Returns the number of emails in the batch, 0 means the queue is empty.
     """
-    not_processed_email = OutgoingEmail.objects.filter(processed=False, hold=False)
+    with transaction.atomic():
+        emails = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(processed=False, hold=False)
+            .exclude(id__in=failed_ids)
+            .order_by("created")[:batch_size],
+        )
+        if not emails:
+            return 0
 
-    if len(not_processed_email) > 0:
-        logger.debug(f"about to process {len(not_processed_email)} emails")
+        sent = []
+        try:
+            with get_connection() as smtp:
+                for email in emails:
+                    if send_outgoing_email(email, smtp):
+                        sent.append(email.id)
+                        logger.debug(f"Successfully sent {email}")
+                    else:
+                        failed_ids.add(email.id)
+                        logger.error(f"Unable to send {email}")
+        except Exception:
+            # opening or closing the connection failed, keep the emails already sent
+            logger.exception("Exception in the SMTP connection")
+            failed_ids.update(email.id for email in emails if email.id not in sent)
 
-    for email in not_processed_email:
+        # mark the sent emails as processed in one query
+        OutgoingEmail.objects.filter(id__in=sent).update(
+            processed=True,
+            updated=timezone.now(),
+        )
+        return len(emails)
+
+
+def send_outgoing_email(email, smtp):
+    """Send one OutgoingEmail over the connection, returns True if it was sent"""
+    try:
         attachment = None
         attachment_filename = ""
         if email.attachment:
             attachment = email.attachment.read()
             attachment_filename = email.attachment.name
 
-        mail_send_success = _send_email(
+        return _send_email(
             text_template=email.text_template,
             to_recipients=email.to_recipients,
             subject=email.subject,
@@ -33,10 +80,52 @@ def do_work():
             html_template=email.html_template,
             attachment=attachment,
             attachment_filename=attachment_filename,
+            connection=smtp,
+        )
+    except Exception:
+        logger.exception(f"Exception while sending {email}")
+        return False
+
+
+def drain_queue(batch_size):
+    """Send batches until the queue is empty, returns the number of emails handled.
+    Runs in a thread of the sender pool, so close the db connection when done."""
+    handled = 0
+    failed_ids = set()
+    try:
+        while True:
+            count = send_batch(batch_size, failed_ids)
+            if not count:
+                break
+            handled += count
+    except Exception:
+        logger.exception("Exception while sending a batch of emails")
+    finally:
+        connection.close()
+    return handled
+
+
+def do_work():
+    """
+    The outgoing email worker sends emails added to the OutgoingEmail
+    queue. settings.OUTGOING_EMAIL_WORKERS senders each claim batches of
+    settings.OUTGOING_EMAIL_BATCH_SIZE emails and send them over one
+    SMTP connection per batch.
+    """
+    if not OutgoingEmail.objects.filter(processed=False, hold=False).exists():
+        return
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=settings.OUTGOING_EMAIL_WORKERS) as pool:
+        handled = sum(
+            pool.map(
+                drain_queue,
+                [settings.OUTGOING_EMAIL_BATCH_SIZE] * settings.OUTGOING_EMAIL_WORKERS,
+            ),
+        )
+    duration = time.monotonic() - start
+
+    if handled:
+        logger.info(
+            f"Processed {handled} emails in {duration:.2f} seconds ({handled / duration:.1f} messages/sec)",
         )
-        if mail_send_success:
-            email.processed = True
-            email.save()
-            logger.debug(f"Successfully sent {email}")
-        else:
-            logger.error(f"Unable to send {email}")
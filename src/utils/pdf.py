@@ -1,9 +1,12 @@
 import io
 import logging
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.db import connections
 from django.template.loader import render_to_string
 from django.test.client import RequestFactory
 from django_weasyprint.utils import django_url_fetcher
@@ -12,17 +15,97 @@ from weasyprint import HTML
 logger = logging.getLogger("bornhack.%s" % __name__)
 
 
-def generate_pdf_letter(filename, template, formatdict):
+def render_letter_html(template, formatdict):
+    """Render the HTML for a PDF letter. This needs the database so it always
+    runs in the calling process."""
     request = RequestFactory().get("/")
     request.user = AnonymousUser()
     request.session = {}
     formatdict["dev"] = settings.PDF_TEST_MODE
-    weasy_html = HTML(
-        string=render_to_string(template, context=formatdict, request=request),
+    return render_to_string(template, context=formatdict, request=request)
+
+
+def render_pdf(html):
+    """Render HTML to PDF bytes with WeasyPrint. This does not touch the database
+    so it can run in a worker process."""
+    return HTML(
+        string=html,
         url_fetcher=django_url_fetcher,
         base_url="file://",
+    ).write_pdf()
+
+
+def archive_pdf(filename, pdf):
+    """Write the PDF bytes to the PDF archive and return a BytesIO with them"""
+    with open(os.path.join(settings.PDF_ARCHIVE_PATH, filename), "wb") as f:
+        f.write(pdf)
+    return io.BytesIO(pdf)
+
+
+def generate_pdf_letter(filename, template, formatdict):
+    """Render a PDF letter once and write it to the archive and a BytesIO"""
+    return archive_pdf(filename, render_pdf(render_letter_html(template, formatdict)))
+
+
+def render_pdfs(htmls, workers=None):
+    """
+    Render a list of HTML strings to PDF bytes using a pool of worker processes.
+    Returns a list with the PDF bytes, or the exception raised while rendering,
+    in the same order as the input.
+    """
+    workers = workers or settings.PDF_RENDER_WORKERS
+    if workers == 1 or len(htmls) <= 1:
+        results = []
+        for html in htmls:
+            try:
+                results.append(render_pdf(html))
+            except Exception as E:
+                results.append(E)
+        return results
+
+    # forked workers must not share the database connections of this process
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(htmls)),
+        mp_context=multiprocessing.get_context("fork"),
+    ) as pool:
+        futures = [pool.submit(render_pdf, html) for html in htmls]
+    return [future.exception() or future.result() for future in futures]
+
+
+def generate_pdf_letters(letters, workers=None):
+    """
+    Generate a batch of PDF letters. letters is a list of (filename, template, formatdict)
+    tuples. The HTML is rendered here, the PDFs are rendered in parallel by
+    render_pdfs(), and each PDF is written to the archive from the same bytes.
+    Returns a list with a BytesIO, or the exception raised while generating it,
+    for each letter.
+    """
+    htmls = []
+    for filename, template, formatdict in letters:
+        try:
+            htmls.append(render_letter_html(template, formatdict))
+        except Exception as E:
+            htmls.append(E)
+
+    # only render the letters where the html could be rendered
+    pdfs = iter(
+        render_pdfs(
+            [html for html in htmls if not isinstance(html, Exception)],
+            workers,
+        ),
     )
-    pdf = io.BytesIO()
-    pdf.write(weasy_html.write_pdf())
-    weasy_html.write_pdf(os.path.join(settings.PDF_ARCHIVE_PATH, filename))
-    return pdf
+    results = []
+    for (filename, template, formatdict), html in zip(letters, htmls):
+        if isinstance(html, Exception):
+            results.append(html)
+            continue
+        pdf = next(pdfs)
+        if isinstance(pdf, Exception):
+            results.append(pdf)
+            continue
+        try:
+            results.append(archive_pdf(filename, pdf))
+        except Exception as E:
+            results.append(E)
+    return results
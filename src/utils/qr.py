@@ -0,0 +1,72 @@
+import base64
+import hashlib
+import io
+import logging
+import os
+from functools import lru_cache
+
+import qrcode
+from django.conf import settings
+
+logger = logging.getLogger("bornhack.%s" % __name__)
+
+# the number of QR code images kept in memory per process
+QR_MEMORY_CACHE_SIZE = 1024
+
+
+def get_qr_cache_filename(value, size):
+    """Return the path of the cached QR code image, the name is the hash of the
+    value and size so the store is content addressed. Files are spread over 256
+    subdirectories."""
+    digest = hashlib.sha256(f"{size}:{value}".encode()).hexdigest()
+    return os.path.join(settings.QR_CACHE_PATH, digest[:2], f"{digest}.png")
+
+
+def render_qr_code_png(value, size):
+    """Encode value as a QR code and return a size x size PNG image as bytes"""
+    qr = qrcode.make(
+        value,
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+    ).resize((size, size))
+    file_like = io.BytesIO()
+    qr.save(file_like, format="png")
+    return file_like.getvalue()
+
+
+@lru_cache(maxsize=QR_MEMORY_CACHE_SIZE)
+def qr_code_png(value, size=250):
+    """
+    Return a QR code PNG for value, from the in-memory LRU cache, the on-disk
+    store in settings.QR_CACHE_PATH, or by rendering it and storing it in both.
+    """
+    filename = get_qr_cache_filename(value, size)
+    try:
+        with open(filename, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    png = render_qr_code_png(value, size)
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        # write to a temporary file and rename so readers never see half a file
+        tmpname = f"{filename}.{os.getpid()}.tmp"
+        with open(tmpname, "wb") as f:
+            f.write(png)
+        os.replace(tmpname, filename)
+    except OSError:
+        logger.exception(f"Unable to write QR code to the cache file {filename}")
+    return png
+
+
+def qr_code_base64(value, size=250):
+    """Return a cached QR code PNG for value as base64 encoded bytes"""
+    return base64.b64encode(qr_code_png(value, size))
+
+
+def qr_code_data_url(value, size=250):
+    """Return a cached QR code PNG for value as a data: url"""
+    return "data:image/png;base64,{}".format(
+        qr_code_base64(value, size).decode("utf-8"),
+    )
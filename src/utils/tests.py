@@ -1,7 +1,23 @@
+import os
+import tempfile
+from datetime import timedelta
 from unittest import skip
 
+from django.core import mail
 from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+
+from .jobs import claim_pending_job
+from .models import CampReadOnlyModeError
+from .models import OutgoingEmail
+from .models import writable_camps
+from .outgoingemailworker import send_batch
+from .qr import get_qr_cache_filename
+from .qr import qr_code_png
+from economy.models import AccountingExport
+from tickets.factories import TicketTypeFactory
+from tickets.models import DiscountTicket
 
 
 class TestBootstrapScript(TestCase):
@@ -11,3 +27,142 @@ class TestBootstrapScript(TestCase):
     def test_bootstrap_script(self):
         """If no orders have been made, the product is still available."""
         call_command("bootstrap_devsite")
+
+
+class TestOutgoingEmailWorker(TestCase):
+    """Test the batched outgoing email worker"""
+
+    def test_send_batch(self):
+        """Emails on hold are skipped, the rest are sent and marked as processed."""
+        for i in range(3):
+            OutgoingEmail.objects.create(
+                subject=f"Test {i}",
+                text_template="Test",
+                sender="test@example.com",
+                to_recipients=["test@example.com"],
+                hold=i == 0,
+            )
+        self.assertEqual(send_batch(batch_size=10, failed_ids=set()), 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(OutgoingEmail.objects.filter(processed=True).count(), 2)
+        # the queue is empty now
+        self.assertEqual(send_batch(batch_size=10, failed_ids=set()), 0)
+
+    def test_send_batch_failing_email(self):
+        """An email which fails is skipped, the rest of the batch is still sent."""
+        for i in range(2):
+            OutgoingEmail.objects.create(
+                subject=f"Test {i}",
+                text_template="Test",
+                sender="test@example.com",
+                to_recipients=["test@example.com"],
+                # the attachment file does not exist so reading it fails
+                attachment="missing/attachment.pdf" if i == 0 else "",
+            )
+        failed_ids = set()
+        self.assertEqual(send_batch(batch_size=10, failed_ids=failed_ids), 2)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(
+            failed_ids,
+            {OutgoingEmail.objects.get(subject="Test 0").id},
+        )
+        self.assertTrue(OutgoingEmail.objects.get(subject="Test 1").processed)
+        # the failed email is not retried by this sender
+        self.assertEqual(send_batch(batch_size=10, failed_ids=failed_ids), 0)
+
+
+class TestQrCodeCache(TestCase):
+    """Test the QR code cache"""
+
+    def test_qr_code_is_cached_on_disk(self):
+        """QR codes are rendered once and then served from the on-disk store."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with self.settings(QR_CACHE_PATH=tmpdir):
+                qr_code_png.cache_clear()
+                png = qr_code_png("test-token", 250)
+                self.assertTrue(
+                    os.path.exists(get_qr_cache_filename("test-token", 250)),
+                )
+                # a fresh process would read the png from disk
+                qr_code_png.cache_clear()
+                self.assertEqual(qr_code_png("test-token", 250), png)
+                qr_code_png.cache_clear()
+
+
+class TestHelpTextModel(TestCase):
+    def test_help_text_getters(self):
+        """get_<field>_help_text() works without being set up per instance."""
+        email = OutgoingEmail()
+        self.assertNotIn("get_subject_help_text", email.__dict__)
+        self.assertEqual(
+            email.get_subject_help_text(),
+            OutgoingEmail._meta.get_field("subject").help_text,
+        )
+        with self.assertRaises(AttributeError):
+            email.get_nonexistent_help_text()
+
+
+class TestCampReadOnly(TestCase):
+    def test_read_only_check_uses_the_camp_registry(self):
+        """Saving a CampRelatedModel checks read_only without loading the Camp."""
+        ticket_type = TicketTypeFactory()
+        ticket = DiscountTicket(ticket_type=ticket_type, price=100)
+        self.assertEqual(ticket.get_camp_id(), ticket_type.camp_id)
+
+        # warm the camp registry, then the check itself costs no queries
+        self.assertFalse(ticket.is_camp_read_only())
+        with self.assertNumQueries(0):
+            self.assertFalse(ticket.is_camp_read_only())
+
+        camp = ticket_type.camp
+        camp.read_only = True
+        camp.save()
+        with self.assertRaises(CampReadOnlyModeError):
+            ticket.save()
+        with self.assertRaises(CampReadOnlyModeError):
+            with writable_camps([camp.pk]):
+                pass
+
+
+class TestClaimPendingJob(TestCase):
+    """Test claiming jobs for the job workers"""
+
+    def test_claim_fails_stale_jobs(self):
+        """Jobs left running by a dead worker are failed, the oldest pending job is claimed."""
+        today = timezone.now().date()
+        timeout = timedelta(hours=1)
+        stale = AccountingExport.objects.create(
+            date_from=today,
+            date_to=today,
+            status=AccountingExport.STATUS_RUNNING,
+            started=timezone.now() - timeout * 2,
+        )
+        running = AccountingExport.objects.create(
+            date_from=today,
+            date_to=today,
+            status=AccountingExport.STATUS_RUNNING,
+            started=timezone.now(),
+        )
+        pending = [
+            AccountingExport.objects.create(date_from=today, date_to=today)
+            for i in range(2)
+        ]
+
+        self.assertEqual(
+            claim_pending_job(AccountingExport.objects.all(), timeout),
+            pending[0],
+        )
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, AccountingExport.STATUS_FAILED)
+        self.assertIsNotNone(stale.finished)
+        running.refresh_from_db()
+        self.assertEqual(running.status, AccountingExport.STATUS_RUNNING)
+        pending[0].refresh_from_db()
+        self.assertEqual(pending[0].status, AccountingExport.STATUS_RUNNING)
+        self.assertIsNotNone(pending[0].started)
+
+        self.assertEqual(
+            claim_pending_job(AccountingExport.objects.all(), timeout),
+            pending[1],
+        )
+        self.assertIsNone(claim_pending_job(AccountingExport.objects.all(), timeout))